@@ -0,0 +1,145 @@
+import heapq
+from collections import deque
+from datetime import datetime, timedelta
+from operator import itemgetter
+
+from sqlalchemy import select, func
+
+from models import Product, Sale, Competitor, CompetitorPrice, PriceHistory
+
+# Longest date range the dashboard API will aggregate
+MAX_DASHBOARD_DAYS = 730
+
+
+def series(statement, date_column, since=None, limit=None):
+    """Chronological time series, optionally restricted to rows since a date and the latest `limit` rows."""
+    if since:
+        statement = statement.where(date_column >= since)
+    if limit:
+        latest = statement.order_by(date_column.desc()).limit(limit).subquery()
+        return select(latest).order_by(latest.c.date)
+    return statement.order_by(date_column)
+
+
+def product_data_window(args):
+    """
+    Parse the optional `since` (YYYY-MM-DD) and `limit` arguments of the
+    product data API. Raises ValueError with a client-facing message.
+    """
+    since = args.get('since')
+    limit = args.get('limit', type=int)
+    if since:
+        try:
+            since = datetime.strptime(since, '%Y-%m-%d')
+        except ValueError:
+            raise ValueError("'since' must be a YYYY-MM-DD date")
+    if limit is not None and limit < 1:
+        raise ValueError("'limit' must be a positive integer")
+    return since, limit
+
+
+def product_data_statements(product_id, since=None, limit=None):
+    """
+    The independent (price_history, sales, competitor_prices) series
+    statements of the product data API. Each can run on its own connection.
+    """
+    price_history = series(
+        select(PriceHistory.date_changed.label('date'), PriceHistory.price)
+        .where(PriceHistory.product_id == product_id),
+        PriceHistory.date_changed, since, limit
+    )
+    sales = series(
+        select(Sale.sale_date.label('date'), Sale.quantity, Sale.price)
+        .where(Sale.product_id == product_id),
+        Sale.sale_date, since, limit
+    )
+    # Competitor prices with names from a single join
+    competitor_prices = series(
+        select(
+            CompetitorPrice.date_recorded.label('date'),
+            CompetitorPrice.competitor_id,
+            Competitor.name.label('competitor_name'),
+            CompetitorPrice.price
+        ).join(Competitor, Competitor.id == CompetitorPrice.competitor_id)
+        .where(CompetitorPrice.product_id == product_id),
+        CompetitorPrice.date_recorded, since, limit
+    )
+    return price_history, sales, competitor_prices
+
+
+def sales_with_archive(rows, archived, limit=None):
+    """
+    (date, quantity, price) of sale rows merged in date order with archived
+    sales (arrays from sales_archive.scan), keeping the latest `limit` rows
+    when given.
+    """
+    recent = ((row.date, row.quantity, row.price) for row in rows)
+    if not len(archived['sale_date']):
+        yield from recent
+        return
+
+    dates, quantities, prices = archived['sale_date'], archived['quantity'], archived['price']
+    if limit:
+        dates, quantities, prices = dates[-limit:], quantities[-limit:], prices[-limit:]
+    older = zip(dates.astype(object), quantities.tolist(), prices.tolist())
+    merged = heapq.merge(older, recent, key=itemgetter(0))
+    yield from (deque(merged, maxlen=limit) if limit else merged)
+
+
+def product_data_sections(price_history, sales, competitor_prices):
+    """
+    (key, items) sections of the product data payload for
+    utils.stream_json_object, from price history rows, (date, quantity,
+    price) sales and competitor price rows.
+    """
+    return [
+        ('price_history', (
+            {'date': row.date.strftime('%Y-%m-%d'), 'price': row.price}
+            for row in price_history
+        )),
+        ('sales', (
+            {
+                'date': date.strftime('%Y-%m-%d'),
+                'quantity': quantity,
+                'price': price,
+                'revenue': quantity * price
+            }
+            for date, quantity, price in sales
+        )),
+        ('competitor_prices', (
+            {
+                'date': row.date.strftime('%Y-%m-%d'),
+                'competitor_id': row.competitor_id,
+                'competitor_name': row.competitor_name,
+                'price': row.price
+            }
+            for row in competitor_prices
+        ))
+    ]
+
+
+def dashboard_days(args):
+    return min(max(int(args.get('days', 30)), 1), MAX_DASHBOARD_DAYS)
+
+
+def price_changes_statement(user_id, days):
+    """Price changes per day over the last `days` days, counted in SQL."""
+    start_date = datetime.utcnow() - timedelta(days=days)
+    change_day = func.date(PriceHistory.date_changed)
+    return select(change_day, func.count()).join(Product).where(
+        Product.user_id == user_id,
+        PriceHistory.date_changed >= start_date
+    ).group_by(change_day).order_by(change_day)
+
+
+def dashboard_payload(daily_sales, price_changes):
+    return {
+        'daily_sales': daily_sales,
+        'price_changes': [
+            {
+                'date': str(date),
+                'count': count
+            }
+            for date, count in price_changes
+        ]
+    }
@@ -3,6 +3,7 @@ import logging
 import json
 import sys
 
+import orjson
 from flask import Flask, send_from_directory
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.orm import DeclarativeBase
@@ -37,10 +38,67 @@ app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
 }
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+# catalog-wide repricing jobs
+app.config["REPRICING_WORKERS"] = int(os.environ.get("REPRICING_WORKERS", os.cpu_count() or 1))
+app.config["REPRICING_SHARD_SIZE"] = int(os.environ.get("REPRICING_SHARD_SIZE", 500))
+app.config["REPRICING_INSERT_BATCH_SIZE"] = int(os.environ.get("REPRICING_INSERT_BATCH_SIZE", 1000))
+app.config["REPRICING_START_METHOD"] = os.environ.get("REPRICING_START_METHOD", "spawn")
+# active jobs without progress for this long are marked failed (their worker exited)
+app.config["REPRICING_STALE_SECONDS"] = int(os.environ.get("REPRICING_STALE_SECONDS", 600))
+
+# server-side response cache: "memory" (per worker), "sqlite" (shared by workers on the host) or "null";
+# gunicorn.conf.py defaults it to "sqlite"
+app.config["CACHE_BACKEND"] = os.environ.get("CACHE_BACKEND", "memory")
+app.config["CACHE_TTL"] = int(os.environ.get("CACHE_TTL", 300))
+if os.environ.get("CACHE_PATH"):
+    app.config["CACHE_PATH"] = os.environ["CACHE_PATH"]
+
+# per-worker cache of the signed-in user behind Flask-Login (0 disables it)
+app.config["USER_CACHE_TTL"] = int(os.environ.get("USER_CACHE_TTL", 60))
+
+# instrumentation: snapshots shared by gunicorn workers, optional bearer token for /metrics
+app.config["METRICS_DIR"] = os.environ.get("METRICS_DIR")
+app.config["METRICS_TOKEN"] = os.environ.get("METRICS_TOKEN")
+
+# development/test query budget guard and N+1 detector
+app.config["QUERY_GUARD"] = os.environ.get("QUERY_GUARD", "").lower() in ("1", "true", "yes")
+app.config["QUERY_BUDGET"] = int(os.environ.get("QUERY_BUDGET", 20))
+
+# columnar archive for sales older than SALES_ARCHIVE_DAYS
+if os.environ.get("SALES_ARCHIVE_DIR"):
+    app.config["SALES_ARCHIVE_DIR"] = os.environ["SALES_ARCHIVE_DIR"]
+app.config["SALES_ARCHIVE_DAYS"] = int(os.environ.get("SALES_ARCHIVE_DAYS", 365))
+
+# gzip/brotli for text responses of at least COMPRESS_MIN_SIZE bytes
+app.config["COMPRESS_MIN_SIZE"] = int(os.environ.get("COMPRESS_MIN_SIZE", 1024))
+
+# async serving mode (asgi.py): threads running the Flask views behind the async JSON API
+app.config["ASYNC_WSGI_THREADS"] = int(os.environ.get("ASYNC_WSGI_THREADS", 10))
+
 # initialize the app with the extension
 db.init_app(app)
 migrate = Migrate(app, db)
 
+# Initialize the response cache
+from cache import response_cache
+response_cache.init_app(app)
+
+# Initialize request/SQL instrumentation and /metrics
+from metrics import metrics
+metrics.init_app(app)
+
+# Query budget guard (development/test only)
+import query_guard
+query_guard.init_app(app)
+
+# Columnar archive of old sales
+from sales_archive import sales_archive
+sales_archive.init_app(app)
+
+# Response compression
+from compression import compression
+compression.init_app(app)
+
 # Initialize Flask-Login
 login_manager = LoginManager()
 login_manager.init_app(app)
@@ -57,28 +115,30 @@ def fromjson_filter(value):
 @app.template_filter('tojson')
 def tojson_filter(value):
     try:
-        return json.dumps(value)
+        return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS).decode()
     except Exception as e:
         app.logger.error(f"Error in tojson filter: {str(e)}")
         return '[]'
 
 with app.app_context():
-    # Import the models here
+    # Import the models here; tables are created by `flask init-db` or migrations
     import models
 
-    # Create all database tables
-    db.create_all()
-
     # Import and register routes
     from routes import register_routes
     register_routes(app)
 
-# Load the user loader function
-from models import User
+    # Register CLI commands
+    from commands import register_commands
+    register_commands(app)
+
+# Load the user loader function, served from a per-worker snapshot cache
+from user_cache import user_cache
+user_cache.init_app(app)
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    return user_cache.load(int(user_id))
 
 # Serve favicon manually (fixes 404 issues)
 @app.route('/favicon.ico')
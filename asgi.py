@@ -0,0 +1,11 @@
+"""
+ASGI entry point: the JSON API served natively by async_api, everything
+else by the Flask app.
+
+    uvicorn asgi:application --workers 4
+    GUNICORN_WORKER_CLASS=uvicorn.workers.UvicornWorker gunicorn asgi:application
+"""
+from app import app
+from async_api import AsyncAPI
+
+application = AsyncAPI(app)
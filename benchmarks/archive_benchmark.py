@@ -0,0 +1,114 @@
+"""
+Compare year-long sales analytics through the ORM with the same analysis
+over the columnar sales archive.
+
+Generates a synthetic tenant with --days of sales history, times daily
+revenue per product over the last year by loading Sale rows through the
+ORM, then archives everything older than --archive-days and times the same
+aggregation over load_sales_history (memory-mapped archive partitions plus
+the remaining table rows). Both results are checked for equality.
+
+    python benchmarks/archive_benchmark.py
+    python benchmarks/archive_benchmark.py --products 2000 --sales-per-product 400
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=1000)
+    parser.add_argument('--sales-per-product', type=int, default=200)
+    parser.add_argument('--days', type=int, default=400, help='Days of generated sales history.')
+    parser.add_argument('--archive-days', type=int, default=90, help='Archive sales older than this.')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    return parser.parse_args()
+
+
+def timed(run, repeat):
+    samples, result = [], None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = run()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples), result
+
+
+def main():
+    args = parse_args()
+    workdir = tempfile.mkdtemp(prefix='priceflex_archive_bench_')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ['SALES_ARCHIVE_DIR'] = os.path.join(workdir, 'archive')
+    os.environ['CACHE_BACKEND'] = 'null'
+    sys.path.insert(0, ROOT)
+
+    import logging
+    import numpy as np
+    from app import app, db
+    from models import Product, Sale
+    from benchmarks.synthetic import TenantSpec, generate
+    from sales_archive import archive_sales, load_sales_history
+
+    logging.getLogger().setLevel(logging.WARNING)
+
+    spec = TenantSpec(
+        users=1, products_per_user=args.products, sales_per_product=args.sales_per_product,
+        competitor_prices_per_product=1, history_depth=1, recommendations_per_product=0,
+        days=args.days, seed=args.seed
+    )
+
+    with app.app_context():
+        db.create_all()
+        user_id = generate(spec)[1]
+        start = datetime.utcnow() - timedelta(days=365)
+
+        def orm_daily_revenue():
+            totals = defaultdict(float)
+            sales = Sale.query.join(Product).filter(Product.user_id == user_id, Sale.sale_date >= start).all()
+            for sale in sales:
+                totals[(sale.product_id, sale.sale_date.date())] += sale.revenue
+            return totals
+
+        def columnar_daily_revenue():
+            history = load_sales_history(user_id, start=start)
+            days = history['sale_date'].astype('datetime64[D]')
+            keys, index = np.unique(
+                np.rec.fromarrays([history['product_id'], days], names='product_id,day'), return_inverse=True
+            )
+            revenue = np.bincount(index, weights=history['quantity'] * history['price'], minlength=len(keys))
+            return dict(zip(zip(keys['product_id'].tolist(), keys['day'].astype(object)), revenue.tolist()))
+
+        rows_before = db.session.query(Sale).count()
+        orm_ms, expected = timed(orm_daily_revenue, args.repeat)
+        db.session.remove()
+
+        started = time.perf_counter()
+        archived = sum(archive_sales(user_id, args.archive_days).values())
+        archive_seconds = time.perf_counter() - started
+        rows_after = db.session.query(Sale).count()
+
+        columnar_ms, actual = timed(columnar_daily_revenue, args.repeat)
+        matches = expected.keys() == actual.keys() and all(
+            abs(expected[key] - actual[key]) <= 1e-6 * max(1.0, abs(expected[key])) for key in expected
+        )
+
+    print(f"Sale table: {rows_before:,} rows -> {rows_after:,} rows "
+          f"({archived:,} archived in {archive_seconds:.1f}s)")
+    print(f"Daily revenue per product over 365 days ({len(expected):,} product-days):")
+    print(f"  ORM rows            {orm_ms:10.1f} ms")
+    print(f"  columnar archive    {columnar_ms:10.1f} ms  ({orm_ms / columnar_ms:.1f}x)")
+    print(f"  results match: {matches}")
+    return 0 if matches else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,282 @@
+"""
+Load test the JSON API served by sync gunicorn workers (app:app) against
+the async serving mode (asgi:application on uvicorn workers).
+
+Generates a synthetic tenant, starts each server with the same number of
+worker processes, signs in, and drives --concurrency keep-alive clients
+for --duration seconds against a mix of /api/product_data/<id> and
+/api/dashboard_data. Reports throughput and latency percentiles per mode.
+
+The response cache is disabled so every request reaches the database.
+Point --database-url at PostgreSQL to measure against the production
+backend (the tenant is generated there first). --db-latency routes the
+servers' database connections through a local TCP proxy that delays
+every packet by half the given round trip in each direction, standing in
+for a database on another host.
+
+    python benchmarks/async_load_test.py
+    python benchmarks/async_load_test.py --workers 2 --concurrency 64 --duration 20
+    python benchmarks/async_load_test.py --database-url postgresql://postgres@127.0.0.1:5432/loadtest --db-latency 2
+"""
+import argparse
+import asyncio
+import http.client
+import os
+import random
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODES = {
+    'sync': ['--worker-class', 'sync', 'app:app'],
+    'async': ['--worker-class', 'uvicorn.workers.UvicornWorker', 'asgi:application']
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=2, help='Server worker processes per mode.')
+    parser.add_argument('--concurrency', type=int, default=32, help='Concurrent client connections.')
+    parser.add_argument('--duration', type=float, default=10, help='Seconds of load per mode.')
+    parser.add_argument('--products', type=int, default=300)
+    parser.add_argument('--sales-per-product', type=int, default=200)
+    parser.add_argument('--dashboard-share', type=float, default=0.2,
+                        help='Fraction of requests going to /api/dashboard_data.')
+    parser.add_argument('--modes', default='sync,async')
+    parser.add_argument('--database-url', default=None, help='Defaults to a temporary SQLite database.')
+    parser.add_argument('--db-latency', type=float, default=0,
+                        help='Milliseconds of round-trip latency added to a networked --database-url.')
+    parser.add_argument('--timeout', type=float, default=60, help='Seconds to wait for a server to answer.')
+    parser.add_argument('--seed', type=int, default=42)
+    return parser.parse_args()
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class LatencyProxy:
+    """
+    TCP proxy on a background event loop that forwards each chunk after
+    latency / 2 seconds, in both directions, preserving order.
+    """
+
+    def __init__(self, host, port, latency):
+        self.target = (host, port)
+        self.delay = latency / 2
+        self.port = None
+        self.loop = asyncio.new_event_loop()
+        ready = threading.Event()
+        threading.Thread(target=self._run, args=(ready,), daemon=True).start()
+        ready.wait()
+
+    def _run(self, ready):
+        asyncio.set_event_loop(self.loop)
+        server = self.loop.run_until_complete(asyncio.start_server(self._accept, '127.0.0.1', 0))
+        self.port = server.sockets[0].getsockname()[1]
+        ready.set()
+        self.loop.run_forever()
+
+    async def _accept(self, client_reader, client_writer):
+        try:
+            server_reader, server_writer = await asyncio.open_connection(*self.target)
+        except OSError:
+            client_writer.close()
+            return
+        await asyncio.gather(
+            self._pipe(client_reader, server_writer),
+            self._pipe(server_reader, client_writer),
+            return_exceptions=True
+        )
+
+    async def _pipe(self, reader, writer):
+        queue = asyncio.Queue()
+
+        async def deliver():
+            while True:
+                due, chunk = await queue.get()
+                await asyncio.sleep(max(0, due - self.loop.time()))
+                if not chunk:
+                    writer.close()
+                    return
+                writer.write(chunk)
+                await writer.drain()
+
+        delivery = asyncio.ensure_future(deliver())
+        try:
+            while True:
+                chunk = await reader.read(65536)
+                queue.put_nowait((self.loop.time() + self.delay, chunk))
+                if not chunk:
+                    break
+            await delivery
+        finally:
+            delivery.cancel()
+            writer.close()
+
+    def close(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+def generate_tenant(args, env):
+    """Populate the database in a child process and return (email, product_ids)."""
+    script = f"""
+import json
+from app import app, db
+from models import Product
+from benchmarks.synthetic import TenantSpec, generate, user_email, PASSWORD
+spec = TenantSpec(users=1, products_per_user={args.products}, sales_per_product={args.sales_per_product},
+                  days=365, seed={args.seed})
+with app.app_context():
+    db.create_all()
+    user_id = generate(spec)[1]
+    ids = [p.id for p in Product.query.filter_by(user_id=user_id)]
+print(json.dumps({{'email': user_email(1), 'password': PASSWORD, 'products': ids}}))
+"""
+    import json
+    output = subprocess.run(
+        [sys.executable, '-c', script], cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def start_server(mode, args, env):
+    port = _free_port()
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}', '--workers', str(args.workers),
+         *MODES[mode]],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    started = time.perf_counter()
+    while time.perf_counter() - started < args.timeout:
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            connection.request('GET', '/login')
+            connection.getresponse().read()
+            connection.close()
+            return server, port
+        except OSError:
+            time.sleep(0.05)
+    server.terminate()
+    raise RuntimeError(f'{mode} server did not answer within {args.timeout}s')
+
+
+def sign_in(port, tenant):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    body = urllib.parse.urlencode({'email': tenant['email'], 'password': tenant['password']})
+    connection.request('POST', '/login', body, {'Content-Type': 'application/x-www-form-urlencoded'})
+    response = connection.getresponse()
+    response.read()
+    cookie = response.getheader('Set-Cookie')
+    if response.status != 302 or not cookie:
+        raise RuntimeError(f'Sign-in failed with status {response.status}')
+    return cookie.split(';', 1)[0]
+
+
+def run_load(port, cookie, tenant, args):
+    """Drive the server from --concurrency threads; returns (latencies, errors, elapsed)."""
+    deadline = time.perf_counter() + args.duration
+    latencies, errors, lock = [], [0], threading.Lock()
+
+    def client(number):
+        rnd = random.Random(args.seed + number)
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        samples, failed = [], 0
+        while time.perf_counter() < deadline:
+            if rnd.random() < args.dashboard_share:
+                path = f'/api/dashboard_data?days={rnd.choice((30, 90, 365))}'
+            else:
+                path = f"/api/product_data/{rnd.choice(tenant['products'])}"
+            started = time.perf_counter()
+            try:
+                connection.request('GET', path, headers={'Cookie': cookie})
+                response = connection.getresponse()
+                response.read()
+                if response.status != 200:
+                    failed += 1
+                    continue
+                if response.getheader('Connection', '').lower() == 'close':
+                    connection.close()
+            except (OSError, http.client.HTTPException):
+                failed += 1
+                connection.close()
+                continue
+            samples.append(time.perf_counter() - started)
+        connection.close()
+        with lock:
+            latencies.extend(samples)
+            errors[0] += failed
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(number,)) for number in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors[0], time.perf_counter() - started
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else float('nan')
+
+
+def main():
+    args = parse_args()
+    workdir = tempfile.mkdtemp(prefix='priceflex_load_')
+    env = dict(os.environ)
+    env['DATABASE_URL'] = args.database_url or f"sqlite:///{os.path.join(workdir, 'load.db')}"
+    env['METRICS_DIR'] = os.path.join(workdir, 'metrics')
+    env['SALES_ARCHIVE_DIR'] = os.path.join(workdir, 'archive')
+    env['CACHE_BACKEND'] = 'null'
+    env['PYTHONWARNINGS'] = 'ignore::DeprecationWarning'
+
+    proxy = None
+    try:
+        tenant = generate_tenant(args, env)
+        if args.db_latency:
+            from sqlalchemy.engine import make_url
+            url = make_url(env['DATABASE_URL'])
+            if not url.host:
+                raise SystemExit('--db-latency needs a --database-url with a host')
+            proxy = LatencyProxy(url.host, url.port or 5432, args.db_latency / 1000)
+            env['DATABASE_URL'] = url.set(host='127.0.0.1', port=proxy.port).render_as_string(hide_password=False)
+        print(f"{len(tenant['products'])} products, {args.workers} workers per mode, "
+              f"{args.concurrency} concurrent clients for {args.duration:.0f}s, "
+              f"{args.db_latency:g} ms added database round trip\n")
+        print(f"{'mode':8} {'requests':>9} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+        results = {}
+        for mode in args.modes.split(','):
+            server, port = start_server(mode, args, env)
+            try:
+                cookie = sign_in(port, tenant)
+                latencies, errors, elapsed = run_load(port, cookie, tenant, args)
+            finally:
+                server.terminate()
+                server.wait()
+            throughput = results[mode] = len(latencies) / elapsed
+            print(f"{mode:8} {len(latencies):>9} {throughput:>9.1f} "
+                  f"{statistics.median(latencies) * 1000 if latencies else float('nan'):>9.1f} "
+                  f"{_percentile(latencies, 0.95) * 1000:>9.1f} {_percentile(latencies, 0.99) * 1000:>9.1f} "
+                  f"{errors:>7}")
+        if 'sync' in results and 'async' in results and results['sync']:
+            print(f"\nasync throughput is {results['async'] / results['sync']:.2f}x sync")
+    finally:
+        if proxy is not None:
+            proxy.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,120 @@
+"""
+Compare accepting price recommendations one at a time through the
+update_price view with the bulk apply (recommendation_apply) path.
+
+Generates a synthetic tenant with one pending recommendation per product,
+plus an older competing one for --superseded products, applies --sample
+of them through POST /products/<id>/update_price, then applies all
+pending ones with a single apply_recommendations call, and reports
+recommendations per second for both.
+
+Afterwards it checks that product statistics match the raw tables, that
+every product carries its newest recommended price, and that applying
+"all pending" a second time changes nothing (superseded recommendations
+must not be applied later).
+
+    python benchmarks/bulk_apply_benchmark.py
+    python benchmarks/bulk_apply_benchmark.py --products 50000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=10000)
+    parser.add_argument('--sample', type=int, default=200, help='Recommendations applied one request at a time.')
+    parser.add_argument('--superseded', type=int, default=500,
+                        help='Products given an extra, older pending recommendation.')
+    parser.add_argument('--seed', type=int, default=42)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    workdir = tempfile.mkdtemp(prefix='priceflex_apply_bench_')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ['CACHE_BACKEND'] = 'null'
+    sys.path.insert(0, ROOT)
+
+    import logging
+    from datetime import timedelta
+    from sqlalchemy import select, update, insert
+    from app import app, db
+    from models import Product, PriceRecommendation
+    from benchmarks.synthetic import TenantSpec, generate, user_email, PASSWORD
+    from product_stats import rebuild_product_stats
+    from recommendation_apply import apply_recommendations
+
+    logging.getLogger().setLevel(logging.WARNING)
+
+    spec = TenantSpec(
+        users=1, products_per_user=args.products, sales_per_product=2, competitor_prices_per_product=2,
+        history_depth=2, recommendations_per_product=1, seed=args.seed
+    )
+    with app.app_context():
+        db.create_all()
+        user_id = generate(spec)[1]
+        rebuild_product_stats()
+        # Every recommendation pending and within its product's bounds
+        db.session.execute(update(PriceRecommendation).values(status='pending'))
+        db.session.execute(
+            update(Product).where(Product.user_id == user_id).values(minimum_price=None, maximum_price=None)
+        )
+        db.session.commit()
+        pending = db.session.execute(
+            select(
+                PriceRecommendation.id, PriceRecommendation.product_id, PriceRecommendation.recommended_price,
+                PriceRecommendation.current_price, PriceRecommendation.created_at
+            ).order_by(PriceRecommendation.id)
+        ).all()
+        # Older competing recommendations that the bulk apply must reject, not leave pending
+        competing = pending[args.sample:args.sample + args.superseded]
+        if competing:
+            db.session.execute(insert(PriceRecommendation), [
+                {
+                    'product_id': row.product_id, 'recommended_price': round(row.recommended_price * 1.05, 2),
+                    'current_price': row.current_price, 'created_at': row.created_at - timedelta(days=1),
+                    'status': 'pending'
+                }
+                for row in competing
+            ])
+            db.session.commit()
+
+    client = app.test_client()
+    client.post('/login', data={'email': user_email(1), 'password': PASSWORD})
+
+    sample, rest = pending[:args.sample], pending[args.sample:]
+    started = time.perf_counter()
+    for recommendation_id, product_id, price, _, _ in sample:
+        response = client.post(f'/products/{product_id}/update_price',
+                               data={'new_price': price, 'recommendation_id': recommendation_id})
+        if response.status_code != 302:
+            raise RuntimeError(f'update_price answered {response.status_code}')
+    single_elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        report = apply_recommendations(user_id)
+        repeated = apply_recommendations(user_id)
+        stale = len(rebuild_product_stats(check_only=True)[1])
+        prices = dict(db.session.execute(select(Product.id, Product.current_price)).all())
+        wrong_price = sum(1 for row in rest if prices[row.product_id] != row.recommended_price)
+
+    single_rate = len(sample) / single_elapsed
+    print(f"{len(pending):,} pending recommendations for {args.products:,} products:")
+    print(f"  update_price, one request each   {len(sample):>7,} in {single_elapsed:7.2f}s  {single_rate:10.1f}/s")
+    print(f"  bulk apply, one transaction      {report['applied']:>7,} in {report['elapsed_seconds']:7.2f}s  "
+          f"{report['recommendations_per_second']:10.1f}/s  ({report['recommendations_per_second'] / single_rate:.0f}x)")
+    print(f"  superseded: {report['rejected']} of {len(competing)}, applied by a second run: {repeated['applied']}")
+    print(f"  products without their newest price: {wrong_price}, with out-of-date stats: {stale}")
+    ok = report['rejected'] == len(competing) and repeated['applied'] == 0 and wrong_price == 0 and stale == 0
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
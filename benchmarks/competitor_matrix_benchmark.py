@@ -0,0 +1,109 @@
+"""
+Compare building the product x competitor price matrix from the raw
+competitor price table (row_number window over every observation) with
+reading the maintained latest-price snapshot.
+
+Generates a synthetic tenant with --observations competitor prices per
+product, times both lookups for the whole catalog, and checks that they
+produce the same matrix.
+
+    python benchmarks/competitor_matrix_benchmark.py
+    python benchmarks/competitor_matrix_benchmark.py --products 10000 --observations 50
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=5000)
+    parser.add_argument('--observations', type=int, default=30, help='Competitor prices per product.')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    return parser.parse_args()
+
+
+def timed(run, repeat):
+    samples, result = [], None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = run()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples), result
+
+
+def main():
+    args = parse_args()
+    workdir = tempfile.mkdtemp(prefix='priceflex_matrix_bench_')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ['CACHE_BACKEND'] = 'null'
+    sys.path.insert(0, ROOT)
+
+    import logging
+    import numpy as np
+    from sqlalchemy import select, func
+    from app import app, db
+    from models import Product, CompetitorPrice
+    from benchmarks.synthetic import TenantSpec, generate
+    from competitor_snapshot import competitor_matrix
+
+    logging.getLogger().setLevel(logging.WARNING)
+
+    spec = TenantSpec(
+        users=1, products_per_user=args.products, sales_per_product=1,
+        competitor_prices_per_product=args.observations, history_depth=1, recommendations_per_product=0,
+        seed=args.seed
+    )
+
+    with app.app_context():
+        db.create_all()
+        user_id = generate(spec)[1]
+        product_ids = db.session.scalars(
+            select(Product.id).where(Product.user_id == user_id).order_by(Product.id)
+        ).all()
+
+        def window_matrix():
+            ranked = select(
+                CompetitorPrice.product_id,
+                CompetitorPrice.competitor_id,
+                CompetitorPrice.price,
+                func.row_number().over(
+                    partition_by=(CompetitorPrice.product_id, CompetitorPrice.competitor_id),
+                    order_by=(CompetitorPrice.date_recorded.desc(), CompetitorPrice.id.desc())
+                ).label('position')
+            ).join(Product, Product.id == CompetitorPrice.product_id).where(Product.user_id == user_id).subquery()
+            return {
+                (row.product_id, row.competitor_id): row.price
+                for row in db.session.execute(select(ranked).where(ranked.c.position == 1))
+            }
+
+        def snapshot_matrix():
+            return competitor_matrix(user_id, product_ids)
+
+        rows = db.session.scalar(select(func.count()).select_from(CompetitorPrice))
+        window_ms, expected = timed(window_matrix, args.repeat)
+        snapshot_ms, matrix = timed(snapshot_matrix, args.repeat)
+
+        rows_index, cols_index = np.nonzero(~np.isnan(matrix['prices']))
+        actual = {
+            (int(matrix['product_ids'][i]), int(matrix['competitor_ids'][j])): float(matrix['prices'][i, j])
+            for i, j in zip(rows_index, cols_index)
+        }
+        matches = actual == expected
+
+    print(f"{len(product_ids):,} products x {len(matrix['competitor_ids'])} competitors "
+          f"from {rows:,} competitor price rows ({len(expected):,} latest prices):")
+    print(f"  window over competitor_price  {window_ms:10.1f} ms")
+    print(f"  latest-price snapshot         {snapshot_ms:10.1f} ms  ({window_ms / snapshot_ms:.1f}x)")
+    print(f"  results match: {matches}")
+    return 0 if matches else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,179 @@
+"""
+Measure query latency of the per-product time-series access paths with and
+without the secondary indexes declared in models.py.
+
+Generates a synthetic dataset (millions of sales by default) in the target
+database on first run, then times each query with the indexes dropped and
+again after recreating them.
+
+    python benchmarks/index_benchmark.py --database-url sqlite:////tmp/bench.db
+    python benchmarks/index_benchmark.py --database-url postgresql://... --sales 5000000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', default='sqlite:////tmp/priceflex_index_bench.db')
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--products-per-user', type=int, default=500)
+    parser.add_argument('--sales', type=int, default=2_000_000)
+    parser.add_argument('--competitor-prices', type=int, default=500_000)
+    parser.add_argument('--price-history', type=int, default=200_000)
+    parser.add_argument('--recommendations', type=int, default=200_000)
+    parser.add_argument('--repeat', type=int, default=50, help='Executions per query and phase.')
+    parser.add_argument('--seed', type=int, default=42)
+    return parser.parse_args()
+
+
+def insert_chunks(conn, table, rows, chunk_size=50_000):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            conn.execute(table.insert(), chunk)
+            chunk = []
+    if chunk:
+        conn.execute(table.insert(), chunk)
+
+
+def generate(conn, args, models):
+    rnd = random.Random(args.seed)
+    now = datetime.utcnow()
+
+    def when(days):
+        return now - timedelta(seconds=rnd.uniform(0, days * 86400))
+
+    insert_chunks(conn, models.User.__table__, (
+        {'id': u, 'username': f'bench{u}', 'email': f'bench{u}@example.com', 'password_hash': 'x'}
+        for u in range(1, args.users + 1)
+    ))
+    product_count = args.users * args.products_per_user
+    insert_chunks(conn, models.Product.__table__, (
+        {'id': p, 'name': f'Product {p}', 'cost_price': 50.0, 'current_price': 100.0,
+         'stock_level': 100, 'user_id': (p - 1) // args.products_per_user + 1}
+        for p in range(1, product_count + 1)
+    ))
+    competitor_count = args.users * 5
+    insert_chunks(conn, models.Competitor.__table__, (
+        {'id': c, 'name': f'Competitor {c}', 'user_id': (c - 1) // 5 + 1}
+        for c in range(1, competitor_count + 1)
+    ))
+    insert_chunks(conn, models.Sale.__table__, (
+        {'product_id': rnd.randint(1, product_count), 'quantity': rnd.randint(1, 10),
+         'price': rnd.uniform(80, 120), 'sale_date': when(365)}
+        for _ in range(args.sales)
+    ))
+    insert_chunks(conn, models.CompetitorPrice.__table__, (
+        {'product_id': rnd.randint(1, product_count), 'competitor_id': rnd.randint(1, competitor_count),
+         'price': rnd.uniform(80, 120), 'date_recorded': when(365)}
+        for _ in range(args.competitor_prices)
+    ))
+    insert_chunks(conn, models.PriceHistory.__table__, (
+        {'product_id': rnd.randint(1, product_count), 'price': rnd.uniform(80, 120), 'date_changed': when(365)}
+        for _ in range(args.price_history)
+    ))
+    insert_chunks(conn, models.PriceRecommendation.__table__, (
+        {'product_id': rnd.randint(1, product_count), 'recommended_price': 99.99, 'current_price': 100.0,
+         'rationale': '', 'factors': '{}', 'status': 'pending', 'created_at': when(365)}
+        for _ in range(args.recommendations)
+    ))
+
+
+def benchmark_queries(models, select, func):
+    Product, Sale = models.Product, models.Sale
+    CompetitorPrice, PriceHistory = models.CompetitorPrice, models.PriceHistory
+    PriceRecommendation = models.PriceRecommendation
+    month_ago = datetime.utcnow() - timedelta(days=30)
+
+    return {
+        'product_detail: recent sales': lambda p, u: select(Sale).where(
+            Sale.product_id == p).order_by(Sale.sale_date.desc()).limit(30),
+        'optimizer: 30-day sales': lambda p, u: select(func.count(), func.sum(Sale.quantity)).where(
+            Sale.product_id == p, Sale.sale_date > month_ago),
+        'product_detail: competitor prices': lambda p, u: select(CompetitorPrice).where(
+            CompetitorPrice.product_id == p).order_by(CompetitorPrice.date_recorded.desc()),
+        'product_detail: price history': lambda p, u: select(PriceHistory).where(
+            PriceHistory.product_id == p).order_by(PriceHistory.date_changed),
+        'product_detail: recommendations': lambda p, u: select(PriceRecommendation).where(
+            PriceRecommendation.product_id == p).order_by(PriceRecommendation.created_at.desc()).limit(5),
+        'products: by user': lambda p, u: select(Product).where(Product.user_id == u),
+        'dashboard: 30-day sales join': lambda p, u: select(func.count(), func.sum(Sale.quantity * Sale.price)).join(
+            Product).where(Product.user_id == u, Sale.sale_date >= month_ago),
+    }
+
+
+def time_queries(conn, queries, args, product_count):
+    rnd = random.Random(args.seed)
+    results = {}
+    for name, build in queries.items():
+        samples = []
+        for _ in range(args.repeat):
+            product_id = rnd.randint(1, product_count)
+            user_id = (product_id - 1) // args.products_per_user + 1
+            statement = build(product_id, user_id)
+            started = time.perf_counter()
+            conn.execute(statement).all()
+            samples.append((time.perf_counter() - started) * 1000)
+        samples.sort()
+        results[name] = (statistics.mean(samples), samples[int(len(samples) * 0.95) - 1])
+    return results
+
+
+def main():
+    args = parse_args()
+    os.environ['DATABASE_URL'] = args.database_url
+    sys.path.insert(0, ROOT)
+
+    import logging
+    from sqlalchemy import select, func, text
+    from app import app, db
+    import models
+
+    logging.getLogger().setLevel(logging.WARNING)
+
+    with app.app_context():
+        db.create_all()
+        engine = db.engine
+        indexes = [index for table in db.metadata.sorted_tables for index in table.indexes if not index.unique]
+        product_count = args.users * args.products_per_user
+
+        with engine.begin() as conn:
+            existing = conn.execute(select(func.count()).select_from(models.Sale.__table__)).scalar()
+        if not existing:
+            print(f"Generating {args.sales:,} sales for {product_count:,} products...")
+            started = time.perf_counter()
+            with engine.begin() as conn:
+                generate(conn, args, models)
+            print(f"  done in {time.perf_counter() - started:.1f}s")
+
+        queries = benchmark_queries(models, select, func)
+        phases = {}
+        for phase in ('without indexes', 'with indexes'):
+            with engine.begin() as conn:
+                for index in indexes:
+                    if phase == 'without indexes':
+                        index.drop(conn, checkfirst=True)
+                    else:
+                        index.create(conn, checkfirst=True)
+                conn.execute(text('ANALYZE'))
+            with engine.connect() as conn:
+                phases[phase] = time_queries(conn, queries, args, product_count)
+
+        print(f"\n{'query':40} {'before mean/p95 (ms)':>24} {'after mean/p95 (ms)':>24} {'speedup':>9}")
+        for name in queries:
+            before, after = phases['without indexes'][name], phases['with indexes'][name]
+            print(f"{name:40} {before[0]:>12.2f}/{before[1]:<11.2f} {after[0]:>12.2f}/{after[1]:<11.2f} "
+                  f"{before[0] / max(after[0], 1e-6):>8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+"""
+Measure how long a fresh process takes to import the application, and how
+long gunicorn takes to answer its first request with and without
+--preload.
+
+Each import sample runs `import app` in a new interpreter against an empty
+SQLite database. --compare REV repeats the import samples on another git
+revision (exported to a temporary directory) so the gain of a change can be
+read off directly.
+
+    python benchmarks/startup_benchmark.py
+    python benchmarks/startup_benchmark.py --compare HEAD~1 --repeat 10
+    python benchmarks/startup_benchmark.py --gunicorn --workers 4
+"""
+import argparse
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in the child: time the import itself and list the heavy modules it loaded
+IMPORT_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import app
+elapsed = time.perf_counter() - started
+heavy = sorted(name for name in ('pandas', 'sklearn', 'scipy') if name in sys.modules)
+print(json.dumps({'import_seconds': elapsed, 'modules': len(sys.modules), 'heavy': heavy}))
+"""
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5, help='Fresh interpreters per measurement.')
+    parser.add_argument('--compare', metavar='REV', help='Also measure this git revision.')
+    parser.add_argument('--gunicorn', action='store_true', help='Also time gunicorn boot with and without --preload.')
+    parser.add_argument('--workers', type=int, default=2, help='Gunicorn workers for --gunicorn.')
+    parser.add_argument('--timeout', type=float, default=60, help='Seconds to wait for gunicorn to answer.')
+    return parser.parse_args()
+
+
+def _environment(workdir):
+    env = dict(os.environ)
+    env['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'startup.db')}"
+    env['METRICS_DIR'] = os.path.join(workdir, 'metrics')
+    env['CACHE_BACKEND'] = 'null'
+    env['PYTHONDONTWRITEBYTECODE'] = '1'
+    return env
+
+
+def measure_import(source_dir, repeat):
+    """Median wall and import time of `import app` over fresh interpreters."""
+    walls, imports, last = [], [], None
+    for _ in range(repeat):
+        workdir = tempfile.mkdtemp(prefix='priceflex_startup_')
+        try:
+            started = time.perf_counter()
+            output = subprocess.run(
+                [sys.executable, '-c', IMPORT_PROBE], cwd=source_dir, env=_environment(workdir),
+                capture_output=True, text=True, check=True
+            ).stdout
+            walls.append(time.perf_counter() - started)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+        last = json.loads(output.strip().splitlines()[-1])
+        imports.append(last['import_seconds'])
+    return {
+        'process_ms': round(statistics.median(walls) * 1000, 1),
+        'import_ms': round(statistics.median(imports) * 1000, 1),
+        'modules': last['modules'],
+        'heavy_modules': last['heavy']
+    }
+
+
+def export_revision(revision):
+    target = tempfile.mkdtemp(prefix='priceflex_rev_')
+    archive = subprocess.run(['git', 'archive', revision], cwd=ROOT, capture_output=True, check=True).stdout
+    subprocess.run(['tar', '-x', '-C', target], input=archive, check=True)
+    return target
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def measure_gunicorn(preload, workers, timeout):
+    """Seconds from launching gunicorn until a request is answered."""
+    workdir = tempfile.mkdtemp(prefix='priceflex_startup_')
+    env = _environment(workdir)
+    env['GUNICORN_PRELOAD'] = '1' if preload else '0'
+    port = _free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}', '--workers', str(workers), 'app:app'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                # Any HTTP answer, even an error status, means a worker is serving
+                urllib.request.urlopen(f'http://127.0.0.1:{port}/login', timeout=1).close()
+                return time.perf_counter() - started
+            except urllib.error.HTTPError:
+                return time.perf_counter() - started
+            except OSError:
+                time.sleep(0.02)
+        raise RuntimeError(f'gunicorn did not answer within {timeout}s')
+    finally:
+        server.terminate()
+        server.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    args = parse_args()
+    targets = [('working tree', ROOT)]
+    exported = None
+    if args.compare:
+        exported = export_revision(args.compare)
+        targets.append((args.compare, exported))
+
+    try:
+        print(f"{'source':20} {'process ms':>11} {'import ms':>10} {'modules':>8}  heavy modules")
+        results = {}
+        for label, source_dir in targets:
+            result = results[label] = measure_import(source_dir, args.repeat)
+            print(f"{label:20} {result['process_ms']:>11.1f} {result['import_ms']:>10.1f} "
+                  f"{result['modules']:>8}  {', '.join(result['heavy_modules']) or '-'}")
+        if args.compare:
+            current, previous = results['working tree'], results[args.compare]
+            print(f"\nImport is {previous['import_ms'] - current['import_ms']:.0f}ms faster "
+                  f"({previous['import_ms'] / current['import_ms']:.1f}x) than {args.compare}")
+    finally:
+        if exported:
+            shutil.rmtree(exported, ignore_errors=True)
+
+    if args.gunicorn:
+        print(f"\n{'gunicorn':20} {'first response ms':>18}")
+        for preload in (False, True):
+            samples = [measure_gunicorn(preload, args.workers, args.timeout) for _ in range(args.repeat)]
+            label = f"{args.workers} workers{' --preload' if preload else ''}"
+            print(f"{label:20} {statistics.median(samples) * 1000:>18.1f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
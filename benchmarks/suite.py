@@ -0,0 +1,360 @@
+"""
+Latency and query-count benchmarks for the optimizer, chart helpers and the
+main routes, run through the Flask test client against a fresh SQLite
+database populated by benchmarks/synthetic.py.
+
+Each scenario is timed over --repeat runs after a warm-up; the median, p95
+and number of SQL statements per run are written to --output and compared
+with the stored baseline. Statements are counted with query_guard, and
+every scenario also runs once under query_guard.assert_max_queries with
+its budget from QUERY_BUDGETS and the N+1 detector enabled. The run fails
+(exit status 1) when a scenario exceeds its budget, repeats a statement
+shape REPEAT_THRESHOLD times, or issues more queries than the baseline did.
+
+Timings are compared after dividing them by a fixed calibration workload
+timed in the same run, so a slower or busier machine does not show up as
+a regression. A normalized median more than --threshold above the
+baseline is reported as a warning; with --fail-on-timing it fails the run,
+but only when the baseline was recorded in the same environment (Python,
+SQLite, architecture and CPU count).
+
+    python benchmarks/suite.py                      # compare with benchmarks/baseline.json
+    python benchmarks/suite.py --update-baseline    # record a new baseline on this machine
+    python benchmarks/suite.py --only routes. --repeat 50
+    python benchmarks/suite.py --fail-on-timing     # CI runner that recorded the baseline
+"""
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(ROOT, 'benchmarks', 'baseline.json')
+
+# Timing regressions smaller than this are treated as noise
+MIN_REGRESSION_MS = 0.5
+
+# Statements each scenario may issue per run
+QUERY_BUDGETS = {
+    'optimizer.prepare_features': 0,
+    'optimizer.optimize_price': 0,
+    'optimizer.optimize_features': 0,
+    'optimizer.tenant_batch': 1,
+    'optimizer.simulate': 0,
+    'utils.get_date_range_data': 0,
+    'routes.dashboard': 6,
+    'routes.products': 1,
+    'routes.product_detail': 5,
+    'routes.competitors': 4,
+    'routes.api_product_data': 4,
+    'routes.api_product_data_not_modified': 1,
+    'routes.api_dashboard_data_30': 3,
+    'routes.api_dashboard_data_365': 3,
+    'routes.api_simulate_product': 2,
+    'routes.api_simulate_products': 3,
+    'routes.api_competitor_matrix': 4,
+    'routes.add_sale': 10,
+}
+
+# A statement shape executed this many times in one run is reported as a possible N+1
+REPEAT_THRESHOLD = 3
+
+# Environment fields that must match the baseline's for --fail-on-timing to apply
+TIMING_ENVIRONMENT = ('python', 'sqlite', 'machine', 'cpu_count')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=2)
+    parser.add_argument('--products-per-user', type=int, default=200)
+    parser.add_argument('--sales-per-product', type=int, default=60)
+    parser.add_argument('--competitors-per-user', type=int, default=5)
+    parser.add_argument('--competitor-prices-per-product', type=int, default=12)
+    parser.add_argument('--history-depth', type=int, default=8)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=20, help='Timed runs per scenario.')
+    parser.add_argument('--warmup', type=int, default=2, help='Untimed runs per scenario.')
+    parser.add_argument('--only', help='Run only scenarios whose name starts with this prefix.')
+    parser.add_argument('--output', default=os.path.join(tempfile.gettempdir(), 'priceflex_benchmarks.json'))
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--update-baseline', action='store_true', help='Write the results as the new baseline.')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='Allowed slowdown of the normalized median versus baseline (0.25 = 25%%).')
+    parser.add_argument('--fail-on-timing', action='store_true',
+                        help='Fail on timing regressions when the baseline environment matches.')
+    parser.add_argument('--cache', default='null',
+                        help='CACHE_BACKEND for the run; the default disables the response cache.')
+    return parser.parse_args()
+
+
+def measure(run, repeat, warmup):
+    from query_guard import track_queries
+
+    for _ in range(warmup):
+        run()
+    samples, queries = [], []
+    for _ in range(repeat):
+        with track_queries(capture_sites=False) as tracker:
+            started = time.perf_counter()
+            run()
+            samples.append((time.perf_counter() - started) * 1000)
+        queries.append(tracker.statements)
+    samples.sort()
+    return {
+        'median_ms': round(statistics.median(samples), 3),
+        'p95_ms': round(samples[max(int(len(samples) * 0.95) - 1, 0)], 3),
+        'mean_ms': round(statistics.mean(samples), 3),
+        'queries': int(statistics.median(queries)),
+        'runs': repeat
+    }
+
+
+def check_budget(name, run):
+    """Run a scenario once under its query budget; returns the violation, or None."""
+    from query_guard import assert_max_queries, QueryBudgetExceeded
+
+    if name not in QUERY_BUDGETS:
+        return f"{name}: no entry in QUERY_BUDGETS"
+    try:
+        with assert_max_queries(QUERY_BUDGETS[name], REPEAT_THRESHOLD):
+            run()
+    except QueryBudgetExceeded as e:
+        return f"{name}: {e}"
+    return None
+
+
+def calibrate(repeat=15):
+    """
+    Median ms of a fixed in-memory SQLite and pure-Python workload, the
+    unit scenario timings are normalized by.
+    """
+    connection = sqlite3.connect(':memory:')
+    connection.execute('CREATE TABLE calibration (id INTEGER PRIMARY KEY, value REAL)')
+    connection.executemany('INSERT INTO calibration (value) VALUES (?)', ((i * 0.5,) for i in range(20000)))
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        connection.execute('SELECT count(*), sum(value) FROM calibration WHERE value > 100').fetchone()
+        sorted(str(i) for i in range(20000))
+        samples.append((time.perf_counter() - started) * 1000)
+    connection.close()
+    return statistics.median(samples)
+
+
+def build_scenarios(client, user_id, product_id):
+    """Return {name: callable}; each callable performs one benchmarked operation."""
+    from app import db
+    from models import Product, Sale
+    from price_optimizer import PriceOptimizer
+    from feature_loader import load_feature_rows
+    from utils import get_date_range_data
+
+    optimizer = PriceOptimizer()
+    product = db.session.get(Product, product_id)
+    sales = product.sales.all()
+    competitor_prices = product.competitor_prices.all()
+    price_history = product.price_histories.order_by('date_changed').all()
+    features = optimizer.prepare_features(product, sales, competitor_prices, price_history)
+    grid = optimizer.relative_price_grid([product.current_price], 0.5, 1.5, 501)
+    tenant_sales = Sale.query.join(Product).filter(Product.user_id == user_id).all()
+    tenant_ids = [row.id for row in Product.query.filter_by(user_id=user_id).with_entities(Product.id)]
+
+    def tenant_batch():
+        rows = load_feature_rows(tenant_ids)
+        optimizer.optimize_prepared(rows, [optimizer.features_from_aggregates(row, row._mapping) for row in rows])
+
+    def get(url, **kwargs):
+        def run():
+            response = client.get(url, **kwargs)
+            response.get_data()
+            assert response.status_code in (200, 304), (url, response.status_code)
+            response.close()
+        return run
+
+    product_data_url = f'/api/product_data/{product_id}'
+    etag = client.get(product_data_url).headers.get('ETag')
+
+    def add_sale():
+        response = client.post(f'/products/{product_id}/add_sale', data={'quantity': 1, 'price': product.current_price})
+        assert response.status_code == 302, response.status_code
+
+    return {
+        'optimizer.prepare_features': lambda: optimizer.prepare_features(product, sales, competitor_prices, price_history),
+        'optimizer.optimize_price': lambda: optimizer.optimize_price(product, sales, competitor_prices, price_history),
+        'optimizer.optimize_features': lambda: optimizer.optimize_features(product, features),
+        'optimizer.tenant_batch': tenant_batch,
+        'optimizer.simulate': lambda: optimizer.simulate(product, grid, features),
+        'utils.get_date_range_data': lambda: get_date_range_data(tenant_sales, 'sale_date', 30),
+        'routes.dashboard': get('/dashboard'),
+        'routes.products': get('/products'),
+        'routes.product_detail': get(f'/products/{product_id}'),
+        'routes.competitors': get('/competitors'),
+        'routes.api_product_data': get(product_data_url),
+        'routes.api_product_data_not_modified': get(product_data_url, headers={'If-None-Match': etag}),
+        'routes.api_dashboard_data_30': get('/api/dashboard_data?days=30'),
+        'routes.api_dashboard_data_365': get('/api/dashboard_data?days=365'),
+        'routes.api_simulate_product': get(f'/api/products/{product_id}/simulate'),
+        'routes.api_simulate_products': get('/api/products/simulate?points=21'),
+        'routes.api_competitor_matrix': get('/api/competitor_matrix'),
+        'routes.add_sale': add_sale,
+    }
+
+
+def compare(results, baseline, threshold):
+    """
+    Return (query regressions, timing regressions) of results versus
+    baseline as human readable lines. Timings are scaled by the ratio of
+    the two runs' calibration times before they are compared.
+    """
+    scale = 1.0
+    calibration = results['environment'].get('calibration_ms')
+    previous_calibration = baseline.get('environment', {}).get('calibration_ms')
+    if calibration and previous_calibration:
+        scale = previous_calibration / calibration
+
+    query_regressions, timing_regressions = [], []
+    for name, result in results['scenarios'].items():
+        previous = baseline['scenarios'].get(name)
+        if previous is None:
+            continue
+        if result['queries'] > previous['queries']:
+            query_regressions.append(f"{name}: {result['queries']} queries vs baseline {previous['queries']}")
+        median = result['median_ms'] * scale
+        slowdown = median - previous['median_ms']
+        if median > previous['median_ms'] * (1 + threshold) and slowdown > MIN_REGRESSION_MS:
+            timing_regressions.append(
+                f"{name}: normalized median {median:.2f}ms vs baseline {previous['median_ms']:.2f}ms "
+                f"(+{slowdown / previous['median_ms']:.0%}, measured {result['median_ms']:.2f}ms)"
+            )
+    return query_regressions, timing_regressions
+
+
+def main():
+    args = parse_args()
+    workdir = tempfile.mkdtemp(prefix='priceflex_bench_')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ['CACHE_BACKEND'] = args.cache
+    os.environ['CACHE_PATH'] = os.path.join(workdir, 'response_cache.sqlite')
+    sys.path.insert(0, ROOT)
+
+    import logging
+    from sqlalchemy import select, func
+    from app import app, db
+    from models import Product
+    from benchmarks.synthetic import TenantSpec, generate, user_email, PASSWORD
+
+    logging.getLogger().setLevel(logging.WARNING)
+
+    spec = TenantSpec(
+        users=args.users,
+        products_per_user=args.products_per_user,
+        sales_per_product=args.sales_per_product,
+        competitors_per_user=args.competitors_per_user,
+        competitor_prices_per_product=args.competitor_prices_per_product,
+        history_depth=args.history_depth,
+        seed=args.seed
+    )
+
+    with app.app_context():
+        db.create_all()
+        started = time.perf_counter()
+        users = generate(spec)
+        print(f"Generated {spec.users * spec.products_per_user:,} products and "
+              f"{spec.users * spec.products_per_user * spec.sales_per_product:,} sales "
+              f"in {time.perf_counter() - started:.1f}s")
+
+        user_id = users[1]
+        product_id = db.session.scalar(select(func.min(Product.id)).where(Product.user_id == user_id))
+
+        client = app.test_client()
+        response = client.post('/login', data={'email': user_email(1), 'password': PASSWORD})
+        assert response.status_code == 302, 'benchmark login failed'
+
+        scenarios = build_scenarios(client, user_id, product_id)
+        budget_violations = []
+
+        results = {
+            'spec': spec.as_dict(),
+            'environment': {
+                'python': platform.python_version(),
+                'sqlite': sqlite3.sqlite_version,
+                'machine': platform.machine(),
+                'cpu_count': os.cpu_count(),
+                'cache_backend': args.cache
+            },
+            'scenarios': {}
+        }
+        calibration = [calibrate()]
+        print(f"\n{'scenario':40} {'median ms':>10} {'p95 ms':>10} {'queries':>8}")
+        for name, run in scenarios.items():
+            if args.only and not name.startswith(args.only):
+                continue
+            result = measure(run, args.repeat, args.warmup)
+            results['scenarios'][name] = result
+            print(f"{name:40} {result['median_ms']:>10.2f} {result['p95_ms']:>10.2f} {result['queries']:>8}")
+            violation = check_budget(name, run)
+            if violation:
+                budget_violations.append(violation)
+        # Calibrated before and after the scenarios, so drift during the run is averaged out
+        calibration.append(calibrate())
+        results['environment']['calibration_ms'] = round(statistics.mean(calibration), 3)
+        print(f"{'calibration':40} {results['environment']['calibration_ms']:>10.2f}")
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    print(f"\nResults written to {args.output}")
+
+    if budget_violations:
+        print(f"\n{len(budget_violations)} query budget violation(s):")
+        for violation in budget_violations:
+            print(f"  {violation}")
+        return 1
+
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"Baseline updated: {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("No baseline found; run with --update-baseline to record one.")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get('spec') != results['spec'] or baseline.get('environment', {}).get('cache_backend') != args.cache:
+        print("Baseline was recorded with a different dataset or cache backend; re-run with matching "
+              "options or record a new baseline with --update-baseline.")
+        return 2
+
+    query_regressions, timing_regressions = compare(results, baseline, args.threshold)
+    differences = [
+        field for field in TIMING_ENVIRONMENT
+        if baseline.get('environment', {}).get(field) != results['environment'][field]
+    ]
+    fail_on_timing = args.fail_on_timing and not differences
+    if timing_regressions:
+        kind = 'regression(s)' if fail_on_timing else 'warning(s), not failing the run'
+        print(f"\n{len(timing_regressions)} timing {kind}:")
+        for regression in timing_regressions:
+            print(f"  {regression}")
+        if args.fail_on_timing and differences:
+            print(f"  (baseline environment differs in {', '.join(differences)}; timings are informational)")
+    if query_regressions:
+        print(f"\n{len(query_regressions)} query count regression(s) versus baseline:")
+        for regression in query_regressions:
+            print(f"  {regression}")
+    if query_regressions or (fail_on_timing and timing_regressions):
+        return 1
+    print("No regressions versus baseline.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,149 @@
+"""
+Deterministic synthetic tenants for benchmarks.
+
+The same TenantSpec and seed always produce the same rows; only the dates
+are anchored to the day the data is generated, so the dashboard windows
+that look back from "now" stay populated.
+
+    from benchmarks.synthetic import TenantSpec, generate
+    with app.app_context():
+        db.create_all()
+        generate(TenantSpec(users=2, products_per_user=100))
+"""
+import random
+from dataclasses import dataclass, asdict
+from datetime import datetime, timedelta
+
+from werkzeug.security import generate_password_hash
+
+PASSWORD = 'benchmark'
+
+CATEGORIES = ('Electronics', 'Home', 'Garden', 'Toys', 'Apparel', 'Grocery')
+
+
+@dataclass
+class TenantSpec:
+    users: int = 2
+    products_per_user: int = 200
+    sales_per_product: int = 60
+    competitors_per_user: int = 5
+    competitor_prices_per_product: int = 12
+    history_depth: int = 8
+    recommendations_per_product: int = 2
+    days: int = 120
+    seed: int = 42
+
+    def as_dict(self):
+        return asdict(self)
+
+
+def user_email(user_number):
+    return f'bench{user_number}@example.com'
+
+
+def _insert(table, rows, chunk_size=20000):
+    from app import db
+
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            db.session.execute(table.insert(), chunk)
+            chunk = []
+    if chunk:
+        db.session.execute(table.insert(), chunk)
+
+
+def generate(spec):
+    """
+    Populate the current database with spec.users tenants and build the
+    derived tables (product statistics, daily sales rollup). Must be
+    called inside an application context on an empty database. Returns
+    {user_number: user_id}.
+    """
+    from app import db
+    from models import (
+        User, Product, Sale, Competitor, CompetitorPrice, PriceHistory, PriceRecommendation
+    )
+    from product_stats import rebuild_product_stats
+    from sales_rollup import backfill_sales_rollup
+    from competitor_snapshot import backfill_competitor_snapshot
+
+    rnd = random.Random(spec.seed)
+    now = datetime.utcnow().replace(hour=12, minute=0, second=0, microsecond=0)
+    password_hash = generate_password_hash(PASSWORD)
+
+    def moment(max_days):
+        # Whole minutes keep the generated timestamps identical across runs on the same day
+        return now - timedelta(minutes=rnd.randrange(max_days * 24 * 60))
+
+    users = {}
+    product_id = 0
+    competitor_id = 0
+    for user_number in range(1, spec.users + 1):
+        user = User(
+            username=f'bench{user_number}',
+            email=user_email(user_number),
+            password_hash=password_hash,
+            company_name=f'Benchmark Retail {user_number}',
+            business_type='retail'
+        )
+        db.session.add(user)
+        db.session.flush()
+        users[user_number] = user.id
+
+        competitor_ids = list(range(competitor_id + 1, competitor_id + spec.competitors_per_user + 1))
+        competitor_id += spec.competitors_per_user
+        _insert(Competitor.__table__, (
+            {'id': cid, 'name': f'Competitor {cid}', 'website': f'https://competitor{cid}.example.com', 'user_id': user.id}
+            for cid in competitor_ids
+        ))
+
+        products, sales, competitor_prices, history, recommendations = [], [], [], [], []
+        for _ in range(spec.products_per_user):
+            product_id += 1
+            base = round(rnd.uniform(5, 500), 2)
+            products.append({
+                'id': product_id,
+                'name': f'Product {product_id}',
+                'category': rnd.choice(CATEGORIES),
+                'cost_price': round(base * rnd.uniform(0.4, 0.8), 2),
+                'current_price': base,
+                'minimum_price': round(base * 0.8, 2) if rnd.random() < 0.5 else None,
+                'maximum_price': round(base * 1.3, 2) if rnd.random() < 0.5 else None,
+                'stock_level': rnd.randint(0, 500),
+                'created_at': now - timedelta(days=spec.days),
+                'user_id': user.id
+            })
+            elasticity = rnd.uniform(-2.5, -0.3)
+            for _ in range(spec.sales_per_product):
+                price = base * rnd.uniform(0.85, 1.15)
+                quantity = max(1, int(round(5 * (price / base) ** elasticity * rnd.uniform(0.5, 1.5))))
+                sales.append({'product_id': product_id, 'quantity': quantity, 'price': round(price, 2),
+                              'sale_date': moment(spec.days)})
+            for _ in range(spec.competitor_prices_per_product if competitor_ids else 0):
+                competitor_prices.append({'product_id': product_id, 'competitor_id': rnd.choice(competitor_ids),
+                                          'price': round(base * rnd.uniform(0.8, 1.2), 2),
+                                          'date_recorded': moment(spec.days)})
+            for _ in range(spec.history_depth):
+                history.append({'product_id': product_id, 'price': round(base * rnd.uniform(0.9, 1.1), 2),
+                                'date_changed': moment(spec.days)})
+            for _ in range(spec.recommendations_per_product):
+                recommended = round(base * rnd.uniform(0.9, 1.1), 2)
+                recommendations.append({'product_id': product_id, 'recommended_price': recommended,
+                                        'current_price': base, 'potential_revenue_increase': 0.0,
+                                        'rationale': 'Synthetic recommendation', 'factors': '{}',
+                                        'status': rnd.choice(('pending', 'accepted', 'rejected')),
+                                        'created_at': moment(spec.days)})
+
+        _insert(Product.__table__, products)
+        _insert(Sale.__table__, sales)
+        _insert(CompetitorPrice.__table__, competitor_prices)
+        _insert(PriceHistory.__table__, history)
+        _insert(PriceRecommendation.__table__, recommendations)
+        db.session.commit()
+
+    backfill_competitor_snapshot()
+    rebuild_product_stats()
+    backfill_sales_rollup()
+    return users
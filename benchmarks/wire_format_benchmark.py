@@ -0,0 +1,92 @@
+"""
+Compare the row and columnar (format=columnar) shapes of the chart APIs,
+uncompressed and with gzip and brotli Content-Encoding.
+
+Generates one product with --sales sales and --competitor-prices competitor
+prices, signs in through the Flask test client and reports the body size
+and the median server time of /api/product_data/<id> and
+/api/dashboard_data?days=365 for every combination.
+
+    python benchmarks/wire_format_benchmark.py
+    python benchmarks/wire_format_benchmark.py --sales 20000 --competitor-prices 5000
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ENCODINGS = ('identity', 'gzip', 'br')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sales', type=int, default=5000)
+    parser.add_argument('--competitor-prices', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=42)
+    return parser.parse_args()
+
+
+def measure(client, path, encoding, repeat):
+    """(body bytes, median ms) of a GET, reading the whole (possibly streamed) body."""
+    samples, size = [], 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = client.get(path, headers={'Accept-Encoding': encoding})
+        size = len(response.get_data())
+        samples.append((time.perf_counter() - started) * 1000)
+        if response.status_code != 200:
+            raise RuntimeError(f'{path} answered {response.status_code}')
+    return size, statistics.median(samples)
+
+
+def main():
+    args = parse_args()
+    workdir = tempfile.mkdtemp(prefix='priceflex_wire_bench_')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ['CACHE_BACKEND'] = 'null'
+    sys.path.insert(0, ROOT)
+
+    import logging
+    from sqlalchemy import select
+    from app import app, db
+    from models import Product
+    from benchmarks.synthetic import TenantSpec, generate, user_email, PASSWORD
+
+    logging.getLogger().setLevel(logging.WARNING)
+
+    spec = TenantSpec(
+        users=1, products_per_user=1, sales_per_product=args.sales,
+        competitor_prices_per_product=args.competitor_prices, recommendations_per_product=0,
+        days=365, seed=args.seed
+    )
+    with app.app_context():
+        db.create_all()
+        user_id = generate(spec)[1]
+        product_id = db.session.scalar(select(Product.id).where(Product.user_id == user_id))
+
+    client = app.test_client()
+    client.post('/login', data={'email': user_email(1), 'password': PASSWORD})
+
+    print(f"1 product, {args.sales:,} sales, {args.competitor_prices:,} competitor prices; "
+          f"median of {args.repeat} requests\n")
+    print(f"{'endpoint':22} {'shape':9} {'encoding':9} {'bytes':>10} {'ms':>8}")
+    for name, path in (('product_data', f'/api/product_data/{product_id}'),
+                       ('dashboard_data (365d)', '/api/dashboard_data?days=365')):
+        baseline = None
+        for shape in ('rows', 'columnar'):
+            for encoding in ENCODINGS:
+                url = f"{path}{'&' if '?' in path else '?'}format={shape}"
+                size, ms = measure(client, url, encoding, args.repeat)
+                baseline = baseline or (size, ms)
+                print(f"{name:22} {shape:9} {encoding:9} {size:>10,} {ms:>8.2f}   "
+                      f"({baseline[0] / size:.1f}x smaller, {baseline[1] / ms:.1f}x faster than rows/identity)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
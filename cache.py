@@ -0,0 +1,254 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+from metrics import metrics
+
+_MISSING = object()
+
+
+class MemoryBackend:
+    """
+    Per-process LRU with TTL. Fast, but invalidations are only seen by the
+    worker that issued them, so entries in other workers live until expiry.
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        # Counters live outside the LRU so they are never evicted
+        self._counters = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISSING
+            value, expires = entry
+            if expires is not None and expires < time.time():
+                del self._entries[key]
+                return _MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._entries[key] = (value, time.time() + ttl if ttl else None)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def counter(self, key):
+        with self._lock:
+            return self._counters.get(key, 0)
+
+    def incr(self, key):
+        with self._lock:
+            self._counters[key] += 1
+            return self._counters[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SQLiteBackend:
+    """
+    Cache stored in a local SQLite file, shared by every worker process on
+    the host. Values are JSON encoded.
+    """
+
+    def __init__(self, path, maxsize=10000):
+        self.path = path
+        self.maxsize = maxsize
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connection() as connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS cache '
+                '(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL, accessed REAL NOT NULL)'
+            )
+            connection.execute('CREATE TABLE IF NOT EXISTS counters (key TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+
+    def _connection(self):
+        # One connection per thread and process; never shared across a fork
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def get(self, key):
+        connection = self._connection()
+        row = connection.execute('SELECT value, expires FROM cache WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return _MISSING
+        value, expires = row
+        now = time.time()
+        if expires is not None and expires < now:
+            connection.execute('DELETE FROM cache WHERE key = ?', (key,))
+            return _MISSING
+        connection.execute('UPDATE cache SET accessed = ? WHERE key = ?', (now, key))
+        return json.loads(value)
+
+    def set(self, key, value, ttl=None):
+        connection = self._connection()
+        now = time.time()
+        connection.execute(
+            'INSERT OR REPLACE INTO cache (key, value, expires, accessed) VALUES (?, ?, ?, ?)',
+            (key, json.dumps(value), now + ttl if ttl else None, now)
+        )
+        self._evict(connection, now)
+
+    def delete(self, key):
+        self._connection().execute('DELETE FROM cache WHERE key = ?', (key,))
+
+    def counter(self, key):
+        row = self._connection().execute('SELECT value FROM counters WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else 0
+
+    def incr(self, key):
+        connection = self._connection()
+        connection.execute(
+            'INSERT INTO counters (key, value) VALUES (?, 1) '
+            'ON CONFLICT(key) DO UPDATE SET value = value + 1',
+            (key,)
+        )
+        return self.counter(key)
+
+    def _evict(self, connection, now):
+        connection.execute('DELETE FROM cache WHERE expires IS NOT NULL AND expires < ?', (now,))
+        connection.execute(
+            'DELETE FROM cache WHERE key IN '
+            '(SELECT key FROM cache ORDER BY accessed DESC LIMIT -1 OFFSET ?)',
+            (self.maxsize,)
+        )
+
+    def clear(self):
+        self._connection().execute('DELETE FROM cache')
+
+
+class NullBackend:
+    """Disables caching while keeping the counters working."""
+
+    def get(self, key):
+        return _MISSING
+
+    def set(self, key, value, ttl=None):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def counter(self, key):
+        return 0
+
+    def incr(self, key):
+        return 0
+
+    def clear(self):
+        pass
+
+
+class ResponseCache:
+    """
+    Cache for per-user computed payloads with write-driven invalidation.
+
+    Keys embed a per-user generation number; invalidate_user bumps it so
+    every cached entry for that user is bypassed at once and ages out.
+    Callers also put the user's data version (and the day, for sliding
+    windows) into params, as in their ETags, so a write committed by a
+    process that cannot reach this backend still changes the key.
+    """
+
+    def __init__(self, app=None):
+        self.backend = NullBackend()
+        self.ttl = None
+        self._counters = defaultdict(lambda: {'hits': 0, 'misses': 0})
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('CACHE_BACKEND', 'memory')
+        app.config.setdefault('CACHE_TTL', 300)
+        app.config.setdefault('CACHE_MAXSIZE', 1024)
+        app.config.setdefault('CACHE_PATH', os.path.join(app.instance_path, 'response_cache.sqlite'))
+
+        kind = app.config['CACHE_BACKEND']
+        if kind == 'memory':
+            self.backend = MemoryBackend(app.config['CACHE_MAXSIZE'])
+        elif kind == 'sqlite':
+            self.backend = SQLiteBackend(app.config['CACHE_PATH'], app.config['CACHE_MAXSIZE'])
+        elif kind in ('null', 'none'):
+            self.backend = NullBackend()
+        else:
+            raise ValueError(f"Unknown CACHE_BACKEND '{kind}'")
+        self.ttl = app.config['CACHE_TTL']
+        app.extensions['response_cache'] = self
+
+    def _generation(self, user_id):
+        return self.backend.counter(f'generation:{user_id}')
+
+    def _key(self, namespace, user_id, params):
+        encoded = json.dumps(params, sort_keys=True, default=str)
+        return f'{namespace}:{user_id}:{self._generation(user_id)}:{encoded}'
+
+    def cached(self, namespace, user_id, params, compute, ttl=None):
+        """Return the cached value for (namespace, user, params), computing and storing it on a miss."""
+        key = self._key(namespace, user_id, params)
+        value = self.backend.get(key)
+        if value is not _MISSING:
+            self._count(namespace, 'hits')
+            return value
+
+        self._count(namespace, 'misses')
+        value = compute()
+        self.backend.set(key, value, ttl or self.ttl)
+        return value
+
+    async def cached_async(self, namespace, user_id, params, compute, ttl=None):
+        """cached() for the async API: compute is a coroutine function."""
+        key = self._key(namespace, user_id, params)
+        value = self.backend.get(key)
+        if value is not _MISSING:
+            self._count(namespace, 'hits')
+            return value
+
+        self._count(namespace, 'misses')
+        value = await compute()
+        self.backend.set(key, value, ttl or self.ttl)
+        return value
+
+    def invalidate_user(self, user_id):
+        """Drop every cached payload belonging to a user."""
+        self.backend.incr(f'generation:{user_id}')
+
+    def _count(self, namespace, outcome):
+        with self._lock:
+            self._counters[namespace][outcome] += 1
+        metrics.inc('priceflex_cache_requests_total', cache='response', namespace=namespace,
+                    result='hit' if outcome == 'hits' else 'miss')
+
+    def stats(self):
+        """Hit/miss counters per namespace for this process."""
+        with self._lock:
+            result = {}
+            for namespace, counts in self._counters.items():
+                total = counts['hits'] + counts['misses']
+                result[namespace] = dict(counts, hit_rate=round(counts['hits'] / total, 4) if total else None)
+            return result
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,253 @@
+import os
+
+import click
+
+from app import db
+from models import User, RepricingJob
+
+# Revision matching the schema db.create_all() built before migrations were tracked
+BASELINE_REVISION = 'fa3e758800fb'
+
+
+def register_commands(app):
+
+    @app.cli.command('init-db')
+    @click.option('--no-stamp', is_flag=True, help='Do not mark the migrations as applied.')
+    def init_db(no_stamp):
+        """Create any missing tables and mark the schema as migrated to head."""
+        from flask_migrate import stamp
+
+        db.create_all()
+        if not no_stamp:
+            stamp(directory=os.path.join(app.root_path, 'migrations'))
+        click.echo('Database tables created')
+
+    @app.cli.command('upgrade-db')
+    def upgrade_db():
+        """Bring the schema to head: create a new database, or apply pending migrations."""
+        from flask_migrate import stamp, upgrade
+        from sqlalchemy import inspect
+
+        directory = os.path.join(app.root_path, 'migrations')
+        tables = set(inspect(db.engine).get_table_names())
+        if 'user' not in tables:
+            db.create_all()
+            stamp(directory=directory)
+            click.echo('Database tables created')
+            return
+        if 'alembic_version' not in tables:
+            # Created by db.create_all() at import, before deployments ran migrations
+            stamp(directory=directory, revision=BASELINE_REVISION)
+        upgrade(directory=directory)
+        click.echo('Database schema upgraded')
+
+    @app.cli.command('reprice-catalog')
+    @click.option('--user', 'user_ref', required=True, help='Username or email of the catalog owner.')
+    @click.option('--workers', type=int, default=None, help='Process pool size (defaults to REPRICING_WORKERS).')
+    @click.option('--shard-size', type=int, default=None, help='Products per worker task.')
+    @click.option('--batch-size', type=int, default=None, help='Recommendations per bulk insert.')
+    def reprice_catalog(user_ref, workers, shard_size, batch_size):
+        """Generate price recommendations for every product a user owns."""
+        from repricing import run_repricing_job, job_status
+
+        user = User.query.filter((User.username == user_ref) | (User.email == user_ref)).first()
+        if user is None:
+            raise click.ClickException(f"No user found for '{user_ref}'")
+
+        job = RepricingJob(user_id=user.id, status='queued')
+        db.session.add(job)
+        db.session.commit()
+
+        job = run_repricing_job(job.id, workers=workers, shard_size=shard_size, batch_size=batch_size)
+        status = job_status(job)
+        click.echo(
+            f"Job {status['id']} {status['status']}: {status['processed_products']}/"
+            f"{status['total_products']} products, {status['recommendations_created']} recommendations"
+        )
+        if job.status == 'failed':
+            raise click.ClickException(job.error or 'Repricing job failed')
+
+    @app.cli.command('optimize-category')
+    @click.option('--user', 'user_ref', required=True, help='Username or email of the catalog owner.')
+    @click.option('--category', required=True, help='Product category to optimize jointly.')
+    @click.option('--objective', type=click.Choice(['revenue', 'margin']), default='revenue')
+    @click.option('--save', is_flag=True, help='Store the changed prices as pending recommendations.')
+    def optimize_category_command(user_ref, category, objective, save):
+        """Jointly optimize the prices of one category, accounting for cross-price effects."""
+        from category_optimizer import optimize_category, save_recommendations, CategoryOptimizationError
+
+        user = User.query.filter((User.username == user_ref) | (User.email == user_ref)).first()
+        if user is None:
+            raise click.ClickException(f"No user found for '{user_ref}'")
+
+        try:
+            result = optimize_category(user.id, category, objective)
+        except CategoryOptimizationError as e:
+            raise click.ClickException(str(e))
+
+        current, optimized = result['current'], result['optimized']
+        linked = sum(1 for entry in result['products'] if entry['cross_effects'])
+        click.echo(
+            f"{len(result['products'])} products ({linked} with cross effects) solved in "
+            f"{result['elapsed_seconds']}s after {result['iterations']} iterations"
+        )
+        click.echo(f"Revenue {current['revenue']:.2f} -> {optimized['revenue']:.2f}, "
+                   f"margin {current['margin']:.2f} -> {optimized['margin']:.2f} per {result['horizon_days']} days")
+        if save:
+            created = save_recommendations(user.id, result)
+            click.echo(f"Created {created} pending recommendations")
+
+    @app.cli.command('apply-recommendations')
+    @click.option('--user', 'user_ref', required=True, help='Username or email of the catalog owner.')
+    @click.option('--id', 'recommendation_ids', type=int, multiple=True, help='Recommendation to apply (repeatable).')
+    @click.option('--all-pending', is_flag=True, help='Apply every pending recommendation.')
+    @click.option('--min-revenue-increase', type=float, default=None,
+                  help='With --all-pending, only recommendations with at least this potential revenue increase.')
+    def apply_recommendations_command(user_ref, recommendation_ids, all_pending, min_revenue_increase):
+        """Accept price recommendations in bulk, in one transaction."""
+        from recommendation_apply import apply_recommendations
+        from cache import response_cache
+
+        if all_pending == bool(recommendation_ids):
+            raise click.ClickException("Pass either --id (repeatable) or --all-pending")
+        if min_revenue_increase is not None and not all_pending:
+            raise click.ClickException("--min-revenue-increase only applies with --all-pending")
+
+        user = User.query.filter((User.username == user_ref) | (User.email == user_ref)).first()
+        if user is None:
+            raise click.ClickException(f"No user found for '{user_ref}'")
+
+        report = apply_recommendations(
+            user.id, None if all_pending else list(recommendation_ids), min_revenue_increase
+        )
+        response_cache.invalidate_user(user.id)
+        click.echo(
+            f"Applied {report['applied']} of {report['requested']} recommendations in "
+            f"{report['elapsed_seconds']}s ({report['recommendations_per_second']} recommendations/s), "
+            f"{report['rejected']} rejected"
+        )
+        for rejected in report['rejected_recommendations'][:20]:
+            click.echo(f"  recommendation {rejected['id']}: {rejected['reason']}")
+
+    @app.cli.command('rebuild-product-stats')
+    @click.option('--product-id', 'product_ids', type=int, multiple=True, help='Limit to these products (repeatable).')
+    @click.option('--check', is_flag=True, help='Only report products whose stored stats differ from the raw tables.')
+    def rebuild_stats(product_ids, check):
+        """Recompute ProductStats from the raw sales, price and competitor tables."""
+        from product_stats import rebuild_product_stats
+
+        processed, mismatched = rebuild_product_stats(product_ids or None, check_only=check)
+        action = 'Checked' if check else 'Rebuilt'
+        click.echo(f"{action} stats for {processed} products, {len(mismatched)} out of date")
+        if mismatched:
+            click.echo('Out of date: ' + ', '.join(str(product_id) for product_id in mismatched[:50]))
+
+    @app.cli.command('backfill-sales-rollup')
+    @click.option('--user', 'user_ref', default=None, help='Limit to one username or email.')
+    def backfill_rollup(user_ref):
+        """Rebuild the daily sales rollup from the sales table."""
+        from sales_rollup import backfill_sales_rollup
+
+        user_id = None
+        if user_ref:
+            user = User.query.filter((User.username == user_ref) | (User.email == user_ref)).first()
+            if user is None:
+                raise click.ClickException(f"No user found for '{user_ref}'")
+            user_id = user.id
+
+        written = backfill_sales_rollup(user_id)
+        click.echo(f"Wrote {written} daily rollup rows")
+
+    @app.cli.command('backfill-competitor-snapshot')
+    @click.option('--user', 'user_ref', default=None, help='Limit to one username or email.')
+    def backfill_competitor_snapshot_command(user_ref):
+        """Rebuild the latest price per product and competitor from the competitor price table."""
+        from competitor_snapshot import backfill_competitor_snapshot
+
+        user_id = None
+        if user_ref:
+            user = User.query.filter((User.username == user_ref) | (User.email == user_ref)).first()
+            if user is None:
+                raise click.ClickException(f"No user found for '{user_ref}'")
+            user_id = user.id
+
+        written = backfill_competitor_snapshot(user_id)
+        click.echo(f"Wrote {written} latest competitor prices")
+
+    @app.cli.command('archive-sales')
+    @click.option('--user', 'user_ref', default=None, help='Limit to one username or email.')
+    @click.option('--older-than-days', type=int, default=None,
+                  help='Archive sales older than this many days (defaults to SALES_ARCHIVE_DAYS).')
+    def archive_sales_command(user_ref, older_than_days):
+        """Move old sales from the sale table into the columnar archive."""
+        from sales_archive import archive_sales
+
+        user_id = None
+        if user_ref:
+            user = User.query.filter((User.username == user_ref) | (User.email == user_ref)).first()
+            if user is None:
+                raise click.ClickException(f"No user found for '{user_ref}'")
+            user_id = user.id
+
+        try:
+            archived = archive_sales(user_id, older_than_days)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        click.echo(f"Archived {sum(archived.values())} sales for {len(archived)} users")
+
+    @app.cli.command('export-sales')
+    @click.argument('path', type=click.Path(dir_okay=False, writable=True))
+    @click.option('--user', 'user_ref', required=True, help='Username or email of the product owner.')
+    @click.option('--since', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+                  help='Only sales on or after this date.')
+    def export_sales_command(path, user_ref, since):
+        """Export a user's full sales history, archived sales included, as CSV."""
+        import csv
+        from sales_archive import load_sales_history
+
+        user = User.query.filter((User.username == user_ref) | (User.email == user_ref)).first()
+        if user is None:
+            raise click.ClickException(f"No user found for '{user_ref}'")
+
+        history = load_sales_history(user.id, start=since)
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['product_id', 'sale_date', 'quantity', 'price'])
+            writer.writerows(zip(
+                history['product_id'].tolist(),
+                history['sale_date'].astype(object),
+                history['quantity'].tolist(),
+                history['price'].tolist()
+            ))
+        click.echo(f"Exported {len(history['id'])} sales to {path}")
+
+    @app.cli.command('import-sales')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--user', 'user_ref', required=True, help='Username or email of the product owner.')
+    @click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), default=None,
+                  help='File format (detected from the extension by default).')
+    @click.option('--chunk-size', type=int, default=None, help='Rows validated and written per transaction.')
+    def import_sales_command(path, user_ref, fmt, chunk_size):
+        """Bulk import sales from a CSV or JSON Lines file."""
+        from sales_import import import_sales, detect_format, DEFAULT_CHUNK_SIZE
+
+        user = User.query.filter((User.username == user_ref) | (User.email == user_ref)).first()
+        if user is None:
+            raise click.ClickException(f"No user found for '{user_ref}'")
+
+        fmt = fmt or detect_format(path)
+        if fmt is None:
+            raise click.ClickException("Could not detect the file format, pass --format")
+
+        with open(path, 'rb') as stream:
+            report = import_sales(stream, fmt, user.id, chunk_size or DEFAULT_CHUNK_SIZE).as_dict()
+
+        click.echo(
+            f"Imported {report['rows_imported']} of {report['rows_read']} rows in "
+            f"{report['elapsed_seconds']}s ({report['rows_per_second']} rows/s), "
+            f"{report['rows_rejected']} rejected"
+        )
+        for rejected in report['rejected'][:20]:
+            click.echo(f"  line {rejected['line']}: {rejected['reason']}")
+        if report['error']:
+            raise click.ClickException(report['error'])
@@ -0,0 +1,165 @@
+import math
+import time
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import select, insert
+
+from app import db
+from models import Product, Competitor, CompetitorPrice
+from product_stats import record_competitor_prices
+from competitor_snapshot import latest_prices, record_competitor_prices as record_competitor_snapshot
+import data_versions
+
+# Largest number of observations accepted in one batch request
+MAX_BATCH_RECORDS = 200000
+
+# Products per IN (...) lookup
+LOOKUP_CHUNK_SIZE = 1000
+
+# Rejected records kept in the report; the rest are only counted
+MAX_REJECTED_SAMPLES = 100
+
+# Prices closer than this are considered unchanged
+PRICE_EPSILON = 1e-9
+
+
+def _parse_observation(record, competitor_ids, competitors_by_name):
+    if isinstance(record, Exception):
+        raise ValueError(f"invalid JSON: {record}")
+    if not isinstance(record, dict):
+        raise ValueError("record must be an object")
+
+    reference = record.get('competitor_id', record.get('competitor'))
+    if reference is None:
+        raise ValueError("missing field competitor_id or competitor")
+    if isinstance(reference, str) and reference in competitors_by_name:
+        competitor_id = competitors_by_name[reference]
+    else:
+        try:
+            competitor_id = int(reference)
+        except (TypeError, ValueError):
+            competitor_id = None
+    if competitor_id not in competitor_ids:
+        raise ValueError(f"unknown competitor {reference}")
+
+    try:
+        product_id = int(record['product_id'])
+        price = float(record['price'])
+    except KeyError as e:
+        raise ValueError(f"missing field {e.args[0]}")
+    except (TypeError, ValueError):
+        raise ValueError("product_id and price must be numeric")
+    if not math.isfinite(price):
+        raise ValueError("price must be a finite number")
+    if price < 0:
+        raise ValueError("price cannot be negative")
+
+    observed_at = record.get('observed_at')
+    if observed_at:
+        try:
+            observed_at = datetime.fromisoformat(str(observed_at))
+        except ValueError:
+            raise ValueError("observed_at must be an ISO date or datetime")
+        if observed_at.tzinfo is not None:
+            observed_at = observed_at.replace(tzinfo=None) - observed_at.utcoffset()
+    else:
+        observed_at = datetime.utcnow()
+
+    return competitor_id, product_id, price, observed_at
+
+
+def _owned_products(user_id, product_ids):
+    product_ids = list(product_ids)
+    owned = set()
+    for i in range(0, len(product_ids), LOOKUP_CHUNK_SIZE):
+        owned.update(db.session.scalars(
+            select(Product.id).where(
+                Product.user_id == user_id,
+                Product.id.in_(product_ids[i:i + LOOKUP_CHUNK_SIZE])
+            )
+        ))
+    return owned
+
+
+def ingest_competitor_prices(records, user_id):
+    """
+    Store a batch of competitor price observations for a user.
+
+    records is an iterable of (line_number, record) pairs where each record
+    has competitor_id (or competitor name), product_id, price and optional
+    observed_at. Competitor and product ownership are checked in bulk,
+    observations that repeat the previous price for the same product and
+    competitor are skipped, and everything is written in one transaction.
+    Returns a report dict.
+    """
+    started = time.perf_counter()
+    report = {'received': 0, 'inserted': 0, 'unchanged': 0, 'rejected': 0, 'rejected_records': []}
+
+    def reject(line, reason):
+        report['rejected'] += 1
+        if len(report['rejected_records']) < MAX_REJECTED_SAMPLES:
+            report['rejected_records'].append({'line': line, 'reason': reason})
+
+    competitors = db.session.execute(
+        select(Competitor.id, Competitor.name).where(Competitor.user_id == user_id)
+    ).all()
+    competitor_ids = {competitor.id for competitor in competitors}
+    competitors_by_name = {competitor.name: competitor.id for competitor in competitors}
+
+    parsed = []
+    for line_number, record in records:
+        report['received'] += 1
+        try:
+            parsed.append((line_number, _parse_observation(record, competitor_ids, competitors_by_name)))
+        except ValueError as e:
+            reject(line_number, str(e))
+
+    owned = _owned_products(user_id, {observation[1] for _, observation in parsed})
+    observations = defaultdict(list)
+    for line_number, (competitor_id, product_id, price, observed_at) in parsed:
+        if product_id in owned:
+            observations[(product_id, competitor_id)].append((observed_at, price))
+        else:
+            reject(line_number, f"unknown product {product_id}")
+
+    latest = latest_prices(
+        {product_id for product_id, _ in observations},
+        {competitor_id for _, competitor_id in observations}
+    ) if observations else {}
+
+    rows = []
+    for (product_id, competitor_id), series in observations.items():
+        stored = latest.get((product_id, competitor_id))
+        previous = stored[1] if stored else None
+        for observed_at, price in sorted(series, key=lambda item: item[0]):
+            if previous is not None and abs(price - previous) < PRICE_EPSILON:
+                report['unchanged'] += 1
+                continue
+            rows.append({
+                'product_id': product_id,
+                'competitor_id': competitor_id,
+                'price': price,
+                'date_recorded': observed_at
+            })
+            previous = price
+
+    try:
+        if rows:
+            db.session.execute(insert(CompetitorPrice), rows)
+            changed = record_competitor_snapshot(
+                (user_id, row['product_id'], row['competitor_id'], row['price'], row['date_recorded'])
+                for row in rows
+            )
+            record_competitor_prices(changed)
+            data_versions.bump(user_id, {row['product_id'] for row in rows})
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    report['inserted'] = len(rows)
+    elapsed = time.perf_counter() - started
+    report['elapsed_seconds'] = round(elapsed, 3)
+    report['records_per_second'] = round(report['received'] / elapsed, 1) if elapsed > 0 else None
+    return report
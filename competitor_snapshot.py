@@ -0,0 +1,238 @@
+"""
+Latest price per (product, competitor), kept in competitor_latest_price.
+
+The competitor price table keeps every observation; the snapshot holds
+only the newest one of each competitor for each product, so the
+competitor price matrix, tracked-product counts and ProductStats'
+competitor averages read one row per pair instead of the full history.
+Write paths fold new observations in with record_competitor_prices
+within their own transaction (an upsert that never lets an older
+observation replace a newer one); backfill_competitor_snapshot rebuilds
+it from the price table.
+"""
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import select, delete, insert, func
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app import db
+from models import Product, Competitor, CompetitorPrice, CompetitorLatestPrice
+
+_UPSERT_DIALECTS = {
+    'postgresql': postgresql.insert,
+    'sqlite': sqlite.insert
+}
+
+# Products per IN (...) lookup
+LOOKUP_CHUNK_SIZE = 1000
+
+# Stored datetimes are naive UTC
+_EPOCH = datetime(1970, 1, 1)
+
+
+def record_competitor_prices(entries):
+    """
+    Fold competitor price observations written in the current transaction
+    into the latest-price snapshot.
+
+    entries is an iterable of (user_id, product_id, competitor_id, price,
+    date_recorded). An observation replaces the stored one only when it is
+    at least as recent, so back-filled history never overwrites a newer
+    price. Returns the set of product ids touched.
+    """
+    latest = {}
+    for user_id, product_id, competitor_id, price, date_recorded in entries:
+        current = latest.get((product_id, competitor_id))
+        if current is None or date_recorded >= current['date_recorded']:
+            latest[(product_id, competitor_id)] = {
+                'product_id': product_id,
+                'competitor_id': competitor_id,
+                'user_id': user_id,
+                'price': price,
+                'date_recorded': date_recorded
+            }
+    if latest:
+        _upsert(list(latest.values()))
+    return {product_id for product_id, _ in latest}
+
+
+def record_competitor_price(competitor_price, user_id):
+    return record_competitor_prices([(
+        user_id, int(competitor_price.product_id), competitor_price.competitor_id,
+        competitor_price.price, competitor_price.date_recorded
+    )])
+
+
+def _upsert(rows):
+    table = CompetitorLatestPrice.__table__
+    dialect_insert = _UPSERT_DIALECTS.get(db.session.get_bind().dialect.name)
+
+    if dialect_insert is None:
+        # Portable fallback: read-modify-write each (product, competitor)
+        db.session.flush()
+        for row in rows:
+            latest = db.session.get(CompetitorLatestPrice, (row['product_id'], row['competitor_id']))
+            if latest is None:
+                db.session.add(CompetitorLatestPrice(**row))
+            elif row['date_recorded'] >= latest.date_recorded:
+                latest.price = row['price']
+                latest.date_recorded = row['date_recorded']
+        return
+
+    statement = dialect_insert(table)
+    statement = statement.on_conflict_do_update(
+        index_elements=[table.c.product_id, table.c.competitor_id],
+        set_={
+            'price': statement.excluded.price,
+            'date_recorded': statement.excluded.date_recorded
+        },
+        where=statement.excluded.date_recorded >= table.c.date_recorded
+    )
+    db.session.execute(statement, rows)
+
+
+def backfill_competitor_snapshot(user_id=None):
+    """
+    Rebuild the latest-price snapshot from the competitor price table, for
+    one user or everyone.
+    Returns the number of snapshot rows written.
+    """
+    clear = delete(CompetitorLatestPrice)
+    if user_id is not None:
+        clear = clear.where(CompetitorLatestPrice.user_id == user_id)
+    db.session.execute(clear)
+
+    ranked = select(
+        CompetitorPrice.product_id,
+        CompetitorPrice.competitor_id,
+        Product.user_id,
+        CompetitorPrice.price,
+        CompetitorPrice.date_recorded,
+        func.row_number().over(
+            partition_by=(CompetitorPrice.product_id, CompetitorPrice.competitor_id),
+            order_by=(CompetitorPrice.date_recorded.desc(), CompetitorPrice.id.desc())
+        ).label('position')
+    ).join(Product, Product.id == CompetitorPrice.product_id).where(
+        CompetitorPrice.date_recorded.is_not(None)
+    )
+    if user_id is not None:
+        ranked = ranked.where(Product.user_id == user_id)
+    ranked = ranked.subquery()
+
+    db.session.execute(
+        insert(CompetitorLatestPrice).from_select(
+            ['product_id', 'competitor_id', 'user_id', 'price', 'date_recorded'],
+            select(
+                ranked.c.product_id, ranked.c.competitor_id, ranked.c.user_id,
+                ranked.c.price, ranked.c.date_recorded
+            ).where(ranked.c.position == 1)
+        )
+    )
+    db.session.commit()
+
+    written = select(func.count()).select_from(CompetitorLatestPrice)
+    if user_id is not None:
+        written = written.where(CompetitorLatestPrice.user_id == user_id)
+    return db.session.scalar(written)
+
+
+def latest_prices(product_ids, competitor_ids=None):
+    """Return {(product_id, competitor_id): (date_recorded, price)} from the snapshot."""
+    product_ids = list(product_ids)
+    latest = {}
+    for i in range(0, len(product_ids), LOOKUP_CHUNK_SIZE):
+        statement = select(
+            CompetitorLatestPrice.product_id,
+            CompetitorLatestPrice.competitor_id,
+            CompetitorLatestPrice.price,
+            CompetitorLatestPrice.date_recorded
+        ).where(CompetitorLatestPrice.product_id.in_(product_ids[i:i + LOOKUP_CHUNK_SIZE]))
+        if competitor_ids is not None:
+            statement = statement.where(CompetitorLatestPrice.competitor_id.in_(list(competitor_ids)))
+        for row in db.session.execute(statement):
+            latest[(row.product_id, row.competitor_id)] = (row.date_recorded, row.price)
+    return latest
+
+
+def snapshot_totals(product_ids):
+    """Return {product_id: (competitor_count, price_sum)} over each competitor's latest price."""
+    product_ids = list(product_ids)
+    totals = {}
+    for i in range(0, len(product_ids), LOOKUP_CHUNK_SIZE):
+        for row in db.session.execute(
+            select(CompetitorLatestPrice.product_id, func.count(), func.sum(CompetitorLatestPrice.price))
+            .where(CompetitorLatestPrice.product_id.in_(product_ids[i:i + LOOKUP_CHUNK_SIZE]))
+            .group_by(CompetitorLatestPrice.product_id)
+        ):
+            totals[row[0]] = (row[1], row[2])
+    return totals
+
+
+def competitor_matrix(user_id, product_ids):
+    """
+    Latest competitor prices for the given products as a dense matrix.
+
+    Returns a dict of NumPy arrays: product_ids (n,), competitor_ids and
+    competitor_names (m,) for every competitor of the user, prices (n, m)
+    with NaN where a competitor has no price for a product, recorded (n, m)
+    datetime64 with NaT in the same cells, and per-product count, min, mean
+    and max over the competitors that do.
+    """
+    product_ids = np.asarray(list(product_ids), dtype=np.int64)
+    competitors = db.session.execute(
+        select(Competitor.id, Competitor.name)
+        .where(Competitor.user_id == user_id)
+        .order_by(Competitor.id)
+    ).all()
+    competitor_ids = np.array([competitor.id for competitor in competitors], dtype=np.int64)
+
+    prices = np.full((len(product_ids), len(competitor_ids)), np.nan)
+    recorded = np.full(prices.shape, np.datetime64('NaT'), dtype='datetime64[s]')
+    if len(product_ids) and len(competitor_ids):
+        # Core rows straight off the connection: no ORM result processing per cell
+        connection = db.session.connection()
+        cells = []
+        for i in range(0, len(product_ids), LOOKUP_CHUNK_SIZE):
+            cells.extend(connection.execute(
+                select(
+                    CompetitorLatestPrice.product_id,
+                    CompetitorLatestPrice.competitor_id,
+                    CompetitorLatestPrice.price,
+                    CompetitorLatestPrice.date_recorded
+                ).where(
+                    CompetitorLatestPrice.user_id == user_id,
+                    CompetitorLatestPrice.product_id.in_(product_ids[i:i + LOOKUP_CHUNK_SIZE].tolist())
+                )
+            ))
+        if cells:
+            columns = list(zip(*cells))
+            product_order = np.argsort(product_ids)
+            rows = product_order[np.searchsorted(product_ids, np.array(columns[0]), sorter=product_order)]
+            # competitor_ids is sorted by the query
+            cols = np.searchsorted(competitor_ids, np.array(columns[1]))
+            prices[rows, cols] = np.array(columns[2], dtype=float)
+            recorded[rows, cols] = np.fromiter(
+                ((value - _EPOCH).total_seconds() for value in columns[3]), dtype=float, count=len(cells)
+            ).astype('datetime64[s]')
+
+    present = ~np.isnan(prices)
+    count = present.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(present, prices, 0.0).sum(axis=1) / count
+    empty = count == 0
+    low = np.where(present, prices, np.inf).min(axis=1, initial=np.inf)
+    high = np.where(present, prices, -np.inf).max(axis=1, initial=-np.inf)
+    low[empty] = high[empty] = np.nan
+
+    return {
+        'product_ids': product_ids,
+        'competitor_ids': competitor_ids,
+        'competitor_names': np.array([competitor.name for competitor in competitors], dtype=object),
+        'prices': prices,
+        'recorded': recorded,
+        'count': count,
+        'min': low,
+        'mean': mean,
+        'max': high
+    }
@@ -0,0 +1,98 @@
+import zlib
+
+import brotli
+from flask import request
+from werkzeug.http import parse_accept_header
+
+# Content codings offered, in order of preference when the client ranks them equally
+ENCODINGS = ('br', 'gzip')
+
+
+def _gzip_chunks(chunks, level):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def _brotli_chunks(chunks, quality):
+    compressor = brotli.Compressor(quality=quality)
+    for chunk in chunks:
+        data = compressor.process(chunk)
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+class Compression:
+    """
+    Brotli or gzip Content-Encoding for text responses, negotiated from
+    Accept-Encoding. Buffered bodies below COMPRESS_MIN_SIZE are sent as
+    they are; streamed bodies are compressed chunk by chunk as they are
+    produced.
+    """
+
+    def __init__(self, app=None):
+        self.min_size = 1024
+        self.mimetypes = ()
+        self.gzip_level = 6
+        self.brotli_quality = 4
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('COMPRESS_MIN_SIZE', 1024)
+        app.config.setdefault('COMPRESS_MIMETYPES', ('application/json', 'text/html', 'text/csv', 'text/plain'))
+        # Dynamic responses: favour speed over ratio (brotli's maximum of 11 is far too slow per request)
+        app.config.setdefault('COMPRESS_GZIP_LEVEL', 6)
+        app.config.setdefault('COMPRESS_BROTLI_QUALITY', 4)
+        self.min_size = app.config['COMPRESS_MIN_SIZE']
+        self.mimetypes = tuple(app.config['COMPRESS_MIMETYPES'])
+        self.gzip_level = app.config['COMPRESS_GZIP_LEVEL']
+        self.brotli_quality = app.config['COMPRESS_BROTLI_QUALITY']
+
+        @app.after_request
+        def compress_response(response):
+            return self.compress(response, request.environ)
+
+        app.extensions['compression'] = self
+
+    def compress(self, response, environ):
+        """Encode a response in place for the request's Accept-Encoding, when worthwhile."""
+        if (response.status_code < 200 or response.status_code in (204, 206)
+                or response.direct_passthrough or 'Content-Encoding' in response.headers
+                or response.mimetype not in self.mimetypes):
+            return response
+        response.vary.add('Accept-Encoding')
+
+        encoding = parse_accept_header(environ.get('HTTP_ACCEPT_ENCODING')).best_match(ENCODINGS)
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            chunks = response.iter_encoded()
+            if encoding == 'br':
+                response.response = _brotli_chunks(chunks, self.brotli_quality)
+            else:
+                response.response = _gzip_chunks(chunks, self.gzip_level)
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < self.min_size:
+                return response
+            if encoding == 'br':
+                response.set_data(brotli.compress(data, quality=self.brotli_quality))
+            else:
+                response.set_data(b''.join(_gzip_chunks((data,), self.gzip_level)))
+
+        response.headers['Content-Encoding'] = encoding
+        # Byte-for-byte identity no longer holds across codings; revalidation compares weakly
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+
+compression = Compression()
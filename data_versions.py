@@ -0,0 +1,78 @@
+import hashlib
+import json
+from datetime import datetime
+
+from flask import request, Response
+from sqlalchemy import select, update
+from werkzeug.http import is_resource_modified
+
+from app import db
+from models import User, Product
+
+# Products per UPDATE ... WHERE id IN (...)
+BUMP_CHUNK_SIZE = 1000
+
+
+def bump(user_id, product_ids=()):
+    """
+    Advance the data version of a user, and of the given products, within
+    the current transaction. Call from every write path before committing.
+    """
+    now = datetime.utcnow()
+    users = User.__table__
+    db.session.execute(
+        update(users)
+        .where(users.c.id == user_id)
+        .values(data_version=users.c.data_version + 1, data_updated_at=now)
+    )
+
+    products = Product.__table__
+    product_ids = sorted(set(product_ids))
+    for i in range(0, len(product_ids), BUMP_CHUNK_SIZE):
+        db.session.execute(
+            update(products)
+            .where(products.c.id.in_(product_ids[i:i + BUMP_CHUNK_SIZE]))
+            .values(data_version=products.c.data_version + 1, data_updated_at=now)
+        )
+
+
+def user_version(user_id):
+    """Return (data_version, data_updated_at) for a user straight from the database."""
+    return db.session.execute(
+        select(User.data_version, User.data_updated_at).where(User.id == user_id)
+    ).one()
+
+
+def validators(scope, key, version, updated_at, variant=None):
+    """
+    Build (etag, last_modified) for a response derived from one versioned
+    entity. variant holds the request parameters that shape the payload.
+    """
+    etag = f'{scope}-{key}-{version}'
+    if variant:
+        digest = hashlib.sha1(json.dumps(variant, sort_keys=True, default=str).encode()).hexdigest()
+        etag = f'{etag}-{digest[:12]}'
+    return etag, updated_at
+
+
+def not_modified(etag, last_modified, environ=None):
+    """
+    Return a 304 response when the request's If-None-Match/If-Modified-Since
+    already match, otherwise None. Call before running any heavy query.
+    environ defaults to the current Flask request's.
+    """
+    if environ is None:
+        environ = request.environ
+    if is_resource_modified(environ, etag=etag, last_modified=last_modified):
+        return None
+    return with_validators(Response(status=304), etag, last_modified)
+
+
+def with_validators(response, etag, last_modified):
+    """Attach validators and make clients revalidate before reusing the response."""
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
@@ -0,0 +1,134 @@
+import math
+import sqlite3
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, func, case, and_, event
+from sqlalchemy.engine import Engine
+
+from app import db
+from models import Product, Sale, CompetitorLatestPrice, PriceHistory
+
+
+@event.listens_for(Engine, 'connect')
+def _register_sqlite_math(dbapi_connection, connection_record):
+    # Older SQLite builds ship without ln(); provide it so the aggregates run anywhere
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    try:
+        dbapi_connection.execute('SELECT ln(1)')
+    except sqlite3.OperationalError:
+        dbapi_connection.create_function('ln', 1, math.log, deterministic=True)
+
+
+def _history_aggregates(product_ids):
+    ordered = select(
+        PriceHistory.product_id,
+        PriceHistory.price,
+        PriceHistory.date_changed,
+        func.row_number().over(
+            partition_by=PriceHistory.product_id, order_by=PriceHistory.id
+        ).label('rank_first'),
+        func.row_number().over(
+            partition_by=PriceHistory.product_id, order_by=PriceHistory.id.desc()
+        ).label('rank_last')
+    ).where(PriceHistory.product_id.in_(product_ids)).subquery()
+
+    return select(
+        ordered.c.product_id,
+        func.count().label('history_count'),
+        func.avg(ordered.c.price).label('history_avg'),
+        func.max(case((ordered.c.rank_first == 1, ordered.c.price))).label('history_first'),
+        func.max(case((ordered.c.rank_last == 1, ordered.c.price))).label('history_last'),
+        func.max(ordered.c.date_changed).label('last_change')
+    ).group_by(ordered.c.product_id).subquery()
+
+
+def _competitor_aggregates(product_ids):
+    # Average of each competitor's latest price
+    return select(
+        CompetitorLatestPrice.product_id,
+        func.count().label('competitor_count'),
+        func.avg(CompetitorLatestPrice.price).label('competitor_avg')
+    ).where(
+        CompetitorLatestPrice.product_id.in_(product_ids)
+    ).group_by(CompetitorLatestPrice.product_id).subquery()
+
+
+def _sales_aggregates(product_ids, since):
+    valid = and_(Sale.price > 0, Sale.quantity > 0)
+    log_price = case((valid, func.ln(Sale.price)))
+    log_qty = case((valid, func.ln(Sale.quantity)))
+
+    return select(
+        Sale.product_id,
+        func.count().label('recent_sales_count'),
+        func.sum(case((valid, 0), else_=1)).label('recent_invalid_count'),
+        func.sum(log_price).label('sum_log_price'),
+        func.sum(log_qty).label('sum_log_qty'),
+        func.sum(log_price * log_price).label('sum_log_price_sq'),
+        func.sum(log_price * log_qty).label('sum_log_price_qty')
+    ).where(
+        Sale.product_id.in_(product_ids),
+        Sale.sale_date > since
+    ).group_by(Sale.product_id).subquery()
+
+
+def load_feature_rows(product_ids):
+    """
+    Fetch product columns plus every optimizer input as SQL aggregates.
+
+    One statement covers any number of products: price history average,
+    first/last price and latest change date, competitor average, and the
+    30-day sales count with log-log regression moments. Returns one row per
+    product, ordered by id.
+    """
+    product_ids = list(product_ids)
+    if not product_ids:
+        return []
+
+    since = datetime.utcnow() - timedelta(days=30)
+    history = _history_aggregates(product_ids)
+    competitors = _competitor_aggregates(product_ids)
+    sales = _sales_aggregates(product_ids, since)
+
+    statement = select(
+        Product.id,
+        Product.current_price,
+        Product.minimum_price,
+        Product.maximum_price,
+        Product.stock_level,
+        history.c.history_count,
+        history.c.history_avg,
+        history.c.history_first,
+        history.c.history_last,
+        history.c.last_change,
+        competitors.c.competitor_count,
+        competitors.c.competitor_avg,
+        sales.c.recent_sales_count,
+        sales.c.recent_invalid_count,
+        sales.c.sum_log_price,
+        sales.c.sum_log_qty,
+        sales.c.sum_log_price_sq,
+        sales.c.sum_log_price_qty
+    ).outerjoin(
+        history, history.c.product_id == Product.id
+    ).outerjoin(
+        competitors, competitors.c.product_id == Product.id
+    ).outerjoin(
+        sales, sales.c.product_id == Product.id
+    ).where(Product.id.in_(product_ids)).order_by(Product.id)
+
+    return db.session.execute(statement).all()
+
+
+def load_features(product_ids, optimizer):
+    """Return {product_id: features} for many products in one round trip."""
+    return {
+        row.id: optimizer.features_from_aggregates(row, row._mapping)
+        for row in load_feature_rows(product_ids)
+    }
+
+
+def load_product_features(product, optimizer):
+    """Return the optimizer features for a single product."""
+    return load_features([product.id], optimizer)[product.id]
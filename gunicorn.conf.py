@@ -0,0 +1,44 @@
+"""
+Gunicorn settings, loaded automatically when gunicorn starts from the
+project directory (see Procfile).
+
+The application is imported once in the master and forked into the
+workers (GUNICORN_PRELOAD=0 restores per-worker imports). Each worker
+drops the database connections inherited from the master after the fork.
+The response cache defaults to the sqlite backend shared by all workers.
+Set GUNICORN_WORKER_CLASS=uvicorn.workers.UvicornWorker and serve
+asgi:application for the async API.
+"""
+import os
+import sys
+import tempfile
+
+# Workers share metrics through snapshot files in this directory
+os.environ.setdefault('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'priceflex_metrics'))
+
+# A per-worker memory cache would miss invalidations issued by the other workers
+os.environ.setdefault('CACHE_BACKEND', 'sqlite')
+
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1').lower() in ('1', 'true', 'yes')
+
+# uvicorn.workers.UvicornWorker serves asgi:application (the async JSON API)
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'sync')
+
+
+def on_starting(server):
+    # Counters restart with the server; drop snapshots from the previous run
+    from metrics import metrics
+
+    metrics.configure(os.environ['METRICS_DIR'])
+    metrics.reset()
+
+
+def post_fork(server, worker):
+    # A preloaded app may have opened pooled connections in the master; the
+    # child must not reuse them, but must not close the parent's sockets either
+    if 'app' not in sys.modules:
+        return
+    from app import app, db
+
+    with app.app_context():
+        db.engine.dispose(close=False)
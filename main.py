@@ -1,4 +1,8 @@
-from app import app
+from app import app, db
 
 if __name__ == "__main__":
+    # The development server creates missing tables itself; deployments run
+    # `flask upgrade-db` before starting (Procfile release, .replit build)
+    with app.app_context():
+        db.create_all()
     app.run(host="0.0.0.0", port=5000, debug=True)
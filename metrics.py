@@ -0,0 +1,387 @@
+"""
+Request, SQL, optimizer and cache instrumentation exposed in the Prometheus
+text format at /metrics.
+
+Each process keeps its own counters and histograms in memory. When
+METRICS_DIR is set (gunicorn.conf.py sets it for every worker), processes
+also flush a snapshot to METRICS_DIR/metrics_<pid>.json in the background,
+and a scrape served by any worker merges the snapshots of all processes,
+so totals are correct no matter which worker answers. Snapshots of exited
+processes are folded into an archive file so counters never go backwards.
+"""
+import atexit
+import fcntl
+import functools
+import glob
+import json
+import logging
+import os
+import threading
+import time
+
+from flask import g, request, Response, abort
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 200, 500)
+
+# name -> (type, help, buckets)
+METRICS = {
+    'priceflex_http_requests_total': (
+        'counter', 'HTTP requests by endpoint, method and status.', None),
+    'priceflex_http_request_duration_seconds': (
+        'histogram', 'Time to serve a request, including streamed bodies.', LATENCY_BUCKETS),
+    'priceflex_db_statements_per_request': (
+        'histogram', 'SQL statements executed while serving a request.', STATEMENT_BUCKETS),
+    'priceflex_db_seconds_per_request': (
+        'histogram', 'Cumulative database time while serving a request.', LATENCY_BUCKETS),
+    'priceflex_db_statements_total': (
+        'counter', 'SQL statements executed, in requests and background work.', None),
+    'priceflex_db_seconds_total': (
+        'counter', 'Cumulative time spent executing SQL statements.', None),
+    'priceflex_optimizer_duration_seconds': (
+        'histogram', 'Time spent in PriceOptimizer operations.', LATENCY_BUCKETS),
+    'priceflex_cache_requests_total': (
+        'counter', 'Cache lookups by cache, namespace and result.', None),
+}
+
+# Seconds between background flushes of this process's snapshot
+FLUSH_INTERVAL = 2.0
+
+_ARCHIVE = 'archive.json'
+_LOCK = 'metrics.lock'
+
+
+class Registry:
+    """In-process counters and histograms keyed by metric name and label values."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.dirty = False
+
+    def inc(self, name, labels, value=1):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+            self.dirty = True
+
+    def observe(self, name, labels, value):
+        buckets = METRICS[name][2]
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [[0] * (len(buckets) + 1), 0.0, 0]
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    histogram[0][i] += 1
+                    break
+            else:
+                histogram[0][-1] += 1
+            histogram[1] += value
+            histogram[2] += 1
+            self.dirty = True
+
+    def snapshot(self):
+        with self._lock:
+            self.dirty = False
+            return {
+                'counters': [[name, list(labels), value] for (name, labels), value in self.counters.items()],
+                'histograms': [
+                    [name, list(labels), list(counts), total, count]
+                    for (name, labels), (counts, total, count) in self.histograms.items()
+                ]
+            }
+
+
+def merge(snapshots):
+    """Combine snapshots from several processes into one."""
+    counters, histograms = {}, {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot.get('counters', ()):
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, counts, total, count in snapshot.get('histograms', ()):
+            key = (name, tuple(map(tuple, labels)))
+            merged = histograms.get(key)
+            if merged is None:
+                histograms[key] = [list(counts), total, count]
+            else:
+                merged[0] = [a + b for a, b in zip(merged[0], counts)]
+                merged[1] += total
+                merged[2] += count
+    return {
+        'counters': [[name, [list(pair) for pair in labels], value] for (name, labels), value in counters.items()],
+        'histograms': [
+            [name, [list(pair) for pair in labels], counts, total, count]
+            for (name, labels), (counts, total, count) in histograms.items()
+        ]
+    }
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(pairs, extra=()):
+    pairs = list(pairs) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in pairs) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def render(snapshot):
+    """Render a snapshot in the Prometheus text exposition format."""
+    series = {}
+    for name, labels, value in snapshot['counters']:
+        series.setdefault(name, []).append((labels, value))
+    for name, labels, counts, total, count in snapshot['histograms']:
+        series.setdefault(name, []).append((labels, (counts, total, count)))
+
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        if name not in series:
+            continue
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, value in sorted(series[name], key=lambda item: item[0]):
+            if kind == 'counter':
+                lines.append(f'{name}{_labels(labels)} {_number(value)}')
+                continue
+            counts, total, count = value
+            cumulative = 0
+            for bound, bucket_count in zip(buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                lines.append(f'{name}_bucket{_labels(labels, [("le", _number(float(bound)))])} {cumulative}')
+            lines.append(f'{name}_sum{_labels(labels)} {_number(total)}')
+            lines.append(f'{name}_count{_labels(labels)} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+class Metrics:
+    """Process-wide metrics registry with optional multi-process aggregation."""
+
+    def __init__(self):
+        self.registry = Registry()
+        self.directory = None
+        self._pid = None
+        self._flusher = None
+        self._lock = threading.Lock()
+
+    # Recording
+
+    def inc(self, name, value=1, **labels):
+        self._ensure_flusher()
+        self.registry.inc(name, labels, value)
+
+    def observe(self, name, value, **labels):
+        self._ensure_flusher()
+        self.registry.observe(name, labels, value)
+
+    def timed(self, name, **labels):
+        """Decorator observing the wrapped function's duration in a histogram."""
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    self.observe(name, time.perf_counter() - started, **labels)
+            return wrapper
+        return decorator
+
+    # Multi-process snapshots
+
+    def configure(self, directory):
+        self.directory = directory
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, pid):
+        return os.path.join(self.directory, f'metrics_{pid}.json')
+
+    def _ensure_flusher(self):
+        if not self.directory:
+            return
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._lock:
+            if self._pid == pid:
+                return
+            # First record in this process (or after a fork): samples inherited
+            # from the parent belong to the parent's snapshot, not ours
+            if self._pid is not None:
+                self.registry = Registry()
+            self._pid = pid
+            self._flusher = threading.Thread(target=self._flush_loop, name='metrics-flush', daemon=True)
+            self._flusher.start()
+            atexit.register(self.flush)
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(FLUSH_INTERVAL)
+            if self.registry.dirty:
+                self.flush()
+
+    def flush(self):
+        """Write this process's snapshot to METRICS_DIR."""
+        if not self.directory or self._pid != os.getpid():
+            return
+        try:
+            _write(self._path(self._pid), self.registry.snapshot())
+        except OSError:
+            logger.exception("Could not write metrics snapshot")
+
+    def collect(self):
+        """Snapshot for this process, or merged across all processes in multi-process mode."""
+        if not self.directory:
+            return self.registry.snapshot()
+
+        self.flush()
+        with open(os.path.join(self.directory, _LOCK), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            archive_path = os.path.join(self.directory, _ARCHIVE)
+            archive = _read(archive_path) or {}
+            live, exited = [], []
+            for path in glob.glob(os.path.join(self.directory, 'metrics_*.json')):
+                snapshot = _read(path)
+                if snapshot is None:
+                    continue
+                pid = int(os.path.basename(path)[len('metrics_'):-len('.json')])
+                (live if _alive(pid) else exited).append((path, snapshot))
+
+            if exited:
+                # Fold snapshots of exited processes into the archive
+                archive = merge([archive] + [snapshot for _, snapshot in exited])
+                _write(archive_path, archive)
+                for path, _ in exited:
+                    os.remove(path)
+            return merge([archive] + [snapshot for _, snapshot in live])
+
+    def reset(self):
+        """Remove snapshots left by a previous run; call once before workers start."""
+        if not self.directory:
+            return
+        for path in glob.glob(os.path.join(self.directory, '*.json')):
+            os.remove(path)
+
+    # Flask integration
+
+    def init_app(self, app):
+        app.config.setdefault('METRICS_DIR', os.environ.get('METRICS_DIR'))
+        app.config.setdefault('METRICS_TOKEN', os.environ.get('METRICS_TOKEN'))
+        self.configure(app.config['METRICS_DIR'])
+
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(Engine, 'handle_error', _handle_error)
+        app.before_request(_start_request)
+        app.after_request(_finish_request)
+
+        @app.route('/metrics')
+        def metrics_endpoint():
+            token = app.config['METRICS_TOKEN']
+            if token and request.headers.get('Authorization') != f'Bearer {token}':
+                abort(401)
+            return Response(render(self.collect()), mimetype='text/plain; version=0.0.4')
+
+        app.extensions['metrics'] = self
+
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write(path, snapshot):
+    temporary = f'{path}.tmp'
+    with open(temporary, 'w') as f:
+        json.dump(snapshot, f)
+    os.replace(temporary, path)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class _RequestStats:
+    __slots__ = ('started', 'statements', 'db_seconds')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.statements = 0
+        self.db_seconds = 0.0
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('metrics_started')
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    metrics.inc('priceflex_db_statements_total')
+    metrics.inc('priceflex_db_seconds_total', elapsed)
+    stats = g.get('_metrics') if g else None
+    if stats is not None:
+        stats.statements += 1
+        stats.db_seconds += elapsed
+
+
+def _handle_error(context):
+    # Failed statements never reach after_cursor_execute
+    if context.connection is not None:
+        started = context.connection.info.get('metrics_started')
+        if started:
+            started.pop()
+
+
+def _start_request():
+    g._metrics = _RequestStats()
+
+
+def _finish_request(response):
+    stats = g.get('_metrics')
+    if stats is None:
+        return response
+    endpoint = request.endpoint or 'unmatched'
+    method = request.method
+    status = str(response.status_code)
+
+    def record():
+        metrics.inc('priceflex_http_requests_total', endpoint=endpoint, method=method, status=status)
+        metrics.observe('priceflex_http_request_duration_seconds', time.perf_counter() - stats.started,
+                        endpoint=endpoint, method=method)
+        metrics.observe('priceflex_db_statements_per_request', stats.statements, endpoint=endpoint)
+        metrics.observe('priceflex_db_seconds_per_request', stats.db_seconds, endpoint=endpoint)
+
+    # Streamed bodies keep querying after this hook; record once the response is closed
+    response.call_on_close(record)
+    return response
+
+
+metrics = Metrics()
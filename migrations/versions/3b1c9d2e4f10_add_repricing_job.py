@@ -0,0 +1,37 @@
+"""Add repricing_job table
+
+Revision ID: 3b1c9d2e4f10
+Revises: fa3e758800fb
+Create Date: 2026-10-18 09:12:41.508213
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b1c9d2e4f10'
+down_revision = 'fa3e758800fb'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('repricing_job',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=True),
+        sa.Column('total_products', sa.Integer(), nullable=True),
+        sa.Column('processed_products', sa.Integer(), nullable=True),
+        sa.Column('recommendations_created', sa.Integer(), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('repricing_job')
@@ -0,0 +1,46 @@
+"""Add product_stats table
+
+Revision ID: 7c4e2a91b5d3
+Revises: 3b1c9d2e4f10
+Create Date: 2026-10-18 11:40:05.182734
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c4e2a91b5d3'
+down_revision = '3b1c9d2e4f10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('product_stats',
+        sa.Column('product_id', sa.Integer(), nullable=False),
+        sa.Column('history_count', sa.Integer(), nullable=False),
+        sa.Column('history_sum', sa.Float(), nullable=False),
+        sa.Column('history_first_price', sa.Float(), nullable=True),
+        sa.Column('history_last_price', sa.Float(), nullable=True),
+        sa.Column('last_change', sa.DateTime(), nullable=True),
+        sa.Column('competitor_count', sa.Integer(), nullable=False),
+        sa.Column('competitor_sum', sa.Float(), nullable=False),
+        sa.Column('sales_count', sa.Integer(), nullable=False),
+        sa.Column('units_sold', sa.Integer(), nullable=False),
+        sa.Column('revenue_sum', sa.Float(), nullable=False),
+        sa.Column('log_count', sa.Integer(), nullable=False),
+        sa.Column('sum_log_price', sa.Float(), nullable=False),
+        sa.Column('sum_log_qty', sa.Float(), nullable=False),
+        sa.Column('sum_log_price_sq', sa.Float(), nullable=False),
+        sa.Column('sum_log_qty_sq', sa.Float(), nullable=False),
+        sa.Column('sum_log_price_qty', sa.Float(), nullable=False),
+        sa.Column('sales_windows', sa.Text(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['product_id'], ['product.id'], ),
+        sa.PrimaryKeyConstraint('product_id')
+    )
+
+
+def downgrade():
+    op.drop_table('product_stats')
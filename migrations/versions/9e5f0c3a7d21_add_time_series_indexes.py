@@ -0,0 +1,38 @@
+"""Add indexes for per-product time-series queries
+
+Revision ID: 9e5f0c3a7d21
+Revises: 7c4e2a91b5d3
+Create Date: 2026-10-18 13:05:52.664190
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9e5f0c3a7d21'
+down_revision = '7c4e2a91b5d3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(op.f('ix_product_user_id'), 'product', ['user_id'], unique=False)
+    op.create_index(op.f('ix_competitor_user_id'), 'competitor', ['user_id'], unique=False)
+    op.create_index('ix_sale_product_id_sale_date', 'sale', ['product_id', 'sale_date'], unique=False)
+    op.create_index('ix_competitor_price_product_id_date_recorded', 'competitor_price', ['product_id', 'date_recorded'], unique=False)
+    op.create_index('ix_competitor_price_competitor_id_date_recorded', 'competitor_price', ['competitor_id', 'date_recorded'], unique=False)
+    op.create_index('ix_price_history_product_id_date_changed', 'price_history', ['product_id', 'date_changed'], unique=False)
+    op.create_index('ix_price_recommendation_product_id_created_at', 'price_recommendation', ['product_id', 'created_at'], unique=False)
+    op.create_index(op.f('ix_repricing_job_user_id'), 'repricing_job', ['user_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_repricing_job_user_id'), table_name='repricing_job')
+    op.drop_index('ix_price_recommendation_product_id_created_at', table_name='price_recommendation')
+    op.drop_index('ix_price_history_product_id_date_changed', table_name='price_history')
+    op.drop_index('ix_competitor_price_competitor_id_date_recorded', table_name='competitor_price')
+    op.drop_index('ix_competitor_price_product_id_date_recorded', table_name='competitor_price')
+    op.drop_index('ix_sale_product_id_sale_date', table_name='sale')
+    op.drop_index(op.f('ix_competitor_user_id'), table_name='competitor')
+    op.drop_index(op.f('ix_product_user_id'), table_name='product')
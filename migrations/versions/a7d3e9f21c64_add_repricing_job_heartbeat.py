@@ -0,0 +1,26 @@
+"""Add heartbeat_at to repricing_job
+
+Revision ID: a7d3e9f21c64
+Revises: e6c2f81a4d07
+Create Date: 2026-10-18 17:52:40.113592
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7d3e9f21c64'
+down_revision = 'e6c2f81a4d07'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('repricing_job', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('heartbeat_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('repricing_job', schema=None) as batch_op:
+        batch_op.drop_column('heartbeat_at')
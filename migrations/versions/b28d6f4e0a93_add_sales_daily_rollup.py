@@ -0,0 +1,62 @@
+"""Add sales_daily_rollup table
+
+Revision ID: b28d6f4e0a93
+Revises: 9e5f0c3a7d21
+Create Date: 2026-10-18 14:21:37.904415
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b28d6f4e0a93'
+down_revision = '9e5f0c3a7d21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('sales_daily_rollup',
+        sa.Column('product_id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('units', sa.Integer(), nullable=False),
+        sa.Column('sale_count', sa.Integer(), nullable=False),
+        sa.Column('revenue', sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(['product_id'], ['product.id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('product_id', 'day')
+    )
+    op.create_index('ix_sales_daily_rollup_user_id_day', 'sales_daily_rollup', ['user_id', 'day'], unique=False)
+
+    # Roll up the existing sales in the database, one INSERT ... SELECT ... GROUP BY
+    sale = sa.table('sale', sa.column('product_id'), sa.column('quantity'), sa.column('price'), sa.column('sale_date'))
+    product = sa.table('product', sa.column('id'), sa.column('user_id'))
+    rollup = sa.table(
+        'sales_daily_rollup', sa.column('product_id'), sa.column('day'), sa.column('user_id'),
+        sa.column('units'), sa.column('sale_count'), sa.column('revenue')
+    )
+    sale_day = sa.func.date(sale.c.sale_date)
+    op.execute(
+        rollup.insert().from_select(
+            ['product_id', 'day', 'user_id', 'units', 'sale_count', 'revenue'],
+            sa.select(
+                sale.c.product_id,
+                sale_day,
+                product.c.user_id,
+                sa.func.sum(sale.c.quantity),
+                sa.func.count(),
+                sa.func.sum(sale.c.quantity * sale.c.price)
+            ).select_from(
+                sale.join(product, product.c.id == sale.c.product_id)
+            ).where(
+                sale.c.sale_date.is_not(None)
+            ).group_by(sale.c.product_id, sale_day, product.c.user_id)
+        )
+    )
+
+
+def downgrade():
+    op.drop_index('ix_sales_daily_rollup_user_id_day', table_name='sales_daily_rollup')
+    op.drop_table('sales_daily_rollup')
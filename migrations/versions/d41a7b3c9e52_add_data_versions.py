@@ -0,0 +1,36 @@
+"""Add data_version counters to user and product
+
+Revision ID: d41a7b3c9e52
+Revises: b28d6f4e0a93
+Create Date: 2026-10-18 16:05:12.518204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd41a7b3c9e52'
+down_revision = 'b28d6f4e0a93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('data_version', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('data_updated_at', sa.DateTime(), nullable=True))
+
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('data_version', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('data_updated_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.drop_column('data_updated_at')
+        batch_op.drop_column('data_version')
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('data_updated_at')
+        batch_op.drop_column('data_version')
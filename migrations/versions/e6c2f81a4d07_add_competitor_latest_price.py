@@ -0,0 +1,77 @@
+"""Add competitor_latest_price snapshot table
+
+Revision ID: e6c2f81a4d07
+Revises: d41a7b3c9e52
+Create Date: 2026-10-18 19:42:08.271936
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e6c2f81a4d07'
+down_revision = 'd41a7b3c9e52'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('competitor_latest_price',
+        sa.Column('product_id', sa.Integer(), nullable=False),
+        sa.Column('competitor_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('price', sa.Float(), nullable=False),
+        sa.Column('date_recorded', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['competitor_id'], ['competitor.id'], ),
+        sa.ForeignKeyConstraint(['product_id'], ['product.id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('product_id', 'competitor_id')
+    )
+    op.create_index('ix_competitor_latest_price_user_id_product_id', 'competitor_latest_price',
+                    ['user_id', 'product_id'], unique=False)
+
+    # Seed the snapshot from the existing observations
+    op.execute("""
+        INSERT INTO competitor_latest_price (product_id, competitor_id, user_id, price, date_recorded)
+        SELECT product_id, competitor_id, user_id, price, date_recorded FROM (
+            SELECT competitor_price.product_id, competitor_price.competitor_id, product.user_id,
+                   competitor_price.price, competitor_price.date_recorded,
+                   row_number() OVER (
+                       PARTITION BY competitor_price.product_id, competitor_price.competitor_id
+                       ORDER BY competitor_price.date_recorded DESC, competitor_price.id DESC
+                   ) AS position
+            FROM competitor_price JOIN product ON product.id = competitor_price.product_id
+            WHERE competitor_price.date_recorded IS NOT NULL
+        ) ranked
+        WHERE position = 1
+    """)
+
+    # Product stats now average the latest price of each competitor
+    op.execute("""
+        UPDATE product_stats SET
+            competitor_count = (
+                SELECT count(*) FROM competitor_latest_price
+                WHERE competitor_latest_price.product_id = product_stats.product_id
+            ),
+            competitor_sum = coalesce((
+                SELECT sum(price) FROM competitor_latest_price
+                WHERE competitor_latest_price.product_id = product_stats.product_id
+            ), 0)
+    """)
+
+
+def downgrade():
+    op.execute("""
+        UPDATE product_stats SET
+            competitor_count = (
+                SELECT count(*) FROM competitor_price
+                WHERE competitor_price.product_id = product_stats.product_id
+            ),
+            competitor_sum = coalesce((
+                SELECT sum(price) FROM competitor_price
+                WHERE competitor_price.product_id = product_stats.product_id
+            ), 0)
+    """)
+    op.drop_index('ix_competitor_latest_price_user_id_product_id', table_name='competitor_latest_price')
+    op.drop_table('competitor_latest_price')
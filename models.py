@@ -11,6 +11,9 @@ class User(UserMixin, db.Model):
     company_name = db.Column(db.String(100))
     business_type = db.Column(db.String(50))
     created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    # Bumped on every write to the user's data; drives API ETags
+    data_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    data_updated_at = db.Column(db.DateTime)
     products = db.relationship('Product', backref='owner', lazy='dynamic')
     competitors = db.relationship('Competitor', backref='user', lazy='dynamic')
     
@@ -33,7 +36,10 @@ class Product(db.Model):
     maximum_price = db.Column(db.Float)
     stock_level = db.Column(db.Integer, default=0)
     created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    # Bumped on every write to the product's series; drives API ETags
+    data_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    data_updated_at = db.Column(db.DateTime)
     sales = db.relationship('Sale', backref='product', lazy='dynamic')
     competitor_prices = db.relationship('CompetitorPrice', backref='product', lazy='dynamic')
     price_histories = db.relationship('PriceHistory', backref='product', lazy='dynamic')
@@ -41,6 +47,10 @@ class Product(db.Model):
 
 
 class Sale(db.Model):
+    __table_args__ = (
+        db.Index('ix_sale_product_id_sale_date', 'product_id', 'sale_date'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
     quantity = db.Column(db.Integer, nullable=False)
@@ -57,11 +67,16 @@ class Competitor(db.Model):
     name = db.Column(db.String(100), nullable=False)
     website = db.Column(db.String(255))
     notes = db.Column(db.Text)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
     prices = db.relationship('CompetitorPrice', backref='competitor', lazy='dynamic')
 
 
 class CompetitorPrice(db.Model):
+    __table_args__ = (
+        db.Index('ix_competitor_price_product_id_date_recorded', 'product_id', 'date_recorded'),
+        db.Index('ix_competitor_price_competitor_id_date_recorded', 'competitor_id', 'date_recorded'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
     competitor_id = db.Column(db.Integer, db.ForeignKey('competitor.id'), nullable=False)
@@ -69,7 +84,24 @@ class CompetitorPrice(db.Model):
     date_recorded = db.Column(db.DateTime, default=datetime.datetime.utcnow)
 
 
+# Latest observed price per (product, competitor), maintained on every competitor price write
+class CompetitorLatestPrice(db.Model):
+    __table_args__ = (
+        db.Index('ix_competitor_latest_price_user_id_product_id', 'user_id', 'product_id'),
+    )
+    
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), primary_key=True)
+    competitor_id = db.Column(db.Integer, db.ForeignKey('competitor.id'), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    price = db.Column(db.Float, nullable=False)
+    date_recorded = db.Column(db.DateTime, nullable=False)
+
+
 class PriceHistory(db.Model):
+    __table_args__ = (
+        db.Index('ix_price_history_product_id_date_changed', 'product_id', 'date_changed'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
     price = db.Column(db.Float, nullable=False)
@@ -77,6 +109,10 @@ class PriceHistory(db.Model):
 
 
 class PriceRecommendation(db.Model):
+    __table_args__ = (
+        db.Index('ix_price_recommendation_product_id_created_at', 'product_id', 'created_at'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
     recommended_price = db.Column(db.Float, nullable=False)
@@ -86,3 +122,54 @@ class PriceRecommendation(db.Model):
     factors = db.Column(db.Text)  # JSON string of factors influencing the recommendation
     created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
     status = db.Column(db.String(20), default='pending')  # pending, accepted, rejected
+
+
+class RepricingJob(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    status = db.Column(db.String(20), default='queued')  # queued, running, completed, failed
+    total_products = db.Column(db.Integer, default=0)
+    processed_products = db.Column(db.Integer, default=0)
+    recommendations_created = db.Column(db.Integer, default=0)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)  # last progress commit of the thread running the job
+    finished_at = db.Column(db.DateTime)
+
+
+class ProductStats(db.Model):
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), primary_key=True)
+    history_count = db.Column(db.Integer, nullable=False, default=0)
+    history_sum = db.Column(db.Float, nullable=False, default=0.0)
+    history_first_price = db.Column(db.Float)
+    history_last_price = db.Column(db.Float)
+    last_change = db.Column(db.DateTime)
+    competitor_count = db.Column(db.Integer, nullable=False, default=0)
+    competitor_sum = db.Column(db.Float, nullable=False, default=0.0)
+    sales_count = db.Column(db.Integer, nullable=False, default=0)
+    units_sold = db.Column(db.Integer, nullable=False, default=0)
+    revenue_sum = db.Column(db.Float, nullable=False, default=0.0)
+    # Log-log regression moments over all sales with positive price and quantity
+    log_count = db.Column(db.Integer, nullable=False, default=0)
+    sum_log_price = db.Column(db.Float, nullable=False, default=0.0)
+    sum_log_qty = db.Column(db.Float, nullable=False, default=0.0)
+    sum_log_price_sq = db.Column(db.Float, nullable=False, default=0.0)
+    sum_log_qty_sq = db.Column(db.Float, nullable=False, default=0.0)
+    sum_log_price_qty = db.Column(db.Float, nullable=False, default=0.0)
+    sales_windows = db.Column(db.Text)  # JSON daily buckets of sales moments for the last 30 days
+    updated_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    product = db.relationship('Product', backref=db.backref('stats', uselist=False))
+
+
+class SalesDailyRollup(db.Model):
+    __table_args__ = (
+        db.Index('ix_sales_daily_rollup_user_id_day', 'user_id', 'day'),
+    )
+    
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    sale_count = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
@@ -0,0 +1,76 @@
+from datetime import datetime
+
+from sqlalchemy import tuple_
+
+from app import db
+
+CURSOR_SEPARATOR = '~'
+
+
+def encode_cursor(*values):
+    """Serialise the sort-key values of the last row on a page into a URL-safe cursor."""
+    return CURSOR_SEPARATOR.join(
+        value.isoformat() if isinstance(value, datetime) else str(value)
+        for value in values
+    )
+
+
+def decode_cursor(cursor, *types):
+    """
+    Parse a cursor produced by encode_cursor back into typed values.
+    Raises ValueError for malformed cursors.
+    """
+    parts = cursor.split(CURSOR_SEPARATOR)
+    if len(parts) != len(types):
+        raise ValueError(f"Expected {len(types)} cursor values, got {len(parts)}")
+    return tuple(
+        datetime.fromisoformat(part) if kind is datetime else kind(part)
+        for part, kind in zip(parts, types)
+    )
+
+
+def after_cursor(statement, columns, cursor_values, descending=True):
+    """
+    Restrict a statement to rows strictly after the cursor in
+    (columns...) order, using a row-value comparison the index can serve.
+    """
+    if cursor_values is None:
+        return statement
+    key = tuple_(*columns)
+    return statement.where(key < tuple(cursor_values) if descending else key > tuple(cursor_values))
+
+
+def split_page(rows, page_size, cursor_of):
+    """
+    Split rows fetched with LIMIT page_size + 1 into the page and the
+    cursor for the next one (None on the last page).
+    """
+    rows = list(rows)
+    page = rows[:page_size]
+    next_cursor = cursor_of(page[-1]) if len(rows) > page_size else None
+    return page, next_cursor
+
+
+def keyset_page(statement, columns, cursor, page_size, descending=True):
+    """
+    Fetch the page of `statement` that follows an encoded cursor when
+    ordered by `columns` (which must end in a unique column). Returns
+    (items, next_cursor); single-entity selects yield ORM objects.
+    Raises ValueError for malformed cursors.
+    """
+    cursor_values = None
+    if cursor:
+        cursor_values = decode_cursor(cursor, *(column.type.python_type for column in columns))
+    statement = after_cursor(statement, columns, cursor_values, descending)
+    statement = statement.order_by(
+        *(column.desc() if descending else column.asc() for column in columns)
+    ).limit(page_size + 1)
+
+    result = db.session.execute(statement)
+    description = statement.column_descriptions[0]
+    if len(statement.column_descriptions) == 1 and description['expr'] is description['entity']:
+        result = result.scalars()
+    return split_page(
+        result.all(), page_size,
+        lambda item: encode_cursor(*(getattr(item, column.key) for column in columns))
+    )
@@ -1,17 +1,18 @@
 import numpy as np
-import pandas as pd
 from datetime import datetime, timedelta
-from sklearn.linear_model import LinearRegression
-from sklearn.ensemble import RandomForestRegressor
 import json
 
+from metrics import metrics
+
+# Days of demand covered by simulated units, revenue and margin
+SIMULATION_HORIZON_DAYS = 30
+
 class PriceOptimizer:
     """
     AI-based price optimization system that generates price recommendations 
     based on historical sales, competitor pricing, and stock levels.
     """
     def __init__(self):
-        self.models = {}
         self.features = [
             'price_history_avg', 
             'price_history_trend',
@@ -22,6 +23,7 @@ class PriceOptimizer:
             'days_since_last_change'
         ]
         
+    @metrics.timed('priceflex_optimizer_duration_seconds', operation='prepare_features')
     def prepare_features(self, product, sales, competitor_prices, price_history):
         features = {}
         
@@ -40,9 +42,12 @@ class PriceOptimizer:
             features['price_history_trend'] = 0
             features['days_since_last_change'] = 30
         
-        # Competitor pricing
+        # Competitor pricing: average of each competitor's latest price
         if competitor_prices:
-            comp_prices = [cp.price for cp in competitor_prices]
+            latest = {}
+            for cp in sorted(competitor_prices, key=lambda cp: (cp.date_recorded, cp.id)):
+                latest[cp.competitor_id] = cp.price
+            comp_prices = list(latest.values())
             features['competitor_price_avg'] = sum(comp_prices) / len(comp_prices)
             features['competitor_price_diff'] = product.current_price - features['competitor_price_avg']
         else:
@@ -56,17 +61,16 @@ class PriceOptimizer:
                 features['sales_velocity'] = len(recent_sales) / 30
                 if len(recent_sales) >= 5:
                     try:
-                        df = pd.DataFrame([(s.price, s.quantity) for s in recent_sales], 
-                                         columns=['price', 'quantity'])
-                        log_prices = np.log(df['price'])
-                        log_quantities = np.log(df['quantity'])
-                        if len(log_prices) > 1 and len(log_quantities) > 1:
-                            model = LinearRegression()
-                            model.fit(log_prices.values.reshape(-1, 1), log_quantities)
-                            features['price_elasticity'] = model.coef_[0]
-                        else:
-                            features['price_elasticity'] = -1.0
-                    except:
+                        # Log-log least squares slope; non-positive prices or
+                        # quantities give non-finite moments and fall back to -1.0
+                        with np.errstate(divide='ignore', invalid='ignore'):
+                            log_prices = np.log(np.array([s.price for s in recent_sales], dtype=float))
+                            log_quantities = np.log(np.array([s.quantity for s in recent_sales], dtype=float))
+                        features['price_elasticity'] = float(self.estimate_elasticity(
+                            len(recent_sales), log_prices.sum(), log_quantities.sum(),
+                            (log_prices * log_prices).sum(), (log_prices * log_quantities).sum()
+                        ))
+                    except (TypeError, ValueError):
                         features['price_elasticity'] = -1.0
                 else:
                     features['price_elasticity'] = -1.0
@@ -85,9 +89,62 @@ class PriceOptimizer:
             
         return features
         
+    def features_from_aggregates(self, product, aggregates):
+        """
+        Build the same feature dict as prepare_features from pre-aggregated
+        inputs (see feature_loader) instead of lists of rows.
+        """
+        features = {}
+        
+        # Process price history
+        if aggregates['history_count']:
+            features['price_history_avg'] = aggregates['history_avg']
+            if aggregates['history_count'] > 1:
+                features['price_history_trend'] = (aggregates['history_last'] - aggregates['history_first']) / aggregates['history_first']
+            else:
+                features['price_history_trend'] = 0
+            features['days_since_last_change'] = (datetime.utcnow() - aggregates['last_change']).days
+        else:
+            features['price_history_avg'] = product.current_price
+            features['price_history_trend'] = 0
+            features['days_since_last_change'] = 30
+        
+        # Competitor pricing
+        if aggregates['competitor_count']:
+            features['competitor_price_avg'] = aggregates['competitor_avg']
+            features['competitor_price_diff'] = product.current_price - features['competitor_price_avg']
+        else:
+            features['competitor_price_avg'] = product.current_price
+            features['competitor_price_diff'] = 0
+        
+        # Sales data
+        recent_count = aggregates['recent_sales_count'] or 0
+        features['sales_velocity'] = recent_count / 30 if recent_count else 0
+        if recent_count >= 5 and not aggregates['recent_invalid_count']:
+            features['price_elasticity'] = float(self.estimate_elasticity(
+                recent_count,
+                aggregates['sum_log_price'],
+                aggregates['sum_log_qty'],
+                aggregates['sum_log_price_sq'],
+                aggregates['sum_log_price_qty']
+            ))
+        else:
+            features['price_elasticity'] = -1.0
+        
+        # Stock level
+        if product.stock_level > 0:
+            features['stock_ratio'] = product.stock_level / (features['sales_velocity'] + 0.1)
+        else:
+            features['stock_ratio'] = 0
+            
+        return features
+        
     def optimize_price(self, product, sales, competitor_prices, price_history):
         features = self.prepare_features(product, sales, competitor_prices, price_history)
+        return self.optimize_features(product, features)
         
+    @metrics.timed('priceflex_optimizer_duration_seconds', operation='optimize_features')
+    def optimize_features(self, product, features):
         recommendation = {}
         current_price = product.current_price
         recommended_price = current_price
@@ -197,3 +254,315 @@ class PriceOptimizer:
         }
         
         return recommendation
+
+    @staticmethod
+    def estimate_elasticity(count, sum_log_price, sum_log_qty, sum_log_price_sq, sum_log_price_qty):
+        """
+        Closed-form log-log elasticity from per-product regression moments.
+
+        Ordinary least squares slope of log quantity on log price, with a
+        -1.0 fallback for fewer than 5 observations or unusable data.
+        """
+        count = np.asarray(count, dtype=float)
+        sum_x = np.asarray(sum_log_price, dtype=float)
+        sum_y = np.asarray(sum_log_qty, dtype=float)
+        sum_xx = np.asarray(sum_log_price_sq, dtype=float)
+        sum_xy = np.asarray(sum_log_price_qty, dtype=float)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            centered_xx = sum_xx - sum_x * sum_x / count
+            centered_xy = sum_xy - sum_x * sum_y / count
+            flat = centered_xx <= 1e-12 * np.abs(sum_xx)
+            slope = np.where(flat, 0.0, centered_xy / centered_xx)
+
+        usable = (count >= 5) & np.isfinite(sum_x) & np.isfinite(sum_y) & np.isfinite(sum_xx) & np.isfinite(sum_xy)
+        return np.where(usable & np.isfinite(slope), slope, -1.0)
+
+    @metrics.timed('priceflex_optimizer_duration_seconds', operation='optimize_batch')
+    def optimize_batch(self, product_ids, current_prices, minimum_prices, maximum_prices,
+                       stock_levels, sales_velocity, price_elasticity,
+                       competitor_price_avg, price_history_trend, days_since_last_change):
+        """
+        Vectorized counterpart of optimize_price for a whole catalog.
+
+        All arguments are equal-length array-likes, one entry per product.
+        Missing minimum/maximum prices and missing competitor averages may be
+        given as NaN (or 0 for min/max, mirroring the scalar truthiness check).
+        Returns the same list of recommendation dicts optimize_price would
+        produce for each product.
+        """
+        product_ids = np.asarray(product_ids)
+        current = np.asarray(current_prices, dtype=float)
+        min_prices = np.nan_to_num(np.asarray(minimum_prices, dtype=float), nan=0.0)
+        max_prices = np.nan_to_num(np.asarray(maximum_prices, dtype=float), nan=0.0)
+        stock = np.nan_to_num(np.asarray(stock_levels, dtype=float), nan=0.0)
+        velocity = np.asarray(sales_velocity, dtype=float)
+        elasticity = np.asarray(price_elasticity, dtype=float)
+        comp_avg = np.asarray(competitor_price_avg, dtype=float)
+        trend = np.asarray(price_history_trend, dtype=float)
+        days = np.asarray(days_since_last_change, dtype=float)
+
+        comp_diff = np.where(np.isnan(comp_avg), 0.0, current - np.nan_to_num(comp_avg))
+        stock_ratio = np.where(stock > 0, stock / (velocity + 0.1), 0.0)
+        recommended = current.copy()
+
+        # Competitor pricing influence
+        comp_high = comp_diff > 0
+        comp_low = ~comp_high & (comp_diff < -5)
+        recommended += np.where(comp_high, -np.minimum(comp_diff * 0.15, current * 0.05), 0.0)
+        recommended += np.where(comp_low, np.minimum(-comp_diff * 0.1, current * 0.03), 0.0)
+
+        # Stock level influence
+        stock_high = stock_ratio > 3
+        stock_low = ~stock_high & (stock_ratio < 0.5)
+        recommended += np.where(stock_high, -np.minimum(current * 0.03, 3.0), 0.0)
+        recommended += np.where(stock_low, np.minimum(current * 0.02, 2.0), 0.0)
+
+        # Sales velocity influence
+        selling_well = velocity > 1
+        selling_slow = ~selling_well & (velocity < 0.2) & (velocity > 0)
+        recommended += np.where(selling_well, np.minimum(current * 0.02, 2.0), 0.0)
+        recommended += np.where(selling_slow, -np.minimum(current * 0.04, 4.0), 0.0)
+
+        # Price staleness
+        stale = days > 45
+        stale_up = stale & (trend >= 0)
+        stale_down = stale & ~(trend >= 0)
+        recommended += np.where(stale_up, current * 0.01, 0.0)
+        recommended -= np.where(stale_down, current * 0.01, 0.0)
+
+        # Apply constraints
+        below_min = (min_prices != 0) & (recommended < min_prices)
+        recommended = np.where(below_min, min_prices, recommended)
+        above_max = (max_prices != 0) & (recommended > max_prices)
+        recommended = np.where(above_max, max_prices, recommended)
+
+        # Round to psychological price points
+        recommended = np.where(
+            recommended >= 100,
+            np.floor(recommended) - 0.01,
+            np.where(
+                recommended >= 10,
+                np.floor(recommended * 2) / 2 - 0.01,
+                np.floor(recommended * 4) / 4 - 0.01
+            )
+        )
+
+        # Avoid tiny changes
+        unchanged = np.abs(recommended - current) < (current * 0.01)
+        recommended = np.where(unchanged, current, recommended)
+
+        # Estimate revenue impact
+        has_velocity = velocity > 0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            quantity_change_ratio = 1 + (elasticity * (recommended / current - 1))
+            new_monthly_revenue = velocity * quantity_change_ratio * 30 * recommended
+            current_monthly_revenue = velocity * 30 * current
+            potential = np.where(has_velocity, new_monthly_revenue - current_monthly_revenue, 0.0)
+
+        recommendations = []
+        for i in range(len(current)):
+            rationale = []
+            factors_influence = {}
+
+            if comp_high[i]:
+                rationale.append(f"Your price is higher than competitors by ₹{comp_diff[i]:.2f}")
+                factors_influence['competitor_pricing'] = -2
+            elif comp_low[i]:
+                rationale.append(f"Your price is significantly lower than competitors by ₹{-comp_diff[i]:.2f}")
+                factors_influence['competitor_pricing'] = 2
+            else:
+                factors_influence['competitor_pricing'] = 0
+
+            if stock_high[i]:
+                rationale.append("You have high inventory levels relative to sales velocity")
+                factors_influence['inventory_level'] = -2
+            elif stock_low[i]:
+                rationale.append("Your inventory is running low relative to sales velocity")
+                factors_influence['inventory_level'] = 2
+            else:
+                factors_influence['inventory_level'] = 0
+
+            if selling_well[i]:
+                rationale.append(f"Your product is selling well with {velocity[i]:.2f} units per day")
+                factors_influence['sales_performance'] = 2
+            elif selling_slow[i]:
+                rationale.append(f"Sales are slow with only {velocity[i]:.2f} units per day")
+                factors_influence['sales_performance'] = -2
+            else:
+                factors_influence['sales_performance'] = 0
+
+            if stale_up[i]:
+                rationale.append(f"Price hasn't been updated in {int(days[i])} days and trend is upward")
+                factors_influence['price_freshness'] = 1
+            elif stale_down[i]:
+                rationale.append(f"Price hasn't been updated in {int(days[i])} days and trend is downward")
+                factors_influence['price_freshness'] = 1
+            else:
+                factors_influence['price_freshness'] = 0
+
+            if below_min[i]:
+                rationale.append(f"Price adjusted to respect your minimum price threshold (₹{min_prices[i]:.2f})")
+            if above_max[i]:
+                rationale.append(f"Price adjusted to respect your maximum price threshold (₹{max_prices[i]:.2f})")
+
+            if unchanged[i]:
+                rationale = ["Current price is optimal based on market conditions"]
+
+            potential_revenue = float(potential[i])
+            if has_velocity[i]:
+                if potential_revenue > 0:
+                    rationale.append(f"This change could increase monthly revenue by approximately ₹{potential_revenue:.2f}")
+                else:
+                    rationale.append("This price optimizes for long-term market position despite a potential short-term revenue decrease")
+
+            recommendations.append({
+                'product_id': int(product_ids[i]),
+                'current_price': float(current[i]),
+                'recommended_price': float(round(float(recommended[i]), 2)),
+                'potential_revenue_increase': float(round(potential_revenue, 2)),
+                'rationale': '. '.join(rationale),
+                'factors': json.dumps(factors_influence)
+            })
+
+        return recommendations
+
+    def optimize_prepared(self, products, features):
+        """
+        Run optimize_batch for products whose features were already computed
+        with prepare_features (or an equivalent loader).
+        """
+        return self.optimize_batch(
+            [p.id for p in products],
+            [p.current_price for p in products],
+            [p.minimum_price for p in products],
+            [p.maximum_price for p in products],
+            [p.stock_level for p in products],
+            [f['sales_velocity'] for f in features],
+            [f['price_elasticity'] for f in features],
+            [f['competitor_price_avg'] for f in features],
+            [f['price_history_trend'] for f in features],
+            [f['days_since_last_change'] for f in features],
+        )
+
+    @staticmethod
+    def relative_price_grid(current_prices, low=0.5, high=1.5, points=101):
+        """
+        Candidate prices from low to high times each product's current price,
+        one row per product.
+        """
+        current = np.asarray(current_prices, dtype=float).reshape(-1, 1)
+        return current * np.linspace(low, high, points)
+
+    @metrics.timed('priceflex_optimizer_duration_seconds', operation='simulate_batch')
+    def simulate_batch(self, current_prices, cost_prices, stock_levels, minimum_prices, maximum_prices,
+                       sales_velocity, price_elasticity, price_grid, horizon_days=SIMULATION_HORIZON_DAYS):
+        """
+        Evaluate candidate prices for many products at once.
+
+        Product arguments are equal-length array-likes; price_grid is one row
+        of prices shared by every product or one row per product. Demand
+        follows the constant-elasticity curve through the current price and
+        sales velocity, and units sold are capped by the stock level (NaN
+        means unlimited). Minimum/maximum prices of NaN or 0 are unset, as in
+        optimize_batch. Returns (products, points) arrays: prices, demand,
+        units, revenue, margin and feasible.
+        """
+        current = np.asarray(current_prices, dtype=float).reshape(-1, 1)
+        cost = np.nan_to_num(np.asarray(cost_prices, dtype=float), nan=0.0).reshape(-1, 1)
+        stock = np.asarray(stock_levels, dtype=float).reshape(-1, 1)
+        min_prices = np.nan_to_num(np.asarray(minimum_prices, dtype=float), nan=0.0).reshape(-1, 1)
+        max_prices = np.nan_to_num(np.asarray(maximum_prices, dtype=float), nan=0.0).reshape(-1, 1)
+        velocity = np.nan_to_num(np.asarray(sales_velocity, dtype=float), nan=0.0).reshape(-1, 1)
+        elasticity = np.asarray(price_elasticity, dtype=float).reshape(-1, 1)
+
+        grid = np.asarray(price_grid, dtype=float)
+        prices = np.broadcast_to(grid, (len(current), grid.shape[-1]))
+
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            demand = velocity * horizon_days * np.power(prices / current, elasticity)
+        demand = np.where(np.isfinite(demand) & (prices > 0), demand, 0.0)
+        units = np.where(np.isnan(stock), demand, np.minimum(demand, np.maximum(stock, 0.0)))
+
+        feasible = (
+            (prices > 0)
+            & ((min_prices == 0) | (prices >= min_prices))
+            & ((max_prices == 0) | (prices <= max_prices))
+        )
+        return {
+            'prices': prices,
+            'demand': demand,
+            'units': units,
+            'revenue': units * prices,
+            'margin': units * (prices - cost),
+            'feasible': feasible
+        }
+
+    def simulate_products(self, products, features, price_grid, horizon_days=SIMULATION_HORIZON_DAYS):
+        """
+        Run simulate_batch for products with prepared features and return one
+        dict per product with the curves and the feasible grid points that
+        maximise revenue and margin (None when no point is feasible).
+        """
+        stock_levels = [np.nan if p.stock_level is None else p.stock_level for p in products]
+        result = self.simulate_batch(
+            [p.current_price for p in products],
+            [p.cost_price for p in products],
+            stock_levels,
+            [p.minimum_price for p in products],
+            [p.maximum_price for p in products],
+            [f['sales_velocity'] for f in features],
+            [f['price_elasticity'] for f in features],
+            price_grid,
+            horizon_days
+        )
+
+        feasible = result['feasible']
+        any_feasible = feasible.any(axis=1)
+        best_revenue = np.where(feasible, result['revenue'], -np.inf).argmax(axis=1)
+        best_margin = np.where(feasible, result['margin'], -np.inf).argmax(axis=1)
+
+        prices = np.round(result['prices'], 2)
+        units = np.round(result['units'], 3)
+        revenue = np.round(result['revenue'], 2)
+        margin = np.round(result['margin'], 2)
+
+        def point(i, j):
+            if not any_feasible[i]:
+                return None
+            return {
+                'price': float(prices[i, j]),
+                'units': float(units[i, j]),
+                'revenue': float(revenue[i, j]),
+                'margin': float(margin[i, j])
+            }
+
+        simulations = []
+        for i, (product, product_features) in enumerate(zip(products, features)):
+            simulations.append({
+                'product_id': int(product.id),
+                'current_price': float(product.current_price),
+                'cost_price': float(product.cost_price),
+                'stock_level': product.stock_level,
+                'price_elasticity': float(product_features['price_elasticity']),
+                'sales_velocity': float(product_features['sales_velocity']),
+                'horizon_days': horizon_days,
+                'prices': prices[i].tolist(),
+                'units': units[i].tolist(),
+                'revenue': revenue[i].tolist(),
+                'margin': margin[i].tolist(),
+                'feasible': feasible[i].tolist(),
+                'best_revenue': point(i, best_revenue[i]),
+                'best_margin': point(i, best_margin[i])
+            })
+        return simulations
+
+    def simulate(self, product, price_grid, features=None):
+        """
+        Expected units, revenue and margin of one product at each price in
+        price_grid. Features default to the product's running statistics.
+        """
+        if features is None:
+            from product_stats import load_stats_features
+            features = load_stats_features(product, self)
+        return self.simulate_products([product], [features], np.asarray(price_grid, dtype=float).reshape(1, -1))[0]
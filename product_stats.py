@@ -0,0 +1,470 @@
+import json
+import math
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, insert, func, case, and_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from models import Product, Sale, PriceHistory, ProductStats
+from feature_loader import load_product_features, load_features
+from sales_archive import archived_sales_totals
+from competitor_snapshot import snapshot_totals
+
+_UPSERT_DIALECTS = {
+    'postgresql': postgresql.insert,
+    'sqlite': sqlite.insert
+}
+
+WINDOW_DAYS = 30
+
+# Products per IN (...) lookup in bulk updates
+LOOKUP_CHUNK_SIZE = 1000
+
+# Order of the moments kept in each daily sales bucket
+_BUCKET_FIELDS = ('count', 'invalid', 'sum_log_price', 'sum_log_qty', 'sum_log_price_sq', 'sum_log_price_qty')
+
+_COUNTERS = (
+    'history_count', 'history_sum', 'competitor_count', 'competitor_sum',
+    'sales_count', 'units_sold', 'revenue_sum', 'log_count', 'sum_log_price',
+    'sum_log_qty', 'sum_log_price_sq', 'sum_log_qty_sq', 'sum_log_price_qty'
+)
+
+
+def _empty_stats(product_id):
+    stats = ProductStats(product_id=product_id, sales_windows='{}')
+    for name in _COUNTERS:
+        setattr(stats, name, 0)
+    return stats
+
+
+def _window_start(now=None):
+    today = (now or datetime.utcnow()).date()
+    return today - timedelta(days=WINDOW_DAYS - 1)
+
+
+def _load_windows(stats):
+    return json.loads(stats.sales_windows or '{}')
+
+
+def _store_windows(stats, windows, now=None):
+    start = _window_start(now).isoformat()
+    stats.sales_windows = json.dumps({day: bucket for day, bucket in sorted(windows.items()) if day >= start})
+
+
+def _insert_rebuilt(computed):
+    """
+    Insert rebuilt stats rows unless another transaction created them first
+    (INSERT ... ON CONFLICT DO NOTHING). Returns the product ids inserted.
+    """
+    table = ProductStats.__table__
+    now = datetime.utcnow()
+    rows = [
+        dict({column.key: getattr(stats, column.key) for column in table.columns}, updated_at=now)
+        for stats in computed
+    ]
+    if not rows:
+        return set()
+
+    dialect_insert = _UPSERT_DIALECTS.get(db.session.get_bind().dialect.name)
+    if dialect_insert is None:
+        # Portable fallback: a savepoint per row, a duplicate key means the row exists
+        inserted = set()
+        for row in rows:
+            try:
+                with db.session.begin_nested():
+                    db.session.execute(insert(table), [row])
+            except IntegrityError:
+                continue
+            inserted.add(row['product_id'])
+        return inserted
+
+    return set(db.session.scalars(
+        dialect_insert(table).on_conflict_do_nothing(index_elements=['product_id']).returning(table.c.product_id),
+        rows
+    ))
+
+
+def _locked_stats(product_id):
+    """
+    Return (stats, rebuilt) for a product, locking the row for update.
+
+    A missing row is rebuilt from the raw tables after flushing the session,
+    so it already includes any row the caller has just added. When a
+    concurrent transaction creates the row first, that row is locked and
+    returned instead, for the caller to fold its change into.
+    """
+    stats = ProductStats.query.filter_by(product_id=product_id).with_for_update().first()
+    if stats is not None:
+        return stats, False
+    db.session.flush()
+    stats = compute_stats([product_id])[product_id]
+    if _insert_rebuilt([stats]):
+        return stats, True
+    return ProductStats.query.filter_by(product_id=product_id).with_for_update().one(), False
+
+
+def record_sale(sale):
+    """Fold a newly added Sale into its product's running statistics."""
+    stats, rebuilt = _locked_stats(sale.product_id)
+    if rebuilt:
+        return stats
+
+    windows = _load_windows(stats)
+    _apply_sale(stats, windows, sale.quantity, sale.price, sale.sale_date or datetime.utcnow())
+    _store_windows(stats, windows)
+    stats.updated_at = datetime.utcnow()
+    return stats
+
+
+def record_sales(sales):
+    """
+    Fold many newly inserted sales into the statistics of their products.
+
+    sales is an iterable of (product_id, quantity, price, sale_date) that
+    has already been written in the current transaction. Existing stats rows
+    are locked and updated in one pass; products without a row are rebuilt
+    from the raw tables.
+    """
+    by_product = defaultdict(list)
+    for product_id, quantity, price, sale_date in sales:
+        by_product[product_id].append((quantity, price, sale_date))
+
+    now = datetime.utcnow()
+    for product_id, stats in _locked_stats_many(by_product).items():
+        windows = _load_windows(stats)
+        for quantity, price, sale_date in by_product[product_id]:
+            _apply_sale(stats, windows, quantity, price, sale_date)
+        _store_windows(stats, windows)
+        stats.updated_at = now
+
+
+def record_competitor_prices(product_ids):
+    """
+    Refresh the competitor aggregates of products whose latest-price
+    snapshot changed in the current transaction.
+    """
+    locked = _locked_stats_many(product_ids)
+    totals = snapshot_totals(locked)
+
+    now = datetime.utcnow()
+    for product_id, stats in locked.items():
+        stats.competitor_count, stats.competitor_sum = totals.get(product_id, (0, 0.0))
+        stats.updated_at = now
+
+
+def _locked_stats_many(product_ids):
+    """
+    Lock and return {product_id: stats} for products that already have a
+    stats row. Products without one are rebuilt from the raw tables (which
+    include the caller's new rows) and left out of the result, unless a
+    concurrent transaction created their row first.
+    """
+    product_ids = list(product_ids)
+    existing = {}
+    for i in range(0, len(product_ids), LOOKUP_CHUNK_SIZE):
+        chunk = product_ids[i:i + LOOKUP_CHUNK_SIZE]
+        found = {
+            stats.product_id: stats
+            for stats in ProductStats.query.filter(
+                ProductStats.product_id.in_(chunk)
+            ).with_for_update()
+        }
+        missing = [product_id for product_id in chunk if product_id not in found]
+        if missing:
+            db.session.flush()
+            raced = set(missing) - _insert_rebuilt(compute_stats(missing).values())
+            if raced:
+                found.update(
+                    (stats.product_id, stats)
+                    for stats in ProductStats.query.filter(
+                        ProductStats.product_id.in_(raced)
+                    ).with_for_update()
+                )
+        existing.update(found)
+    return existing
+
+
+def _apply_sale(stats, windows, quantity, price, sale_date):
+    stats.sales_count += 1
+    stats.units_sold += quantity
+    stats.revenue_sum += quantity * price
+
+    valid = price > 0 and quantity > 0
+    log_price = math.log(price) if valid else 0.0
+    log_qty = math.log(quantity) if valid else 0.0
+    if valid:
+        stats.log_count += 1
+        stats.sum_log_price += log_price
+        stats.sum_log_qty += log_qty
+        stats.sum_log_price_sq += log_price * log_price
+        stats.sum_log_qty_sq += log_qty * log_qty
+        stats.sum_log_price_qty += log_price * log_qty
+
+    if sale_date.date() >= _window_start():
+        bucket = windows.setdefault(sale_date.date().isoformat(), [0] * len(_BUCKET_FIELDS))
+        bucket[0] += 1
+        bucket[1] += 0 if valid else 1
+        bucket[2] += log_price
+        bucket[3] += log_qty
+        bucket[4] += log_price * log_price
+        bucket[5] += log_price * log_qty
+
+
+def record_price_change(price_history):
+    """Fold a newly added PriceHistory entry into its product's statistics."""
+    stats, rebuilt = _locked_stats(price_history.product_id)
+    if rebuilt:
+        return stats
+
+    changed_at = price_history.date_changed or datetime.utcnow()
+    if not stats.history_count:
+        stats.history_first_price = price_history.price
+    stats.history_count += 1
+    stats.history_sum += price_history.price
+    stats.history_last_price = price_history.price
+    if stats.last_change is None or changed_at > stats.last_change:
+        stats.last_change = changed_at
+    stats.updated_at = datetime.utcnow()
+    return stats
+
+
+def record_price_changes(changes):
+    """
+    Fold many newly inserted price history entries into their products'
+    statistics.
+
+    changes is an iterable of (product_id, price, date_changed) already
+    written in the current transaction. Existing stats rows are locked and
+    updated in one pass; products without a row are rebuilt from the raw
+    tables.
+    """
+    by_product = defaultdict(list)
+    for product_id, price, changed_at in changes:
+        by_product[product_id].append((changed_at, price))
+
+    now = datetime.utcnow()
+    for product_id, stats in _locked_stats_many(by_product).items():
+        for changed_at, price in sorted(by_product[product_id], key=lambda change: change[0]):
+            if not stats.history_count:
+                stats.history_first_price = price
+            stats.history_count += 1
+            stats.history_sum += price
+            stats.history_last_price = price
+            if stats.last_change is None or changed_at > stats.last_change:
+                stats.last_change = changed_at
+        stats.updated_at = now
+
+
+def record_competitor_price(competitor_price):
+    """Refresh a product's competitor aggregates after its snapshot was updated."""
+    product_id = int(competitor_price.product_id)
+    stats, rebuilt = _locked_stats(product_id)
+    if rebuilt:
+        return stats
+
+    stats.competitor_count, stats.competitor_sum = snapshot_totals([product_id]).get(product_id, (0, 0.0))
+    stats.updated_at = datetime.utcnow()
+    return stats
+
+
+def stats_aggregates(stats, now=None):
+    """
+    Map a ProductStats row onto the inputs of
+    PriceOptimizer.features_from_aggregates.
+
+    The 30-day sales window is resolved at day granularity from the daily
+    buckets, so it holds at most 30 entries regardless of sales volume.
+    """
+    start = _window_start(now).isoformat()
+    totals = [0] * len(_BUCKET_FIELDS)
+    for day, bucket in _load_windows(stats).items():
+        if day >= start:
+            totals = [total + value for total, value in zip(totals, bucket)]
+    window = dict(zip(_BUCKET_FIELDS, totals))
+
+    return {
+        'history_count': stats.history_count,
+        'history_avg': stats.history_sum / stats.history_count if stats.history_count else None,
+        'history_first': stats.history_first_price,
+        'history_last': stats.history_last_price,
+        'last_change': stats.last_change,
+        'competitor_count': stats.competitor_count,
+        'competitor_avg': stats.competitor_sum / stats.competitor_count if stats.competitor_count else None,
+        'recent_sales_count': window['count'],
+        'recent_invalid_count': window['invalid'],
+        'sum_log_price': window['sum_log_price'],
+        'sum_log_qty': window['sum_log_qty'],
+        'sum_log_price_sq': window['sum_log_price_sq'],
+        'sum_log_price_qty': window['sum_log_price_qty']
+    }
+
+
+def load_stats_features(product, optimizer):
+    """
+    Optimizer features for a product read from its ProductStats row, falling
+    back to the SQL aggregate loader for products without one yet.
+    """
+    stats = db.session.get(ProductStats, product.id)
+    if stats is None:
+        return load_product_features(product, optimizer)
+    return optimizer.features_from_aggregates(product, stats_aggregates(stats))
+
+
+def load_stats_features_many(products, optimizer):
+    """
+    load_stats_features for many products: {product_id: features} from one
+    ProductStats lookup per chunk, with the SQL aggregate loader covering
+    products that have no statistics row yet.
+    """
+    products = {product.id: product for product in products}
+    product_ids = list(products)
+    features = {}
+    for i in range(0, len(product_ids), LOOKUP_CHUNK_SIZE):
+        chunk = product_ids[i:i + LOOKUP_CHUNK_SIZE]
+        for stats in db.session.scalars(select(ProductStats).where(ProductStats.product_id.in_(chunk))):
+            features[stats.product_id] = optimizer.features_from_aggregates(
+                products[stats.product_id], stats_aggregates(stats)
+            )
+    missing = [product_id for product_id in product_ids if product_id not in features]
+    if missing:
+        features.update(load_features(missing, optimizer))
+    return features
+
+
+def compute_stats(product_ids):
+    """Recompute ProductStats objects (not added to the session) from the raw tables."""
+    product_ids = list(product_ids)
+    result = {product_id: _empty_stats(product_id) for product_id in product_ids}
+    if not product_ids:
+        return result
+
+    # Price history: counts, sums, first/last entry by id and latest change
+    first_ids = select(func.min(PriceHistory.id)).where(
+        PriceHistory.product_id.in_(product_ids)
+    ).group_by(PriceHistory.product_id)
+    last_ids = select(func.max(PriceHistory.id)).where(
+        PriceHistory.product_id.in_(product_ids)
+    ).group_by(PriceHistory.product_id)
+    edges = db.session.execute(
+        select(PriceHistory.id, PriceHistory.product_id, PriceHistory.price).where(
+            PriceHistory.id.in_(first_ids.union(last_ids))
+        ).order_by(PriceHistory.id)
+    ).all()
+    for row in edges:
+        stats = result[row.product_id]
+        if stats.history_first_price is None:
+            stats.history_first_price = row.price
+        stats.history_last_price = row.price
+
+    for row in db.session.execute(
+        select(
+            PriceHistory.product_id, func.count(), func.sum(PriceHistory.price),
+            func.max(PriceHistory.date_changed).label('last_change')
+        ).where(PriceHistory.product_id.in_(product_ids)).group_by(PriceHistory.product_id)
+    ):
+        stats = result[row.product_id]
+        stats.history_count, stats.history_sum, stats.last_change = row[1], row[2], row.last_change
+
+    # Latest price of each competitor
+    for product_id, (count, total) in snapshot_totals(product_ids).items():
+        result[product_id].competitor_count, result[product_id].competitor_sum = count, total
+
+    # Sales: totals and log-log moments
+    valid = and_(Sale.price > 0, Sale.quantity > 0)
+    log_price = case((valid, func.ln(Sale.price)))
+    log_qty = case((valid, func.ln(Sale.quantity)))
+    moments = (
+        func.sum(case((valid, 0), else_=1)),
+        func.coalesce(func.sum(log_price), 0.0),
+        func.coalesce(func.sum(log_qty), 0.0),
+        func.coalesce(func.sum(log_price * log_price), 0.0),
+        func.coalesce(func.sum(log_price * log_qty), 0.0)
+    )
+
+    for row in db.session.execute(
+        select(
+            Sale.product_id, func.count(), func.sum(Sale.quantity),
+            func.sum(Sale.quantity * Sale.price), func.count(log_price),
+            func.coalesce(func.sum(log_qty * log_qty), 0.0), *moments
+        ).where(Sale.product_id.in_(product_ids)).group_by(Sale.product_id)
+    ):
+        stats = result[row.product_id]
+        (stats.sales_count, stats.units_sold, stats.revenue_sum, stats.log_count,
+         stats.sum_log_qty_sq, _, stats.sum_log_price, stats.sum_log_qty,
+         stats.sum_log_price_sq, stats.sum_log_price_qty) = row[1:]
+
+    # Archived sales still count towards the totals
+    for product_id, totals in archived_sales_totals(product_ids).items():
+        stats = result[product_id]
+        for name, value in totals.items():
+            setattr(stats, name, getattr(stats, name) + value)
+
+    # Daily buckets for the rolling sales window
+    windows = defaultdict(dict)
+    window_start = datetime.combine(_window_start(), datetime.min.time())
+    sale_day = func.date(Sale.sale_date)
+    for row in db.session.execute(
+        select(Sale.product_id, sale_day.label('day'), func.count(), *moments).where(
+            Sale.product_id.in_(product_ids),
+            Sale.sale_date >= window_start
+        ).group_by(Sale.product_id, sale_day)
+    ):
+        windows[row.product_id][str(row.day)] = list(row[2:])
+
+    now = datetime.utcnow()
+    for product_id, stats in result.items():
+        _store_windows(stats, windows.get(product_id, {}))
+        stats.updated_at = now
+    return result
+
+
+def _stats_differ(stored, fresh):
+    for name in _COUNTERS + ('history_first_price', 'history_last_price'):
+        a, b = getattr(stored, name), getattr(fresh, name)
+        if a is None or b is None:
+            if a is not b:
+                return True
+        elif not math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-9):
+            return True
+    return stored.last_change != fresh.last_change
+
+
+def rebuild_product_stats(product_ids=None, chunk_size=1000, check_only=False):
+    """
+    Recompute ProductStats from Sale (including archived sales),
+    PriceHistory and the latest competitor price snapshot.
+
+    With check_only the stored rows are compared against the recomputed
+    values without writing. Returns (products_processed, mismatched_ids).
+    """
+    if product_ids is None:
+        product_ids = db.session.scalars(select(Product.id).order_by(Product.id)).all()
+    product_ids = list(product_ids)
+
+    mismatched = []
+    for i in range(0, len(product_ids), chunk_size):
+        chunk = product_ids[i:i + chunk_size]
+        fresh = compute_stats(chunk)
+        stored = {
+            stats.product_id: stats
+            for stats in ProductStats.query.filter(ProductStats.product_id.in_(chunk))
+        }
+        for product_id, stats in fresh.items():
+            current = stored.get(product_id)
+            if current is None or _stats_differ(current, stats):
+                mismatched.append(product_id)
+            if check_only:
+                continue
+            if current is None:
+                db.session.add(stats)
+            else:
+                for name in _COUNTERS + ('history_first_price', 'history_last_price',
+                                         'last_change', 'sales_windows', 'updated_at'):
+                    setattr(current, name, getattr(stats, name))
+        if not check_only:
+            db.session.commit()
+
+    return len(product_ids), mismatched
@@ -0,0 +1,180 @@
+"""
+Development/test guard that counts SQL statements per request, flags
+repeated statements of the same shape (the usual sign of an N+1 loop over
+a lazy relationship) and logs where they were issued from.
+
+Enable with QUERY_GUARD=1. Requests over their budget (QUERY_BUDGET, or a
+per-endpoint entry in QUERY_BUDGETS) and statements repeated at least
+QUERY_REPEAT_THRESHOLD times are logged with their call sites, and every
+response carries an X-Query-Count header. Tests can assert a budget
+directly:
+
+    with assert_max_queries(5):
+        client.get('/competitors').close()
+"""
+import logging
+import os
+import re
+import threading
+import traceback
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from flask import g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+_PLACEHOLDER = re.compile(r'%\(\w+\)s|\$\d+')
+_PLACEHOLDER_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+
+_active = threading.local()
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised by assert_max_queries when a block issues too many statements."""
+
+
+def statement_shape(statement):
+    """Normalise a statement so executions differing only in parameters compare equal."""
+    shape = _PLACEHOLDER.sub('?', statement)
+    shape = _PLACEHOLDER_LIST.sub('(?...)', shape)
+    return _WHITESPACE.sub(' ', shape).strip()
+
+
+def _call_site():
+    """Innermost frame in this project's code, skipping libraries and this module."""
+    for frame in reversed(traceback.extract_stack()):
+        filename = os.path.abspath(frame.filename)
+        if (filename.startswith(ROOT) and filename != os.path.abspath(__file__)
+                and 'site-packages' not in filename):
+            return f'{os.path.relpath(filename, ROOT)}:{frame.lineno} in {frame.name}'
+    return 'unknown'
+
+
+class QueryTracker:
+    """Statements seen while active, grouped by shape with their call sites."""
+
+    def __init__(self, capture_sites=True):
+        self.capture_sites = capture_sites
+        self.statements = 0
+        self.shapes = Counter()
+        self.sites = defaultdict(Counter)
+
+    def record(self, statement):
+        self.statements += 1
+        shape = statement_shape(statement)
+        self.shapes[shape] += 1
+        if self.capture_sites:
+            self.sites[shape][_call_site()] += 1
+
+    def repeated(self, threshold):
+        """[(shape, count, {call_site: count})] for shapes executed at least threshold times."""
+        return [
+            (shape, count, dict(self.sites.get(shape, {})))
+            for shape, count in self.shapes.most_common()
+            if count >= threshold
+        ]
+
+    def describe(self, threshold=2):
+        lines = [f"{self.statements} statements"]
+        for shape, count, sites in self.repeated(threshold):
+            lines.append(f"  {count}x {shape[:200]}")
+            for site, site_count in sites.items():
+                lines.append(f"      {site_count}x from {site}")
+        return '\n'.join(lines)
+
+
+def _trackers():
+    if not hasattr(_active, 'trackers'):
+        _active.trackers = []
+    return _active.trackers
+
+
+def _record_statement(conn, cursor, statement, parameters, context, executemany):
+    for tracker in _trackers():
+        tracker.record(statement)
+
+
+_listening = False
+
+
+def _listen():
+    global _listening
+    if not _listening:
+        event.listen(Engine, 'before_cursor_execute', _record_statement)
+        _listening = True
+
+
+@contextmanager
+def track_queries(capture_sites=True):
+    """Collect statements executed by this thread inside the block."""
+    _listen()
+    tracker = QueryTracker(capture_sites)
+    _trackers().append(tracker)
+    try:
+        yield tracker
+    finally:
+        _trackers().remove(tracker)
+
+
+@contextmanager
+def assert_max_queries(limit, repeat_threshold=None):
+    """
+    Fail with QueryBudgetExceeded if the block issues more than `limit`
+    statements, or (when repeat_threshold is given) repeats any statement
+    shape that many times. Consume streamed responses inside the block.
+    """
+    with track_queries() as tracker:
+        yield tracker
+    if tracker.statements > limit:
+        raise QueryBudgetExceeded(f"Query budget of {limit} exceeded: {tracker.describe()}")
+    if repeat_threshold is not None and tracker.repeated(repeat_threshold):
+        raise QueryBudgetExceeded(f"Repeated statements (possible N+1): {tracker.describe(repeat_threshold)}")
+
+
+def init_app(app):
+    app.config.setdefault('QUERY_GUARD', os.environ.get('QUERY_GUARD', '').lower() in ('1', 'true', 'yes'))
+    app.config.setdefault('QUERY_BUDGET', 20)
+    app.config.setdefault('QUERY_BUDGETS', {})
+    app.config.setdefault('QUERY_REPEAT_THRESHOLD', 5)
+    if not app.config['QUERY_GUARD']:
+        return
+    _listen()
+
+    @app.before_request
+    def start_tracking():
+        tracker = QueryTracker()
+        _trackers().append(tracker)
+        g._query_tracker = tracker
+
+    @app.after_request
+    def add_query_count(response):
+        tracker = g.get('_query_tracker')
+        if tracker is not None:
+            # Statements issued while streaming the body are not included here
+            response.headers['X-Query-Count'] = str(tracker.statements)
+        return response
+
+    @app.teardown_request
+    def check_budget(exc):
+        tracker = g.pop('_query_tracker', None)
+        if tracker is None:
+            return
+        if tracker in _trackers():
+            _trackers().remove(tracker)
+
+        endpoint = request.endpoint or 'unmatched'
+        budget = app.config['QUERY_BUDGETS'].get(endpoint, app.config['QUERY_BUDGET'])
+        if tracker.statements > budget:
+            logger.warning(f"Query budget exceeded on {request.method} {request.path} ({endpoint}): "
+                           f"{tracker.statements} > {budget}\n{tracker.describe()}")
+        repeated = tracker.repeated(app.config['QUERY_REPEAT_THRESHOLD'])
+        for shape, count, sites in repeated:
+            site_list = ', '.join(f'{site} ({site_count}x)' for site, site_count in sites.items())
+            logger.warning(f"Possible N+1 on {request.method} {request.path} ({endpoint}): "
+                           f"{count}x {shape[:200]} from {site_list}")
@@ -0,0 +1,176 @@
+import time
+from datetime import datetime
+
+from sqlalchemy import select, insert, update, literal
+
+from app import db
+from models import Product, PriceHistory, PriceRecommendation
+from product_stats import record_price_changes
+import data_versions
+
+# Recommendation ids per validation query and per set-based write
+ID_CHUNK_SIZE = 10000
+
+# Largest number of recommendation ids accepted in one request
+MAX_APPLY_IDS = 100000
+
+# Rejected recommendations kept in the report; the rest are only counted
+MAX_REJECTED_SAMPLES = 100
+
+# Tolerance when comparing a recommended price with the product's bounds
+PRICE_EPSILON = 1e-9
+
+
+def _candidates(user_id, recommendation_ids, min_revenue_increase):
+    """
+    Recommendations of the user's products with their product's bounds,
+    row-locked until the transaction ends. Ownership is part of the join,
+    so ids of other users' recommendations are simply not returned.
+    """
+    statement = select(
+        PriceRecommendation.id,
+        PriceRecommendation.product_id,
+        PriceRecommendation.status,
+        PriceRecommendation.recommended_price,
+        PriceRecommendation.created_at,
+        Product.minimum_price,
+        Product.maximum_price
+    ).join(Product, Product.id == PriceRecommendation.product_id).where(
+        Product.user_id == user_id
+    ).with_for_update()
+
+    if recommendation_ids is None:
+        statement = statement.where(PriceRecommendation.status == 'pending')
+        if min_revenue_increase is not None:
+            statement = statement.where(PriceRecommendation.potential_revenue_increase >= min_revenue_increase)
+        yield from db.session.execute(statement)
+        return
+
+    for i in range(0, len(recommendation_ids), ID_CHUNK_SIZE):
+        yield from db.session.execute(
+            statement.where(PriceRecommendation.id.in_(recommendation_ids[i:i + ID_CHUNK_SIZE]))
+        )
+
+
+def _rejection(row):
+    if row.status != 'pending':
+        return f"recommendation is {row.status}"
+    if row.recommended_price <= 0:
+        return "recommended price is not positive"
+    if row.minimum_price is not None and row.recommended_price < row.minimum_price - PRICE_EPSILON:
+        return f"below the minimum price {row.minimum_price:.2f}"
+    if row.maximum_price is not None and row.recommended_price > row.maximum_price + PRICE_EPSILON:
+        return f"above the maximum price {row.maximum_price:.2f}"
+    return None
+
+
+def _apply(recommendation_ids, superseded_ids, now):
+    """
+    Set the prices, add the history entries and accept the recommendations
+    with set-based statements; superseded recommendations are rejected so a
+    later apply cannot bring their older price back.
+    """
+    recommendations = PriceRecommendation.__table__
+    products = Product.__table__
+    history = PriceHistory.__table__
+    for i in range(0, len(recommendation_ids), ID_CHUNK_SIZE):
+        chunk = recommendation_ids[i:i + ID_CHUNK_SIZE]
+        # UPDATE product ... FROM price_recommendation
+        db.session.execute(
+            update(products)
+            .where(products.c.id == recommendations.c.product_id, recommendations.c.id.in_(chunk))
+            .values(current_price=recommendations.c.recommended_price)
+        )
+        db.session.execute(
+            insert(history).from_select(
+                ['product_id', 'price', 'date_changed'],
+                select(
+                    recommendations.c.product_id,
+                    recommendations.c.recommended_price,
+                    literal(now, history.c.date_changed.type)
+                ).where(recommendations.c.id.in_(chunk))
+            )
+        )
+        db.session.execute(
+            update(recommendations)
+            .where(recommendations.c.id.in_(chunk))
+            .values(status='accepted')
+        )
+    for i in range(0, len(superseded_ids), ID_CHUNK_SIZE):
+        db.session.execute(
+            update(recommendations)
+            .where(recommendations.c.id.in_(superseded_ids[i:i + ID_CHUNK_SIZE]))
+            .values(status='rejected')
+        )
+
+
+def apply_recommendations(user_id, recommendation_ids=None, min_revenue_increase=None):
+    """
+    Accept a set of price recommendations for a user in one transaction.
+
+    recommendation_ids lists the recommendations to apply; None applies
+    every pending recommendation, optionally only those whose potential
+    revenue increase is at least min_revenue_increase. Ownership, status
+    and the products' minimum/maximum prices are checked with one query
+    per ID_CHUNK_SIZE ids. When several applicable recommendations target
+    the same product, the newest wins and the others are marked rejected.
+    Prices, price history entries and statuses are then written with
+    set-based statements, product statistics and data versions are
+    updated, and everything is committed together. Returns a report dict.
+    """
+    started = time.perf_counter()
+    report = {'requested': 0, 'applied': 0, 'rejected': 0, 'rejected_recommendations': []}
+
+    def reject(recommendation_id, reason):
+        report['rejected'] += 1
+        if len(report['rejected_recommendations']) < MAX_REJECTED_SAMPLES:
+            report['rejected_recommendations'].append({'id': recommendation_id, 'reason': reason})
+
+    if recommendation_ids is not None:
+        recommendation_ids = sorted(set(recommendation_ids))
+        report['requested'] = len(recommendation_ids)
+
+    try:
+        found = set()
+        newest = {}
+        superseded = []
+        for row in _candidates(user_id, recommendation_ids, min_revenue_increase):
+            found.add(row.id)
+            reason = _rejection(row)
+            if reason is not None:
+                reject(row.id, reason)
+                continue
+            current = newest.get(row.product_id)
+            if current is None or (row.created_at, row.id) > (current.created_at, current.id):
+                if current is not None:
+                    reject(current.id, f"superseded by recommendation {row.id}")
+                    superseded.append(current.id)
+                newest[row.product_id] = row
+            else:
+                reject(row.id, f"superseded by recommendation {current.id}")
+                superseded.append(row.id)
+
+        if recommendation_ids is None:
+            report['requested'] = len(found)
+        else:
+            for recommendation_id in recommendation_ids:
+                if recommendation_id not in found:
+                    reject(recommendation_id, "unknown recommendation")
+
+        if newest:
+            now = datetime.utcnow()
+            _apply(sorted(row.id for row in newest.values()), sorted(superseded), now)
+            record_price_changes(
+                (product_id, row.recommended_price, now) for product_id, row in newest.items()
+            )
+            data_versions.bump(user_id, newest)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    report['applied'] = len(newest)
+    elapsed = time.perf_counter() - started
+    report['elapsed_seconds'] = round(elapsed, 3)
+    report['recommendations_per_second'] = round(report['requested'] / elapsed, 1) if elapsed > 0 else None
+    return report
@@ -0,0 +1,239 @@
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, insert, update, func
+
+from app import db
+from models import Product, PriceRecommendation, RepricingJob
+from price_optimizer import PriceOptimizer
+from feature_loader import load_feature_rows
+from cache import response_cache
+import data_versions
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ('queued', 'running')
+
+# Per-process state for pool workers
+_worker_app = None
+_worker_optimizer = None
+
+
+def compute_recommendations(product_ids, optimizer=None):
+    """
+    Compute recommendation dicts for a shard of products.
+
+    Optimizer inputs are aggregated in SQL by feature_loader in a single
+    statement for the whole shard and evaluated with
+    PriceOptimizer.optimize_batch. Must be called inside an application
+    context.
+    """
+    optimizer = optimizer or PriceOptimizer()
+    rows = load_feature_rows(product_ids)
+    features = [optimizer.features_from_aggregates(row, row._mapping) for row in rows]
+    return optimizer.optimize_prepared(rows, features)
+
+
+def _init_worker():
+    global _worker_app, _worker_optimizer
+    from app import app
+
+    # Never reuse connections inherited from the parent process
+    with app.app_context():
+        db.engine.dispose(close=False)
+    _worker_app = app
+    _worker_optimizer = PriceOptimizer()
+
+
+def _reprice_shard(product_ids):
+    with _worker_app.app_context():
+        try:
+            return compute_recommendations(product_ids, _worker_optimizer)
+        finally:
+            db.session.remove()
+
+
+def _shards(items, size):
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def _recommendation_rows(recommendations, created_at):
+    return [
+        {
+            'product_id': rec['product_id'],
+            'recommended_price': rec['recommended_price'],
+            'current_price': rec['current_price'],
+            'potential_revenue_increase': rec['potential_revenue_increase'],
+            'rationale': rec['rationale'],
+            'factors': rec['factors'],
+            'created_at': created_at,
+            'status': 'pending'
+        }
+        for rec in recommendations
+    ]
+
+
+def run_repricing_job(job_id, workers=None, shard_size=None, batch_size=None, start_method=None):
+    """
+    Reprice every product owned by the job's user.
+
+    Product ids are split into shards that a process pool evaluates in
+    parallel; results are bulk-inserted as PriceRecommendation rows in
+    batches while the job row tracks progress. Must be called inside an
+    application context.
+    """
+    from flask import current_app
+    config = current_app.config
+    workers = workers or config['REPRICING_WORKERS']
+    shard_size = shard_size or config['REPRICING_SHARD_SIZE']
+    batch_size = batch_size or config['REPRICING_INSERT_BATCH_SIZE']
+    start_method = start_method or config['REPRICING_START_METHOD']
+
+    job = db.session.get(RepricingJob, job_id)
+    product_ids = db.session.scalars(
+        select(Product.id).where(Product.user_id == job.user_id).order_by(Product.id)
+    ).all()
+    shards = _shards(product_ids, shard_size)
+
+    job.status = 'running'
+    job.started_at = job.heartbeat_at = datetime.utcnow()
+    job.total_products = len(product_ids)
+    job.processed_products = 0
+    job.recommendations_created = 0
+    db.session.commit()
+    logger.info(f"Repricing job {job.id}: {len(product_ids)} products in {len(shards)} shards on {workers} workers")
+
+    created_at = datetime.utcnow()
+    pending_rows = []
+
+    def flush():
+        if pending_rows:
+            db.session.execute(insert(PriceRecommendation), pending_rows)
+            job.recommendations_created += len(pending_rows)
+            pending_rows.clear()
+
+    def record(shard, recommendations):
+        pending_rows.extend(_recommendation_rows(recommendations, created_at))
+        if len(pending_rows) >= batch_size:
+            flush()
+        job.processed_products += len(shard)
+        job.heartbeat_at = datetime.utcnow()
+        db.session.commit()
+
+    try:
+        if workers <= 1 or len(shards) <= 1:
+            optimizer = PriceOptimizer()
+            for shard in shards:
+                record(shard, compute_recommendations(shard, optimizer))
+        else:
+            # Release our pooled connections before workers are started
+            db.engine.dispose()
+            with ProcessPoolExecutor(
+                max_workers=min(workers, len(shards)),
+                mp_context=multiprocessing.get_context(start_method),
+                initializer=_init_worker
+            ) as executor:
+                futures = {executor.submit(_reprice_shard, shard): shard for shard in shards}
+                for future in as_completed(futures):
+                    record(futures[future], future.result())
+        flush()
+        job.status = 'completed'
+    except Exception as e:
+        logger.exception(f"Repricing job {job_id} failed")
+        db.session.rollback()
+        job = db.session.get(RepricingJob, job_id)
+        job.status = 'failed'
+        job.error = str(e)
+
+    job.finished_at = datetime.utcnow()
+    data_versions.bump(job.user_id)
+    db.session.commit()
+    response_cache.invalidate_user(job.user_id)
+    return job
+
+
+def fail_stale_jobs(user_id):
+    """
+    Mark the user's queued or running jobs failed when they have not
+    reported progress for REPRICING_STALE_SECONDS.
+
+    Jobs run on a daemon thread of the worker that queued them, so a
+    worker restart leaves the job row active with nobody running it.
+    Returns the number of jobs failed. Must be called inside an
+    application context.
+    """
+    from flask import current_app
+    now = datetime.utcnow()
+    cutoff = now - timedelta(seconds=current_app.config['REPRICING_STALE_SECONDS'])
+    last_seen = func.coalesce(RepricingJob.heartbeat_at, RepricingJob.started_at, RepricingJob.created_at)
+    result = db.session.execute(
+        update(RepricingJob)
+        .where(RepricingJob.user_id == user_id, RepricingJob.status.in_(ACTIVE_STATUSES), last_seen < cutoff)
+        .values(status='failed', error='Job stopped reporting progress; its worker exited', finished_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    if result.rowcount:
+        logger.warning(f"Marked {result.rowcount} stale repricing job(s) of user {user_id} failed")
+    return result.rowcount
+
+
+def start_repricing_job(app, user_id):
+    """
+    Queue a repricing job for a user and run it on a background thread.
+
+    Returns (job, created); when the user already has an active job it is
+    returned instead of starting a second one. Active jobs that stopped
+    reporting progress are failed first, so they cannot block new ones.
+    """
+    fail_stale_jobs(user_id)
+    active = RepricingJob.query.filter(
+        RepricingJob.user_id == user_id,
+        RepricingJob.status.in_(ACTIVE_STATUSES)
+    ).first()
+    if active:
+        return active, False
+
+    job = RepricingJob(user_id=user_id, status='queued')
+    db.session.add(job)
+    db.session.commit()
+
+    thread = threading.Thread(
+        target=_run_in_background, args=(app, job.id),
+        name=f"repricing-job-{job.id}", daemon=True
+    )
+    thread.start()
+    return job, True
+
+
+def _run_in_background(app, job_id):
+    with app.app_context():
+        try:
+            run_repricing_job(job_id)
+        finally:
+            db.session.remove()
+
+
+def job_status(job):
+    progress = 0.0
+    if job.total_products:
+        progress = job.processed_products / job.total_products
+    elif job.status == 'completed':
+        progress = 1.0
+    return {
+        'id': job.id,
+        'status': job.status,
+        'total_products': job.total_products or 0,
+        'processed_products': job.processed_products or 0,
+        'recommendations_created': job.recommendations_created or 0,
+        'progress': round(progress, 4),
+        'error': job.error,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'heartbeat_at': job.heartbeat_at.isoformat() if job.heartbeat_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None
+    }
+
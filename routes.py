@@ -1,15 +1,236 @@
-from flask import render_template, redirect, url_for, flash, request, jsonify
+from flask import (
+    render_template, redirect, url_for, flash, request, jsonify,
+    abort, Response, stream_with_context
+)
 from flask_login import login_user, logout_user, login_required, current_user
-from datetime import datetime, timedelta
-import json
+from datetime import datetime
+import math
+import numpy as np
+from collections import defaultdict
+from itertools import islice
+
+from sqlalchemy import select, func, union_all, true
+from sqlalchemy.orm import contains_eager
 
 from app import db
 from models import (
-    User, Product, Sale, Competitor, CompetitorPrice, 
-    PriceHistory, PriceRecommendation
+    User, Product, Sale, Competitor, CompetitorPrice, CompetitorLatestPrice,
+    PriceHistory, PriceRecommendation, RepricingJob
 )
 from price_optimizer import PriceOptimizer
-from utils import get_date_range_data
+from product_stats import (
+    load_stats_features, load_stats_features_many, record_sale, record_price_change,
+    record_competitor_price
+)
+from repricing import start_repricing_job, fail_stale_jobs, job_status
+from category_optimizer import (
+    optimize_category, CategoryOptimizationError, OBJECTIVES as CATEGORY_OBJECTIVES
+)
+from sales_rollup import load_daily_sales, record_sale as record_sale_rollup
+from competitor_snapshot import competitor_matrix, record_competitor_price as record_competitor_snapshot
+from utils import stream_json_object
+from wire_format import (
+    requested_format, json_response, columnar_product_data, columnar_dashboard, columnar_daily_sales
+)
+from api_queries import (
+    product_data_window, product_data_statements, sales_with_archive, product_data_sections,
+    dashboard_days, price_changes_statement, dashboard_payload
+)
+from sales_import import import_sales, detect_format, iter_records, FORMATS as IMPORT_FORMATS
+from competitor_ingest import ingest_competitor_prices, MAX_BATCH_RECORDS
+from recommendation_apply import apply_recommendations, MAX_APPLY_IDS
+from pagination import encode_cursor, split_page, keyset_page
+from cache import response_cache
+from user_cache import user_cache
+from sales_archive import sales_archive
+import data_versions
+
+# Rows fetched per round trip when streaming API responses
+STREAM_BATCH_SIZE = 1000
+
+# Competitor price rows shown per page on the competitors view
+COMPETITOR_PRICES_PAGE_SIZE = 10
+# Competitors whose first page is read per statement (SQLite allows 500 UNION ALL terms)
+COMPETITOR_FIRST_PAGES_PER_QUERY = 200
+
+# Page sizes for the product list and product detail tables
+PRODUCTS_PAGE_SIZE = 24
+DASHBOARD_PRODUCTS = 5
+PRICE_HISTORY_PAGE_SIZE = 20
+RECOMMENDATIONS_PAGE_SIZE = 5
+
+# Products per page of the competitor price matrix API, and the largest page allowed
+COMPETITOR_MATRIX_PAGE_SIZE = 500
+MAX_COMPETITOR_MATRIX_PRODUCTS = 5000
+
+# Limits of the what-if price simulation API
+MAX_SIMULATION_POINTS = 1000
+MAX_SIMULATION_PRODUCTS = 2000
+
+def _stream_rows(statement):
+    """Rows of a statement fetched in batches; the query runs on first iteration."""
+    yield from db.session.execute(
+        statement.execution_options(yield_per=STREAM_BATCH_SIZE)
+    )
+
+def _competitor_price_page(rows):
+    page, next_cursor = split_page(
+        rows, COMPETITOR_PRICES_PAGE_SIZE,
+        lambda row: encode_cursor(row.date_recorded, row.id)
+    )
+    prices = [
+        {
+            'id': row.id,
+            'price': row.price,
+            'date_recorded': row.date_recorded,
+            'product_name': row.product_name or "Unknown Product"
+        }
+        for row in page
+    ]
+    return prices, next_cursor
+
+def _competitor_first_pages(competitor_ids):
+    """
+    The first COMPETITOR_PRICES_PAGE_SIZE + 1 prices of each competitor,
+    newest first, by competitor id. Each competitor is read with its own
+    ORDER BY date_recorded DESC, id DESC LIMIT on the (competitor_id,
+    date_recorded) index: a LATERAL join on PostgreSQL, a UNION ALL of
+    limited selects elsewhere.
+    """
+    def first_page(competitor_id):
+        return select(
+            CompetitorPrice.id,
+            CompetitorPrice.competitor_id,
+            CompetitorPrice.price,
+            CompetitorPrice.date_recorded,
+            Product.name.label('product_name')
+        ).outerjoin(
+            Product, Product.id == CompetitorPrice.product_id
+        ).where(
+            CompetitorPrice.competitor_id == competitor_id
+        ).order_by(
+            CompetitorPrice.date_recorded.desc(), CompetitorPrice.id.desc()
+        ).limit(COMPETITOR_PRICES_PAGE_SIZE + 1)
+    
+    lateral = db.session.get_bind().dialect.name == 'postgresql'
+    pages = defaultdict(list)
+    for i in range(0, len(competitor_ids), COMPETITOR_FIRST_PAGES_PER_QUERY):
+        chunk = competitor_ids[i:i + COMPETITOR_FIRST_PAGES_PER_QUERY]
+        if lateral:
+            owned = select(Competitor.id).where(Competitor.id.in_(chunk)).subquery()
+            page = first_page(owned.c.id).lateral()
+            statement = select(page).select_from(owned).join(page, true())
+        else:
+            statement = union_all(*(select(first_page(competitor_id).subquery()) for competitor_id in chunk))
+        for row in db.session.execute(statement):
+            pages[row.competitor_id].append(row)
+    for rows in pages.values():
+        rows.sort(key=lambda row: (row.date_recorded, row.id), reverse=True)
+    return pages
+
+def _page(statement, columns, cursor_arg, page_size, descending=True):
+    """keyset_page driven by a request argument, rejecting malformed cursors with a 400."""
+    try:
+        return keyset_page(statement, columns, request.args.get(cursor_arg), page_size, descending)
+    except ValueError:
+        abort(400, description=f"Invalid {cursor_arg}")
+
+def _products_page(user_id, cursor_arg='cursor', page_size=PRODUCTS_PAGE_SIZE):
+    return _page(
+        select(Product).where(Product.user_id == user_id),
+        (Product.id,), cursor_arg, page_size, descending=False
+    )
+
+def _price_history_page(product_id, cursor_arg='history_cursor'):
+    """Newest-first price changes, each with its change from the preceding price (None for the first)."""
+    statement = select(PriceHistory.id, PriceHistory.price, PriceHistory.date_changed).where(
+        PriceHistory.product_id == product_id
+    )
+    columns = (PriceHistory.date_changed, PriceHistory.id)
+    rows, next_cursor = _page(statement, columns, cursor_arg, PRICE_HISTORY_PAGE_SIZE)
+    
+    # The price preceding the oldest row on the page, if any
+    older_price = None
+    if next_cursor:
+        older, _ = keyset_page(statement, columns, next_cursor, 1)
+        older_price = older[0].price if older else None
+    
+    history = []
+    for row, previous in zip(rows, [row.price for row in rows[1:]] + [older_price]):
+        history.append({
+            'date_changed': row.date_changed,
+            'price': row.price,
+            'change': row.price - previous if previous is not None else None
+        })
+    return history, next_cursor
+
+def _recommendations_page(product_id, cursor_arg='recommendations_cursor'):
+    return _page(
+        select(PriceRecommendation).where(PriceRecommendation.product_id == product_id),
+        (PriceRecommendation.created_at, PriceRecommendation.id),
+        cursor_arg, RECOMMENDATIONS_PAGE_SIZE
+    )
+
+def _simulation_grid(current_prices):
+    """
+    Candidate prices from the request: an explicit comma separated `prices`
+    list shared by every product, or `points` steps from `low` to `high`
+    times each product's current price.
+    """
+    prices = request.args.get('prices')
+    if prices:
+        try:
+            grid = sorted(float(value) for value in prices.split(','))
+        except ValueError:
+            abort(400, description="'prices' must be a comma separated list of numbers")
+        if not all(math.isfinite(price) for price in grid):
+            abort(400, description="'prices' must be finite numbers")
+        if len(grid) > MAX_SIMULATION_POINTS or grid[0] <= 0:
+            abort(400, description=f"'prices' must hold at most {MAX_SIMULATION_POINTS} positive prices")
+        return grid
+    
+    low = request.args.get('low', 0.5, type=float)
+    high = request.args.get('high', 1.5, type=float)
+    points = request.args.get('points', 101, type=int)
+    if not (math.isfinite(low) and math.isfinite(high)):
+        abort(400, description="'low' and 'high' must be finite numbers")
+    if not 0 < low < high:
+        abort(400, description="'low' and 'high' must satisfy 0 < low < high")
+    if not 2 <= points <= MAX_SIMULATION_POINTS:
+        abort(400, description=f"'points' must be between 2 and {MAX_SIMULATION_POINTS}")
+    return PriceOptimizer.relative_price_grid(current_prices, low, high, points)
+
+def _simulation_validators(scope, key, version, updated_at):
+    """Validators for simulations, which also move with the daily sales window."""
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    variant = dict(sorted(request.args.items()), today=today.date())
+    return data_versions.validators(scope, key, version, max(updated_at or today, today), variant)
+
+def _filter_products(statement):
+    """Restrict a product statement by the `ids` (comma separated) and `category` arguments."""
+    ids = request.args.get('ids')
+    if ids:
+        try:
+            statement = statement.where(Product.id.in_({int(value) for value in ids.split(',')}))
+        except ValueError:
+            abort(400, description="'ids' must be a comma separated list of product ids")
+    category = request.args.get('category')
+    if category:
+        statement = statement.where(Product.category == category)
+    return statement
+
+def _nullable(values):
+    """Float array as a JSON-ready list with NaN mapped to null."""
+    return [None if value != value else value for value in values.tolist()]
+
+def _latest_competitor_prices(product_id):
+    """Latest observed price from each competitor for one product, read from the snapshot."""
+    return db.session.execute(
+        select(Competitor.name, CompetitorLatestPrice.price, CompetitorLatestPrice.date_recorded)
+        .join(CompetitorLatestPrice, CompetitorLatestPrice.competitor_id == Competitor.id)
+        .where(CompetitorLatestPrice.product_id == product_id)
+        .order_by(Competitor.name)
+    ).all()
 
 def register_routes(app):
     price_optimizer = PriceOptimizer()
@@ -85,47 +306,57 @@ def register_routes(app):
     @app.route('/dashboard')
     @login_required
     def dashboard():
-        # Get products with recommendations
-        products = Product.query.filter_by(user_id=current_user.id).all()
-        product_count = len(products)
+        # First few products for the overview card
+        products = db.session.scalars(
+            select(Product).where(Product.user_id == current_user.id)
+            .order_by(Product.id).limit(DASHBOARD_PRODUCTS)
+        ).all()
         
-        # Get recent recommendations
-        recommendations = PriceRecommendation.query.join(Product).filter(
+        # Get recent recommendations with their products from the same join
+        recommendations = PriceRecommendation.query.join(Product).options(
+            contains_eager(PriceRecommendation.product)
+        ).filter(
             Product.user_id == current_user.id
         ).order_by(PriceRecommendation.created_at.desc()).limit(5).all()
         
-        # Get sales data for charts
-        thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-        sales = Sale.query.join(Product).filter(
-            Product.user_id == current_user.id,
-            Sale.sale_date >= thirty_days_ago
-        ).all()
+        # Sales chart and aggregate stats are cached per data version and day, so writes from
+        # other processes (CLI imports, other workers' memory caches) are never served stale
+        today = datetime.utcnow().date()
+        version = data_versions.user_version(current_user.id)[0]
         
-        # Prepare daily sales data
-        daily_sales = get_date_range_data(sales, 'sale_date', 30)
-        
-        # Get competitor prices
-        competitor_prices = CompetitorPrice.query.join(
-            Product
-        ).filter(
-            Product.user_id == current_user.id
-        ).order_by(CompetitorPrice.date_recorded.desc()).limit(50).all()
+        def compute_stats():
+            daily_sales = load_daily_sales(current_user.id, 30)
+            product_count, avg_price = db.session.execute(
+                select(func.count(Product.id), func.avg(Product.current_price))
+                .where(Product.user_id == current_user.id)
+            ).one()
+            return {
+                'product_count': product_count,
+                'avg_price': avg_price or 0,
+                'daily_sales': daily_sales,
+                'total_revenue': sum(day['revenue'] for day in daily_sales),
+                'recommendation_count': PriceRecommendation.query.join(
+                    Product
+                ).filter(
+                    Product.user_id == current_user.id
+                ).count()
+            }
         
-        # Calculate stats
-        total_revenue = sum(sale.revenue for sale in sales)
-        avg_price = sum(product.current_price for product in products) / max(product_count, 1)
-        recommendation_count = PriceRecommendation.query.join(
-            Product
-        ).filter(
-            Product.user_id == current_user.id
-        ).count()
+        stats = response_cache.cached(
+            'dashboard', current_user.id, {'days': 30, 'version': version, 'today': today}, compute_stats
+        )
+        daily_sales = stats['daily_sales']
+        total_revenue = stats['total_revenue']
+        recommendation_count = stats['recommendation_count']
+        product_count = stats['product_count']
+        avg_price = stats['avg_price']
         
         return render_template(
             'dashboard.html',
             products=products,
             product_count=product_count,
             recommendations=recommendations,
-            daily_sales=daily_sales,
+            daily_sales=columnar_daily_sales(daily_sales),
             total_revenue=total_revenue,
             avg_price=avg_price,
             recommendation_count=recommendation_count
@@ -134,8 +365,13 @@ def register_routes(app):
     @app.route('/products')
     @login_required
     def products():
-        products = Product.query.filter_by(user_id=current_user.id).all()
-        return render_template('products.html', products=products)
+        products, next_cursor = _products_page(current_user.id)
+        return render_template(
+            'products.html',
+            products=products,
+            next_cursor=next_cursor,
+            paged=bool(request.args.get('cursor'))
+        )
     
     @app.route('/products/add', methods=['GET', 'POST'])
     @login_required
@@ -188,7 +424,10 @@ def register_routes(app):
                 price=current_price
             )
             db.session.add(price_history)
+            record_price_change(price_history)
+            data_versions.bump(current_user.id, [product.id])
             db.session.commit()
+            response_cache.invalidate_user(current_user.id)
             
             flash('Product added successfully', 'success')
             return redirect(url_for('products'))
@@ -203,22 +442,24 @@ def register_routes(app):
         # Get sales data
         sales = Sale.query.filter_by(product_id=product.id).order_by(Sale.sale_date.desc()).limit(30).all()
         
-        # Get price history
-        price_history = PriceHistory.query.filter_by(product_id=product.id).order_by(PriceHistory.date_changed).all()
+        # Get a page of price history, newest first
+        price_history, history_cursor = _price_history_page(product.id)
         
-        # Get competitor prices
-        competitor_prices = CompetitorPrice.query.filter_by(product_id=product.id).order_by(CompetitorPrice.date_recorded.desc()).all()
+        # Get the latest price from each competitor
+        competitors = _latest_competitor_prices(product.id)
         
-        # Get price recommendations
-        recommendations = PriceRecommendation.query.filter_by(product_id=product.id).order_by(PriceRecommendation.created_at.desc()).limit(5).all()
+        # Get a page of price recommendations
+        recommendations, recommendations_cursor = _recommendations_page(product.id)
         
         return render_template(
             'product_detail.html',
             product=product,
             sales=sales,
             price_history=price_history,
-            competitor_prices=competitor_prices,
-            recommendations=recommendations
+            history_cursor=history_cursor,
+            competitors=competitors,
+            recommendations=recommendations,
+            recommendations_cursor=recommendations_cursor
         )
     
     @app.route('/products/<int:product_id>/recommend', methods=['POST'])
@@ -226,15 +467,11 @@ def register_routes(app):
     def generate_recommendation(product_id):
         product = Product.query.filter_by(id=product_id, user_id=current_user.id).first_or_404()
         
-        # Get required data
-        sales = Sale.query.filter_by(product_id=product.id).all()
-        competitor_prices = CompetitorPrice.query.filter_by(product_id=product.id).all()
-        price_history = PriceHistory.query.filter_by(product_id=product.id).all()
+        # Read the optimizer inputs from the running product statistics
+        features = load_stats_features(product, price_optimizer)
         
         # Generate recommendation
-        recommendation_data = price_optimizer.optimize_price(
-            product, sales, competitor_prices, price_history
-        )
+        recommendation_data = price_optimizer.optimize_features(product, features)
         
         # Save recommendation
         recommendation = PriceRecommendation(
@@ -247,7 +484,9 @@ def register_routes(app):
         )
         
         db.session.add(recommendation)
+        data_versions.bump(current_user.id)
         db.session.commit()
+        response_cache.invalidate_user(current_user.id)
         
         flash('New price recommendation generated', 'success')
         return redirect(url_for('product_detail', product_id=product.id))
@@ -277,7 +516,10 @@ def register_routes(app):
                 recommendation.status = 'accepted'
         
         db.session.add(price_history)
+        record_price_change(price_history)
+        data_versions.bump(current_user.id, [product.id])
         db.session.commit()
+        response_cache.invalidate_user(current_user.id)
         
         flash(f'Price updated from ${old_price:.2f} to ${new_price:.2f}', 'success')
         return redirect(url_for('product_detail', product_id=product.id))
@@ -309,7 +551,11 @@ def register_routes(app):
             product.stock_level = max(0, product.stock_level - quantity)
         
         db.session.add(sale)
+        record_sale(sale)
+        record_sale_rollup(sale, current_user.id)
+        data_versions.bump(current_user.id, [product.id])
         db.session.commit()
+        response_cache.invalidate_user(current_user.id)
         
         flash(f'Sale of {quantity} units added successfully', 'success')
         return redirect(url_for('product_detail', product_id=product.id))
@@ -317,54 +563,77 @@ def register_routes(app):
     @app.route('/competitors')
     @login_required
     def competitors():
-        try:
-            # Get competitors with no related data to avoid potential errors
-            competitors = Competitor.query.filter_by(user_id=current_user.id).all()
-            
-            # Create a safe version of competitors with reduced data
-            safe_competitors = []
-            for comp in competitors:
-                try:
-                    # Safely get prices, handling any potential errors
-                    prices = []
-                    try:
-                        raw_prices = comp.prices.all()
-                        for price in raw_prices:
-                            try:
-                                product_name = price.product.name if price.product else "Unknown Product"
-                                prices.append({
-                                    'id': price.id,
-                                    'price': price.price,
-                                    'date_recorded': price.date_recorded,
-                                    'product_name': product_name
-                                })
-                            except Exception as price_error:
-                                app.logger.error(f"Error processing price {price.id}: {str(price_error)}")
-                    except Exception as prices_error:
-                        app.logger.error(f"Error retrieving prices for competitor {comp.id}: {str(prices_error)}")
-                    
-                    # Create a clean competitor object
-                    safe_comp = {
-                        'id': comp.id,
-                        'name': comp.name,
-                        'website': comp.website,
-                        'notes': comp.notes,
-                        'prices': prices
-                    }
-                    safe_competitors.append(safe_comp)
-                except Exception as comp_error:
-                    app.logger.error(f"Error processing competitor {comp.id}: {str(comp_error)}")
-            
-            # Log competitors data for debugging
-            app.logger.debug(f"Retrieved and safely processed {len(safe_competitors)} competitors for user {current_user.id}")
-            
-            # Pass the safe data to the template
-            return render_template('competitors.html', competitors=competitors, safe_competitors=safe_competitors)
-        except Exception as e:
-            app.logger.error(f"Error in competitors route: {str(e)}")
-            # Return a simplified error template to avoid cascading errors
-            return render_template('base.html', 
-                                  error_message="There was an error loading the competitors page. Please try again.")
+        competitors = db.session.execute(
+            select(Competitor.id, Competitor.name, Competitor.website, Competitor.notes)
+            .where(Competitor.user_id == current_user.id)
+            .order_by(Competitor.id)
+        ).all()
+        
+        prices_by_competitor = _competitor_first_pages([comp.id for comp in competitors])
+        
+        # Products each competitor currently has a price for, from the latest-price snapshot
+        tracked = dict(db.session.execute(
+            select(CompetitorLatestPrice.competitor_id, func.count())
+            .where(CompetitorLatestPrice.user_id == current_user.id)
+            .group_by(CompetitorLatestPrice.competitor_id)
+        ).all())
+        
+        safe_competitors = []
+        for comp in competitors:
+            prices, next_cursor = _competitor_price_page(prices_by_competitor[comp.id])
+            safe_competitors.append({
+                'id': comp.id,
+                'name': comp.name,
+                'website': comp.website,
+                'notes': comp.notes,
+                'tracked_products': tracked.get(comp.id, 0),
+                'prices': prices,
+                'next_cursor': next_cursor
+            })
+        
+        # Product choices for the add-price forms
+        products = db.session.execute(
+            select(Product.id, Product.name)
+            .where(Product.user_id == current_user.id)
+            .order_by(Product.name)
+        ).all()
+        
+        return render_template(
+            'competitors.html',
+            safe_competitors=safe_competitors,
+            products=products
+        )
+    
+    @app.route('/competitors/<int:competitor_id>/prices')
+    @login_required
+    def competitor_prices_page(competitor_id):
+        competitor = Competitor.query.filter_by(id=competitor_id, user_id=current_user.id).first_or_404()
+        
+        statement = select(
+            CompetitorPrice.id,
+            CompetitorPrice.price,
+            CompetitorPrice.date_recorded,
+            Product.name.label('product_name')
+        ).outerjoin(
+            Product, Product.id == CompetitorPrice.product_id
+        ).where(CompetitorPrice.competitor_id == competitor.id)
+        rows, next_cursor = _page(
+            statement, (CompetitorPrice.date_recorded, CompetitorPrice.id),
+            'cursor', COMPETITOR_PRICES_PAGE_SIZE
+        )
+        
+        return jsonify({
+            'prices': [
+                {
+                    'id': row.id,
+                    'price': row.price,
+                    'date_recorded': row.date_recorded.strftime('%Y-%m-%d'),
+                    'product_name': row.product_name or "Unknown Product"
+                }
+                for row in rows
+            ],
+            'next_cursor': next_cursor
+        })
     
     @app.route('/competitors/add', methods=['GET', 'POST'])
     @login_required
@@ -383,7 +652,10 @@ def register_routes(app):
             )
             
             db.session.add(competitor)
+            # The competitor matrix gains a column
+            data_versions.bump(current_user.id)
             db.session.commit()
+            response_cache.invalidate_user(current_user.id)
             
             flash('Competitor added successfully', 'success')
             return redirect(url_for('competitors'))
@@ -406,7 +678,12 @@ def register_routes(app):
         )
         
         db.session.add(competitor_price)
+        db.session.flush()
+        record_competitor_snapshot(competitor_price, current_user.id)
+        record_competitor_price(competitor_price)
+        data_versions.bump(current_user.id, [competitor_price.product_id])
         db.session.commit()
+        response_cache.invalidate_user(current_user.id)
         
         flash('Competitor price added successfully', 'success')
         return redirect(url_for('competitors'))
@@ -416,88 +693,298 @@ def register_routes(app):
     def api_product_data(product_id):
         product = Product.query.filter_by(id=product_id, user_id=current_user.id).first_or_404()
         
-        # Get price history
-        price_history = PriceHistory.query.filter_by(product_id=product.id).order_by(PriceHistory.date_changed).all()
-        price_history_data = [
-            {
-                'date': ph.date_changed.strftime('%Y-%m-%d'),
-                'price': ph.price
-            }
-            for ph in price_history
-        ]
+        # Optional window: only rows on/after `since`, and at most the latest `limit` rows per series;
+        # format=columnar sends parallel arrays instead of one object per row
+        try:
+            since, limit = product_data_window(request.args)
+            shape = requested_format(request.args)
+        except ValueError as e:
+            abort(400, description=str(e))
         
-        # Get sales data
-        sales = Sale.query.filter_by(product_id=product.id).order_by(Sale.sale_date).all()
-        sales_data = [
-            {
-                'date': sale.sale_date.strftime('%Y-%m-%d'),
-                'quantity': sale.quantity,
-                'price': sale.price,
-                'revenue': sale.revenue
-            }
-            for sale in sales
-        ]
-        
-        # Get competitor prices
-        competitor_prices = CompetitorPrice.query.filter_by(product_id=product.id).order_by(CompetitorPrice.date_recorded).all()
-        competitor_price_data = [
-            {
-                'date': cp.date_recorded.strftime('%Y-%m-%d'),
-                'competitor_id': cp.competitor_id,
-                'competitor_name': Competitor.query.get(cp.competitor_id).name,
-                'price': cp.price
-            }
-            for cp in competitor_prices
-        ]
+        # Answer revalidations from the product's data version before querying
+        etag, last_modified = data_versions.validators(
+            'product', product.id, product.data_version, product.data_updated_at,
+            {'since': since, 'limit': limit, 'format': shape}
+        )
+        unchanged = data_versions.not_modified(etag, last_modified)
+        if unchanged is not None:
+            return unchanged
         
-        return jsonify({
-            'price_history': price_history_data,
-            'sales': sales_data,
-            'competitor_prices': competitor_price_data
-        })
+        price_history, sales, competitor_prices = product_data_statements(product.id, since, limit)
+        
+        # Sales moved to the archive are merged into the sales series
+        archived_sales = sales_archive.scan(
+            current_user.id, [product.id], start=since or None, columns=('sale_date', 'quantity', 'price')
+        )
+        
+        if shape == 'columnar':
+            # Core rows straight off the connection: no ORM result processing per row
+            connection = db.session.connection()
+            response = json_response(columnar_product_data(
+                connection.execute(price_history),
+                sales_with_archive(connection.execute(sales), archived_sales, limit),
+                connection.execute(competitor_prices)
+            ))
+            return data_versions.with_validators(response, etag, last_modified)
+        
+        def generate():
+            yield from stream_json_object(product_data_sections(
+                _stream_rows(price_history),
+                sales_with_archive(_stream_rows(sales), archived_sales, limit),
+                _stream_rows(competitor_prices)
+            ))
+        
+        response = Response(stream_with_context(generate()), mimetype='application/json')
+        return data_versions.with_validators(response, etag, last_modified)
         
     @app.route('/api/dashboard_data')
     @login_required
     def api_dashboard_data():
         # Get date range
-        days = int(request.args.get('days', 30))
-        start_date = datetime.utcnow() - timedelta(days=days)
+        days = dashboard_days(request.args)
+        try:
+            shape = requested_format(request.args)
+        except ValueError as e:
+            abort(400, description=str(e))
         
-        # Get sales data
-        sales = Sale.query.join(Product).filter(
-            Product.user_id == current_user.id,
-            Sale.sale_date >= start_date
-        ).all()
+        # The window slides daily, so the current day is part of the validators
+        today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        version, updated_at = data_versions.user_version(current_user.id)
+        etag, last_modified = data_versions.validators(
+            'dashboard', current_user.id, version, max(updated_at or today, today),
+            {'days': days, 'today': today.date(), 'format': shape}
+        )
+        unchanged = data_versions.not_modified(etag, last_modified)
+        if unchanged is not None:
+            return unchanged
         
-        # Prepare daily sales data
-        daily_sales = get_date_range_data(sales, 'sale_date', days)
+        def compute():
+            # Daily sales from the rollup, price changes per day counted in SQL
+            return dashboard_payload(
+                load_daily_sales(current_user.id, days),
+                db.session.execute(price_changes_statement(current_user.id, days)).all()
+            )
         
-        # Get price changes
-        price_changes = PriceHistory.query.join(Product).filter(
-            Product.user_id == current_user.id,
-            PriceHistory.date_changed >= start_date
-        ).all()
+        # Both shapes share one cache entry, keyed like the ETag by data version and day
+        payload = response_cache.cached(
+            'dashboard_data', current_user.id, {'days': days, 'version': version, 'today': today.date()}, compute
+        )
+        if shape == 'columnar':
+            payload = columnar_dashboard(payload)
+        response = json_response(payload)
+        return data_versions.with_validators(response, etag, last_modified)
+    
+    @app.route('/api/products/<int:product_id>/simulate')
+    @login_required
+    def api_simulate_product(product_id):
+        product = Product.query.filter_by(id=product_id, user_id=current_user.id).first_or_404()
         
-        # Group price changes by date
-        price_changes_by_date = {}
-        for pc in price_changes:
-            date_str = pc.date_changed.strftime('%Y-%m-%d')
-            if date_str not in price_changes_by_date:
-                price_changes_by_date[date_str] = 0
-            price_changes_by_date[date_str] += 1
-        
-        price_change_data = [
-            {
-                'date': date,
-                'count': count
-            }
-            for date, count in price_changes_by_date.items()
-        ]
+        etag, last_modified = _simulation_validators(
+            'simulate', product.id, product.data_version, product.data_updated_at
+        )
+        unchanged = data_versions.not_modified(etag, last_modified)
+        if unchanged is not None:
+            return unchanged
         
-        return jsonify({
-            'daily_sales': daily_sales,
-            'price_changes': price_change_data
+        grid = _simulation_grid([product.current_price])
+        features = load_stats_features(product, price_optimizer)
+        response = jsonify(price_optimizer.simulate(product, grid, features))
+        return data_versions.with_validators(response, etag, last_modified)
+    
+    @app.route('/api/products/simulate')
+    @login_required
+    def api_simulate_products():
+        statement = _filter_products(select(Product).where(Product.user_id == current_user.id))
+        
+        version, updated_at = data_versions.user_version(current_user.id)
+        etag, last_modified = _simulation_validators('simulate-products', current_user.id, version, updated_at)
+        unchanged = data_versions.not_modified(etag, last_modified)
+        if unchanged is not None:
+            return unchanged
+        
+        products = db.session.scalars(statement.order_by(Product.id).limit(MAX_SIMULATION_PRODUCTS + 1)).all()
+        if len(products) > MAX_SIMULATION_PRODUCTS:
+            return jsonify({'error': f"Simulations are limited to {MAX_SIMULATION_PRODUCTS} products per request"}), 413
+        
+        grid = _simulation_grid([product.current_price for product in products])
+        features = load_stats_features_many(products, price_optimizer)
+        simulations = price_optimizer.simulate_products(
+            products, [features[product.id] for product in products], grid
+        ) if products else []
+        response = jsonify({'products': simulations})
+        return data_versions.with_validators(response, etag, last_modified)
+    
+    @app.route('/api/categories/optimize')
+    @login_required
+    def api_optimize_category():
+        category = request.args.get('category')
+        objective = request.args.get('objective', 'revenue')
+        if not category:
+            abort(400, description="'category' is required")
+        if objective not in CATEGORY_OBJECTIVES:
+            abort(400, description=f"'objective' must be one of {', '.join(CATEGORY_OBJECTIVES)}")
+        
+        # Results move with the sales window, so the current day is part of the validators
+        today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        version, updated_at = data_versions.user_version(current_user.id)
+        params = {'category': category, 'objective': objective}
+        etag, last_modified = data_versions.validators(
+            'category', current_user.id, version, max(updated_at or today, today),
+            dict(params, today=today.date())
+        )
+        unchanged = data_versions.not_modified(etag, last_modified)
+        if unchanged is not None:
+            return unchanged
+        
+        def compute():
+            return optimize_category(current_user.id, category, objective, price_optimizer)
+        
+        try:
+            result = response_cache.cached(
+                'category_optimize', current_user.id, dict(params, version=version, today=today.date()), compute
+            )
+        except CategoryOptimizationError as e:
+            abort(404, description=str(e))
+        return data_versions.with_validators(jsonify(result), etag, last_modified)
+    
+    @app.route('/api/recommendations/run', methods=['POST'])
+    @login_required
+    def api_run_recommendations():
+        job, created = start_repricing_job(app, current_user.id)
+        response = job_status(job)
+        response['status_url'] = url_for('api_recommendation_job', job_id=job.id)
+        return jsonify(response), 202 if created else 409
+    
+    @app.route('/api/recommendations/apply', methods=['POST'])
+    @login_required
+    def api_apply_recommendations():
+        # {"ids": [...]} or {"all_pending": true, "min_revenue_increase": 10.0}
+        payload = request.get_json(silent=True)
+        if not isinstance(payload, dict):
+            return jsonify({'error': "Send {\"ids\": [...]} or {\"all_pending\": true}"}), 400
+        
+        ids = payload.get('ids')
+        threshold = payload.get('min_revenue_increase')
+        if payload.get('all_pending'):
+            if ids is not None:
+                return jsonify({'error': "Send either 'ids' or 'all_pending', not both"}), 400
+            if threshold is not None and (isinstance(threshold, bool) or not isinstance(threshold, (int, float))):
+                return jsonify({'error': "'min_revenue_increase' must be a number"}), 400
+        elif not isinstance(ids, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+            return jsonify({'error': "'ids' must be a list of recommendation ids"}), 400
+        elif len(ids) > MAX_APPLY_IDS:
+            return jsonify({'error': f"Requests are limited to {MAX_APPLY_IDS} recommendations"}), 413
+        elif threshold is not None:
+            return jsonify({'error': "'min_revenue_increase' only applies with 'all_pending'"}), 400
+        
+        report = apply_recommendations(current_user.id, ids, threshold)
+        response_cache.invalidate_user(current_user.id)
+        app.logger.info(f"Applied {report['applied']} recommendations for user {current_user.id} ({report['rejected']} rejected)")
+        return jsonify(report)
+    
+    @app.route('/api/recommendations/jobs/<int:job_id>')
+    @login_required
+    def api_recommendation_job(job_id):
+        fail_stale_jobs(current_user.id)
+        job = RepricingJob.query.filter_by(id=job_id, user_id=current_user.id).first_or_404()
+        return jsonify(job_status(job))
+    
+    @app.route('/api/sales/import', methods=['POST'])
+    @login_required
+    def api_import_sales():
+        upload = request.files.get('file')
+        if upload is not None:
+            stream = upload.stream
+            fmt = request.args.get('format') or detect_format(upload.filename, upload.mimetype)
+        else:
+            stream = request.stream
+            fmt = request.args.get('format') or detect_format(content_type=request.mimetype)
+        
+        if fmt not in IMPORT_FORMATS:
+            return jsonify({'error': "Specify format=csv or format=jsonl, or upload a .csv/.jsonl file"}), 400
+        
+        report = import_sales(stream, fmt, current_user.id)
+        response_cache.invalidate_user(current_user.id)
+        app.logger.info(f"Imported {report.rows_imported} sales for user {current_user.id} ({report.rows_rejected} rejected)")
+        # Chunks committed before an undecodable line stay imported; the report says how many
+        return jsonify(report.as_dict()), 400 if report.error else 200
+    
+    @app.route('/api/competitor_prices/batch', methods=['POST'])
+    @login_required
+    def api_competitor_prices_batch():
+        if detect_format(content_type=request.mimetype) == 'jsonl':
+            records = iter_records(request.stream, 'jsonl')
+        else:
+            payload = request.get_json(silent=True)
+            if isinstance(payload, dict):
+                payload = payload.get('records')
+            if not isinstance(payload, list):
+                return jsonify({'error': "Send a JSON array of records, {\"records\": [...]}, or JSON Lines"}), 400
+            records = enumerate(payload, start=1)
+        
+        records = list(islice(records, MAX_BATCH_RECORDS + 1))
+        if len(records) > MAX_BATCH_RECORDS:
+            return jsonify({'error': f"Batches are limited to {MAX_BATCH_RECORDS} records"}), 413
+        
+        report = ingest_competitor_prices(records, current_user.id)
+        response_cache.invalidate_user(current_user.id)
+        app.logger.info(f"Ingested {report['inserted']} competitor prices for user {current_user.id} ({report['unchanged']} unchanged, {report['rejected']} rejected)")
+        return jsonify(report)
+    
+    @app.route('/api/competitor_matrix')
+    @login_required
+    def api_competitor_matrix():
+        # Products by `ids` and/or `category`, a keyset page at a time; every competitor of the user
+        statement = _filter_products(
+            select(Product.id, Product.name, Product.current_price).where(Product.user_id == current_user.id)
+        )
+        limit = request.args.get('limit', COMPETITOR_MATRIX_PAGE_SIZE, type=int)
+        if not 1 <= limit <= MAX_COMPETITOR_MATRIX_PRODUCTS:
+            abort(400, description=f"'limit' must be between 1 and {MAX_COMPETITOR_MATRIX_PRODUCTS}")
+        
+        version, updated_at = data_versions.user_version(current_user.id)
+        etag, last_modified = data_versions.validators(
+            'competitor-matrix', current_user.id, version, updated_at, dict(sorted(request.args.items()))
+        )
+        unchanged = data_versions.not_modified(etag, last_modified)
+        if unchanged is not None:
+            return unchanged
+        
+        products, next_cursor = _page(statement, (Product.id,), 'cursor', limit, descending=False)
+        matrix = competitor_matrix(current_user.id, [product.id for product in products])
+        current_prices = [product.current_price for product in products]
+        recorded = np.datetime_as_string(matrix['recorded'], unit='s')
+        
+        with np.errstate(invalid='ignore', divide='ignore'):
+            price_index = np.asarray(current_prices, dtype=float) / matrix['mean']
+        response = jsonify({
+            'products': {
+                'id': matrix['product_ids'].tolist(),
+                'name': [product.name for product in products],
+                'current_price': current_prices,
+                'competitor_count': matrix['count'].tolist(),
+                'min': _nullable(matrix['min']),
+                'mean': _nullable(matrix['mean']),
+                'max': _nullable(matrix['max']),
+                'price_index': _nullable(price_index)
+            },
+            'competitors': {
+                'id': matrix['competitor_ids'].tolist(),
+                'name': matrix['competitor_names'].tolist()
+            },
+            # One row per product, one column per competitor; null where there is no price
+            'prices': [_nullable(row) for row in matrix['prices']],
+            'recorded': [[None if value == 'NaT' else value for value in row] for row in recorded.tolist()],
+            'next_cursor': next_cursor
         })
+        return data_versions.with_validators(response, etag, last_modified)
+    
+    @app.route('/api/cache/stats')
+    @login_required
+    def api_cache_stats():
+        stats = response_cache.stats()
+        stats['load_user'] = user_cache.stats()
+        return jsonify(stats)
     
     @app.route('/settings')
     @login_required
@@ -507,13 +994,15 @@ def register_routes(app):
     @app.route('/settings/update', methods=['POST'])
     @login_required
     def update_settings():
-        user = current_user
+        # current_user is a cached snapshot; changes go through the User row
+        user = db.session.get(User, current_user.id)
         
         # Update user information
         user.company_name = request.form.get('company_name')
         user.business_type = request.form.get('business_type')
         
         db.session.commit()
+        user_cache.invalidate(user.id)
         
         flash('Settings updated successfully', 'success')
         return redirect(url_for('settings'))
@@ -521,7 +1010,7 @@ def register_routes(app):
     @app.route('/settings/change_password', methods=['POST'])
     @login_required
     def change_password():
-        user = current_user
+        user = db.session.get(User, current_user.id)
         
         current_password = request.form.get('current_password')
         new_password = request.form.get('new_password')
@@ -540,6 +1029,7 @@ def register_routes(app):
         # Update password
         user.set_password(new_password)
         db.session.commit()
+        user_cache.invalidate(user.id)
         
         flash('Password changed successfully', 'success')
         return redirect(url_for('settings'))
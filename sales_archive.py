@@ -0,0 +1,386 @@
+"""
+Columnar archive tier for old sales.
+
+Sales older than SALES_ARCHIVE_DAYS are moved out of the sale table into
+per-user, per-month partitions under SALES_ARCHIVE_DIR:
+
+    user=<id>/manifest.json
+    user=<id>/<YYYY-MM>.<token>/{id,product_id,quantity,price,sale_date}.npy
+
+Each column is a plain NumPy array file sorted by (product_id, sale_date)
+and memory-mapped when read, so a scan only touches the partitions, columns
+and product ranges it needs. Partitions are never modified in place:
+archiving writes new directories and then swaps the manifest, so readers
+always see a complete snapshot.
+
+Readers that need long history combine the archive with the sale table
+(load_sales_history). ProductStats and the daily sales rollup keep counting
+archived sales, and their rebuild commands read the archive as well.
+"""
+import fcntl
+import json
+import logging
+import os
+import secrets
+import shutil
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import numpy as np
+from flask import current_app
+from sqlalchemy import select, delete
+
+from app import db
+from models import Product, Sale
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = (
+    ('id', 'int64'),
+    ('product_id', 'int64'),
+    ('quantity', 'int64'),
+    ('price', 'float64'),
+    ('sale_date', 'datetime64[us]')
+)
+
+# Sales the 30-day optimizer windows still read are never archived
+MIN_ARCHIVE_DAYS = 60
+
+# Rows fetched per round trip while archiving, and ids per DELETE ... IN (...)
+FETCH_BATCH_SIZE = 5000
+DELETE_CHUNK_SIZE = 1000
+
+_DTYPES = dict(COLUMNS)
+_MANIFEST = 'manifest.json'
+_LOCK = 'archive.lock'
+
+
+def _empty(columns):
+    return {name: np.empty(0, dtype=_DTYPES[name]) for name in columns}
+
+
+def _to_columns(rows):
+    """(id, product_id, quantity, price, sale_date) tuples as {column: array}."""
+    if not rows:
+        return _empty(_DTYPES)
+    values = list(zip(*rows))
+    return {name: np.array(values[i], dtype=dtype) for i, (name, dtype) in enumerate(COLUMNS)}
+
+
+def _product_ranges(product_column, product_ids):
+    """Row indices of the given products in a column sorted by product id."""
+    wanted = np.unique(np.asarray(product_ids, dtype=np.int64))
+    starts = np.searchsorted(product_column, wanted, side='left')
+    lengths = np.searchsorted(product_column, wanted, side='right') - starts
+    offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    return np.arange(lengths.sum()) + np.repeat(starts - offsets, lengths)
+
+
+class SalesArchive:
+    """Reads and writes the per-user monthly column partitions."""
+
+    def __init__(self, root=None):
+        self.root = root
+
+    def init_app(self, app):
+        app.config.setdefault('SALES_ARCHIVE_DIR', os.path.join(app.instance_path, 'sales_archive'))
+        app.config.setdefault('SALES_ARCHIVE_DAYS', 365)
+        self.root = app.config['SALES_ARCHIVE_DIR']
+        app.extensions['sales_archive'] = self
+
+    def _user_dir(self, user_id):
+        return os.path.join(self.root, f'user={user_id}')
+
+    def users(self):
+        """Ids of users with archived sales."""
+        if not self.root or not os.path.isdir(self.root):
+            return []
+        return sorted(
+            int(name[len('user='):]) for name in os.listdir(self.root)
+            if name.startswith('user=') and os.path.exists(os.path.join(self.root, name, _MANIFEST))
+        )
+
+    def manifest(self, user_id):
+        try:
+            with open(os.path.join(self._user_dir(user_id), _MANIFEST)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {'cutoff': None, 'partitions': {}}
+
+    @contextmanager
+    def lock(self, user_id):
+        """Serialise archivers of one user across processes."""
+        directory = self._user_dir(user_id)
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, _LOCK), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+
+    def load_partition(self, user_id, entry, columns):
+        path = os.path.join(self._user_dir(user_id), entry['path'])
+        return {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r') for name in columns}
+
+    def write_partition(self, user_id, month, columns):
+        """Write a new partition directory and return its manifest entry."""
+        name = f'{month}.{secrets.token_hex(4)}'
+        path = os.path.join(self._user_dir(user_id), name)
+        os.makedirs(path)
+        for column, dtype in COLUMNS:
+            np.save(os.path.join(path, f'{column}.npy'), np.ascontiguousarray(columns[column], dtype=dtype))
+        dates = columns['sale_date']
+        return {
+            'path': name,
+            'rows': int(len(dates)),
+            'first': dates.min().item().isoformat(),
+            'last': dates.max().item().isoformat()
+        }
+
+    def write_manifest(self, user_id, manifest):
+        path = os.path.join(self._user_dir(user_id), _MANIFEST)
+        temporary = f'{path}.tmp'
+        with open(temporary, 'w') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, path)
+
+    def remove_partitions(self, user_id, paths):
+        for path in paths:
+            shutil.rmtree(os.path.join(self._user_dir(user_id), path), ignore_errors=True)
+
+    def scan(self, user_id, product_ids=None, start=None, end=None, columns=None):
+        """
+        Archived sales of a user as {column: array}, restricted to the given
+        products and to start <= sale_date < end. Partitions outside the date
+        range are skipped and only the requested columns are read.
+        """
+        columns = list(columns or _DTYPES)
+        needed = set(columns)
+        if start is not None or end is not None:
+            needed.add('sale_date')
+        if product_ids is not None:
+            needed.add('product_id')
+            product_ids = list(product_ids)
+
+        parts = {name: [] for name in columns}
+        for month, entry in sorted(self.manifest(user_id)['partitions'].items()):
+            if start is not None and datetime.fromisoformat(entry['last']) < start:
+                continue
+            if end is not None and datetime.fromisoformat(entry['first']) >= end:
+                continue
+            data = self.load_partition(user_id, entry, needed)
+
+            rows = None
+            if product_ids is not None:
+                rows = _product_ranges(data['product_id'], product_ids)
+                if not len(rows):
+                    continue
+            if start is not None or end is not None:
+                dates = data['sale_date'] if rows is None else data['sale_date'][rows]
+                keep = np.ones(len(dates), dtype=bool)
+                if start is not None:
+                    keep &= dates >= np.datetime64(start, 'us')
+                if end is not None:
+                    keep &= dates < np.datetime64(end, 'us')
+                rows = np.flatnonzero(keep) if rows is None else rows[keep]
+            for name in columns:
+                parts[name].append(np.array(data[name] if rows is None else data[name][rows]))
+
+        return {
+            name: np.concatenate(chunks) if chunks else np.empty(0, dtype=_DTYPES[name])
+            for name, chunks in parts.items()
+        }
+
+
+sales_archive = SalesArchive()
+
+
+def _month_key(value):
+    return value.strftime('%Y-%m')
+
+
+def _merge_month(user_id, manifest, month, rows, replaced):
+    """Merge fetched rows into a month's partition; returns the ids added."""
+    new = _to_columns(rows)
+    entry = manifest['partitions'].get(month)
+    columns = new
+    if entry is not None:
+        existing = sales_archive.load_partition(user_id, entry, _DTYPES)
+        columns = {name: np.concatenate([np.asarray(existing[name]), new[name]]) for name in _DTYPES}
+        # A re-run after an interrupted archive may fetch rows already archived
+        _, first = np.unique(columns['id'], return_index=True)
+        columns = {name: values[first] for name, values in columns.items()}
+        replaced.append(entry['path'])
+
+    order = np.lexsort((columns['sale_date'], columns['product_id']))
+    manifest['partitions'][month] = sales_archive.write_partition(
+        user_id, month, {name: values[order] for name, values in columns.items()}
+    )
+    return new['id'].tolist()
+
+
+def _archive_user(user_id, cutoff):
+    with sales_archive.lock(user_id):
+        manifest = sales_archive.manifest(user_id)
+        statement = select(
+            Sale.id, Sale.product_id, Sale.quantity, Sale.price, Sale.sale_date
+        ).join(Product, Product.id == Sale.product_id).where(
+            Product.user_id == user_id, Sale.sale_date < cutoff
+        ).order_by(Sale.sale_date).execution_options(yield_per=FETCH_BATCH_SIZE)
+
+        archived_ids, replaced = [], []
+        month, rows = None, []
+        for row in db.session.execute(statement):
+            row_month = _month_key(row.sale_date)
+            if row_month != month and rows:
+                archived_ids.extend(_merge_month(user_id, manifest, month, rows, replaced))
+                rows = []
+            month = row_month
+            rows.append(tuple(row))
+        if rows:
+            archived_ids.extend(_merge_month(user_id, manifest, month, rows, replaced))
+        if not archived_ids:
+            return 0
+
+        previous = manifest.get('cutoff')
+        manifest['cutoff'] = max(cutoff.isoformat(), previous) if previous else cutoff.isoformat()
+        sales_archive.write_manifest(user_id, manifest)
+
+        # The manifest already covers these rows; a failure before the commit
+        # leaves them in both places until the next run merges them again
+        for i in range(0, len(archived_ids), DELETE_CHUNK_SIZE):
+            db.session.execute(delete(Sale).where(Sale.id.in_(archived_ids[i:i + DELETE_CHUNK_SIZE])))
+        db.session.commit()
+        sales_archive.remove_partitions(user_id, replaced)
+        return len(archived_ids)
+
+
+def archive_sales(user_id=None, older_than_days=None, now=None):
+    """
+    Move sales older than older_than_days (SALES_ARCHIVE_DAYS by default)
+    from the sale table into the archive, one user at a time. Must be called
+    inside an application context. Returns {user_id: rows archived}.
+    """
+    days = older_than_days if older_than_days is not None else current_app.config['SALES_ARCHIVE_DAYS']
+    if days < MIN_ARCHIVE_DAYS:
+        raise ValueError(f"Sales younger than {MIN_ARCHIVE_DAYS} days cannot be archived")
+    today = (now or datetime.utcnow()).date()
+    cutoff = datetime.combine(today - timedelta(days=days), datetime.min.time())
+
+    owners = select(Product.user_id).join(Sale, Sale.product_id == Product.id).where(
+        Sale.sale_date < cutoff
+    ).distinct()
+    if user_id is not None:
+        owners = owners.where(Product.user_id == user_id)
+
+    archived = {}
+    for owner in db.session.scalars(owners).all():
+        archived[owner] = _archive_user(owner, cutoff)
+        logger.info(f"Archived {archived[owner]} sales of user {owner} older than {cutoff.date()}")
+    return archived
+
+
+def load_sales_history(user_id, product_ids=None, start=None, end=None):
+    """
+    Sales of a user from the archive and the sale table together, as
+    {column: array} ordered by sale_date, for analyses that need more
+    history than the table keeps.
+    """
+    archived = sales_archive.scan(user_id, product_ids, start, end)
+
+    statement = select(
+        Sale.id, Sale.product_id, Sale.quantity, Sale.price, Sale.sale_date
+    ).join(Product, Product.id == Sale.product_id).where(Product.user_id == user_id)
+    if product_ids is not None:
+        statement = statement.where(Sale.product_id.in_(list(product_ids)))
+    if start is not None:
+        statement = statement.where(Sale.sale_date >= start)
+    if end is not None:
+        statement = statement.where(Sale.sale_date < end)
+    recent = _to_columns([tuple(row) for row in db.session.execute(statement.where(Sale.sale_date.is_not(None)))])
+
+    columns = {name: np.concatenate([archived[name], recent[name]]) for name in _DTYPES}
+    order = np.argsort(columns['sale_date'], kind='stable')
+    return {name: values[order] for name, values in columns.items()}
+
+
+def _owners(product_ids):
+    by_user = defaultdict(list)
+    for owner, product_id in db.session.execute(
+        select(Product.user_id, Product.id).where(Product.id.in_(list(product_ids)))
+    ):
+        by_user[owner].append(product_id)
+    return by_user
+
+
+def archived_sales_totals(product_ids):
+    """
+    Totals of archived sales per product, matching the sale aggregates that
+    product_stats.compute_stats reads from the table: {product_id: {field:
+    value}} with the ProductStats counter names.
+    """
+    totals = {}
+    for owner, owned in _owners(product_ids).items():
+        if not sales_archive.manifest(owner)['partitions']:
+            continue
+        data = sales_archive.scan(owner, owned, columns=('product_id', 'quantity', 'price'))
+        if not len(data['product_id']):
+            continue
+        products, index = np.unique(data['product_id'], return_inverse=True)
+        quantity = data['quantity'].astype(float)
+        price = data['price']
+        valid = (price > 0) & (quantity > 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            log_price = np.where(valid, np.log(price), 0.0)
+            log_qty = np.where(valid, np.log(quantity), 0.0)
+
+        def total(values):
+            return np.bincount(index, weights=values, minlength=len(products))
+
+        fields = {
+            'sales_count': np.bincount(index, minlength=len(products)),
+            'units_sold': total(quantity),
+            'revenue_sum': total(quantity * price),
+            'log_count': np.bincount(index, weights=valid, minlength=len(products)),
+            'sum_log_price': total(log_price),
+            'sum_log_qty': total(log_qty),
+            'sum_log_price_sq': total(log_price * log_price),
+            'sum_log_qty_sq': total(log_qty * log_qty),
+            'sum_log_price_qty': total(log_price * log_qty)
+        }
+        for i, product_id in enumerate(products.tolist()):
+            totals[product_id] = {
+                name: (int(values[i]) if name in ('sales_count', 'units_sold', 'log_count') else float(values[i]))
+                for name, values in fields.items()
+            }
+    return totals
+
+
+def archived_daily_totals(user_id=None):
+    """
+    Archived sales summed per (product, day) as rows for the daily sales
+    rollup, for one user or everyone with an archive.
+    """
+    rows = []
+    for owner in ([user_id] if user_id is not None else sales_archive.users()):
+        data = sales_archive.scan(owner, columns=('product_id', 'quantity', 'price', 'sale_date'))
+        if not len(data['product_id']):
+            continue
+        days = data['sale_date'].astype('datetime64[D]')
+        keys, index = np.unique(
+            np.rec.fromarrays([data['product_id'], days], names='product_id,day'), return_inverse=True
+        )
+        units = np.bincount(index, weights=data['quantity'], minlength=len(keys))
+        counts = np.bincount(index, minlength=len(keys))
+        revenue = np.bincount(index, weights=data['quantity'] * data['price'], minlength=len(keys))
+        for i, key in enumerate(keys):
+            rows.append({
+                'product_id': int(key['product_id']),
+                'day': key['day'].astype(object),
+                'user_id': owner,
+                'units': int(units[i]),
+                'sale_count': int(counts[i]),
+                'revenue': float(revenue[i])
+            })
+    return rows
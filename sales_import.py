@@ -0,0 +1,266 @@
+import csv
+import io
+import json
+import math
+import re
+import time
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import select, insert, update, case, bindparam
+
+from app import db
+from models import Product, Sale
+from product_stats import record_sales as record_sales_stats
+from sales_rollup import record_sales as record_sales_rollup
+import data_versions
+
+DEFAULT_CHUNK_SIZE = 5000
+
+# Rejected rows kept in the report; the rest are only counted
+MAX_REJECTED_SAMPLES = 100
+
+FORMATS = ('csv', 'jsonl')
+
+# Bytes that are not valid UTF-8, as decoded by the surrogateescape error handler
+_UNDECODABLE = re.compile('[\udc80-\udcff]')
+
+
+class UndecodableLine(ValueError):
+    """A line of an import stream that is not valid UTF-8."""
+
+    def __init__(self, line_number):
+        super().__init__(f"line {line_number} is not valid UTF-8")
+        self.line_number = line_number
+
+
+class ImportReport:
+    """Running totals for a bulk import, reported back to the caller."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.rows_read = 0
+        self.rows_imported = 0
+        self.rows_rejected = 0
+        self.chunks = 0
+        self.rejected = []
+        self.error = None
+
+    def reject(self, line, reason):
+        self.rows_rejected += 1
+        if len(self.rejected) < MAX_REJECTED_SAMPLES:
+            self.rejected.append({'line': line, 'reason': reason})
+
+    def as_dict(self):
+        elapsed = time.perf_counter() - self.started
+        return {
+            'rows_read': self.rows_read,
+            'rows_imported': self.rows_imported,
+            'rows_rejected': self.rows_rejected,
+            'chunks': self.chunks,
+            'elapsed_seconds': round(elapsed, 3),
+            'rows_per_second': round(self.rows_read / elapsed, 1) if elapsed > 0 else None,
+            'rejected': self.rejected,
+            'error': self.error
+        }
+
+
+def detect_format(filename=None, content_type=None):
+    """Guess csv/jsonl from a filename extension or content type."""
+    name = (filename or '').lower()
+    kind = (content_type or '').lower()
+    if name.endswith(('.jsonl', '.ndjson')) or 'ndjson' in kind or 'jsonl' in kind:
+        return 'jsonl'
+    if name.endswith('.csv') or 'csv' in kind:
+        return 'csv'
+    return None
+
+
+def _lines(stream):
+    """(line_number, text) for each line of a binary UTF-8 stream; invalid lines come as UndecodableLine."""
+    text = io.TextIOWrapper(stream, encoding='utf-8', errors='surrogateescape', newline='')
+    for line_number, line in enumerate(text, start=1):
+        yield line_number, UndecodableLine(line_number) if _UNDECODABLE.search(line) else line
+
+
+def _csv_lines(stream):
+    for _, line in _lines(stream):
+        if isinstance(line, UndecodableLine):
+            raise line
+        yield line
+
+
+def iter_records(stream, fmt):
+    """
+    Yield (line_number, record) pairs from a binary stream without reading it
+    all into memory. Undecodable JSON lines are yielded as their error; a CSV
+    line that is not valid UTF-8 raises UndecodableLine.
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(_csv_lines(stream))
+        for record in reader:
+            yield reader.line_num, record
+    else:
+        for line_number, line in _lines(stream):
+            if isinstance(line, UndecodableLine):
+                yield line_number, line
+                continue
+            if not line.strip():
+                continue
+            try:
+                yield line_number, json.loads(line)
+            except ValueError as e:
+                yield line_number, e
+
+
+def parse_record(record):
+    """
+    Validate one raw record and return (product_id, quantity, price, sale_date).
+    Raises ValueError with a human readable reason.
+    """
+    if isinstance(record, Exception):
+        raise ValueError(f"invalid JSON: {record}")
+    if not isinstance(record, dict):
+        raise ValueError("record must be an object")
+
+    try:
+        product_id = int(record['product_id'])
+        quantity = int(record['quantity'])
+        price = float(record['price'])
+    except KeyError as e:
+        raise ValueError(f"missing field {e.args[0]}")
+    except (TypeError, ValueError):
+        raise ValueError("product_id, quantity and price must be numeric")
+
+    if quantity <= 0:
+        raise ValueError("quantity must be positive")
+    if not math.isfinite(price):
+        raise ValueError("price must be a finite number")
+    if price < 0:
+        raise ValueError("price cannot be negative")
+
+    sale_date = record.get('sale_date')
+    if sale_date:
+        try:
+            sale_date = datetime.fromisoformat(str(sale_date))
+        except ValueError:
+            raise ValueError("sale_date must be an ISO date or datetime")
+        if sale_date.tzinfo is not None:
+            sale_date = sale_date.replace(tzinfo=None) - sale_date.utcoffset()
+    else:
+        sale_date = datetime.utcnow()
+
+    return product_id, quantity, price, sale_date
+
+
+def _chunks(records, size):
+    chunk = []
+    for item in records:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _insert_sales(rows):
+    connection = db.session.connection()
+    if connection.dialect.name == 'postgresql':
+        # COPY on the session's own connection so it shares the transaction
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for product_id, quantity, price, sale_date in rows:
+            writer.writerow((product_id, quantity, price, sale_date.isoformat(sep=' ')))
+        buffer.seek(0)
+        cursor = connection.connection.driver_connection.cursor()
+        try:
+            cursor.copy_expert(
+                "COPY sale (product_id, quantity, price, sale_date) FROM STDIN WITH (FORMAT csv)",
+                buffer
+            )
+        finally:
+            cursor.close()
+        return
+
+    db.session.execute(insert(Sale), [
+        {'product_id': product_id, 'quantity': quantity, 'price': price, 'sale_date': sale_date}
+        for product_id, quantity, price, sale_date in rows
+    ])
+
+
+def _decrement_stock(rows):
+    units = defaultdict(int)
+    for product_id, quantity, _, _ in rows:
+        units[product_id] += quantity
+
+    products = Product.__table__
+    remaining = products.c.stock_level - bindparam('units')
+    db.session.execute(
+        update(products)
+        .where(products.c.id == bindparam('product'), products.c.stock_level.is_not(None))
+        .values(stock_level=case((remaining > 0, remaining), else_=0)),
+        [{'product': product_id, 'units': total} for product_id, total in units.items()]
+    )
+
+
+def import_sales(stream, fmt, user_id, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Stream-import sales for a user from a CSV or JSON Lines binary stream.
+
+    Each chunk is validated against the user's products with one lookup,
+    inserted in bulk (COPY on PostgreSQL, executemany elsewhere), reflected
+    in stock levels with one aggregated UPDATE per product, folded into the
+    daily rollup and product statistics, and committed. A CSV line that is
+    not valid UTF-8 stops the import: chunks committed before it are kept
+    and report.error names the line. Returns the ImportReport.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported format '{fmt}', expected one of {', '.join(FORMATS)}")
+
+    report = ImportReport()
+    try:
+        _import_chunks(_chunks(iter_records(stream, fmt), chunk_size), user_id, report)
+    except UndecodableLine as e:
+        db.session.rollback()
+        report.error = f"{e}; import stopped after committing {report.rows_imported} rows"
+    return report
+
+
+def _import_chunks(chunks, user_id, report):
+    for chunk in chunks:
+        report.chunks += 1
+        report.rows_read += len(chunk)
+
+        parsed = []
+        for line_number, record in chunk:
+            try:
+                parsed.append((line_number, parse_record(record)))
+            except ValueError as e:
+                report.reject(line_number, str(e))
+
+        owned = set(db.session.scalars(
+            select(Product.id).where(
+                Product.user_id == user_id,
+                Product.id.in_({row[0] for _, row in parsed})
+            )
+        )) if parsed else set()
+
+        rows = []
+        for line_number, row in parsed:
+            if row[0] in owned:
+                rows.append(row)
+            else:
+                report.reject(line_number, f"unknown product {row[0]}")
+
+        if rows:
+            _insert_sales(rows)
+            _decrement_stock(rows)
+            record_sales_rollup(
+                (user_id, product_id, sale_date, quantity, price)
+                for product_id, quantity, price, sale_date in rows
+            )
+            record_sales_stats(rows)
+            data_versions.bump(user_id, {row[0] for row in rows})
+        db.session.commit()
+        report.rows_imported += len(rows)
@@ -0,0 +1,140 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, delete, insert, func
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app import db
+from models import Product, Sale, SalesDailyRollup
+from utils import fill_daily_series
+from sales_archive import archived_daily_totals
+
+_UPSERT_DIALECTS = {
+    'postgresql': postgresql.insert,
+    'sqlite': sqlite.insert
+}
+
+
+def record_sales(entries):
+    """
+    Add sales to the daily rollup within the current transaction.
+
+    entries is an iterable of (user_id, product_id, sale_date, quantity,
+    price); they are summed per (product, day) before being upserted.
+    """
+    totals = defaultdict(lambda: [0, 0, 0.0])
+    for user_id, product_id, sale_date, quantity, price in entries:
+        total = totals[(product_id, sale_date.date(), user_id)]
+        total[0] += quantity
+        total[1] += 1
+        total[2] += quantity * price
+
+    rows = [
+        {
+            'product_id': product_id,
+            'day': day,
+            'user_id': user_id,
+            'units': units,
+            'sale_count': count,
+            'revenue': revenue
+        }
+        for (product_id, day, user_id), (units, count, revenue) in totals.items()
+    ]
+    if rows:
+        _upsert(rows)
+
+
+def record_sale(sale, user_id):
+    record_sales([(user_id, sale.product_id, sale.sale_date or datetime.utcnow(), sale.quantity, sale.price)])
+
+
+def _upsert(rows):
+    table = SalesDailyRollup.__table__
+    dialect_insert = _UPSERT_DIALECTS.get(db.session.get_bind().dialect.name)
+
+    if dialect_insert is None:
+        # Portable fallback: read-modify-write each (product, day)
+        db.session.flush()
+        for row in rows:
+            rollup = db.session.get(SalesDailyRollup, (row['product_id'], row['day']))
+            if rollup is None:
+                db.session.add(SalesDailyRollup(**row))
+            else:
+                rollup.units += row['units']
+                rollup.sale_count += row['sale_count']
+                rollup.revenue += row['revenue']
+        return
+
+    statement = dialect_insert(table)
+    statement = statement.on_conflict_do_update(
+        index_elements=[table.c.product_id, table.c.day],
+        set_={
+            'units': table.c.units + statement.excluded.units,
+            'sale_count': table.c.sale_count + statement.excluded.sale_count,
+            'revenue': table.c.revenue + statement.excluded.revenue
+        }
+    )
+    db.session.execute(statement, rows)
+
+
+def backfill_sales_rollup(user_id=None):
+    """
+    Rebuild rollup rows from the Sale table and the sales archive, for one
+    user or everyone.
+    Returns the number of rollup rows written.
+    """
+    clear = delete(SalesDailyRollup)
+    if user_id is not None:
+        clear = clear.where(SalesDailyRollup.user_id == user_id)
+    db.session.execute(clear)
+
+    sale_day = func.date(Sale.sale_date)
+    source = select(
+        Sale.product_id,
+        sale_day,
+        Product.user_id,
+        func.sum(Sale.quantity),
+        func.count(),
+        func.sum(Sale.quantity * Sale.price)
+    ).join(Product, Product.id == Sale.product_id).group_by(Sale.product_id, sale_day, Product.user_id)
+    if user_id is not None:
+        source = source.where(Product.user_id == user_id)
+
+    db.session.execute(
+        insert(SalesDailyRollup).from_select(
+            ['product_id', 'day', 'user_id', 'units', 'sale_count', 'revenue'], source
+        )
+    )
+
+    # Days of archived sales stay in the rollup
+    archived = archived_daily_totals(user_id)
+    if archived:
+        _upsert(archived)
+    db.session.commit()
+
+    written = select(func.count()).select_from(SalesDailyRollup)
+    if user_id is not None:
+        written = written.where(SalesDailyRollup.user_id == user_id)
+    return db.session.scalar(written)
+
+
+def daily_sales_statement(user_id, days):
+    """(day, sale_count, revenue) rollup rows for the last `days` days."""
+    start_day = datetime.utcnow().date() - timedelta(days=days - 1)
+    return select(
+        SalesDailyRollup.day,
+        func.sum(SalesDailyRollup.sale_count),
+        func.sum(SalesDailyRollup.revenue)
+    ).where(
+        SalesDailyRollup.user_id == user_id,
+        SalesDailyRollup.day >= start_day
+    ).group_by(SalesDailyRollup.day)
+
+
+def load_daily_sales(user_id, days):
+    """
+    Daily sale count and revenue for the last `days` days, read from the
+    rollup: at most one aggregated row per day regardless of sales volume.
+    """
+    rows = db.session.execute(daily_sales_statement(user_id, days)).all()
+    return fill_daily_series(rows, days)
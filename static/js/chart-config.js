@@ -108,3 +108,87 @@ function formatTooltip(tooltipItems) {
     
     return result;
 }
+
+// Columnar API payloads (format=columnar) send dates as days since 1970-01-01
+const MS_PER_DAY = 86400000;
+
+/**
+ * Convert an epoch day from a columnar payload to a YYYY-MM-DD string
+ * @param {number} day - Days since 1970-01-01
+ * @returns {string} ISO date
+ */
+function epochDayToISO(day) {
+    return new Date(day * MS_PER_DAY).toISOString().slice(0, 10);
+}
+
+/**
+ * Zip parallel arrays of a columnar payload into Chart.js {x, y} points
+ * @param {Array<number>} days - Epoch days
+ * @param {Array<number>} values - Values, same length as days
+ * @returns {Array<Object>} Points with ISO date x values
+ */
+function columnarPoints(days, values) {
+    return days.map((day, i) => ({
+        x: epochDayToISO(day),
+        y: values[i]
+    }));
+}
+
+// Payloads from the JSON APIs, kept per URL with their validators
+const apiPayloadCache = new Map();
+const API_CACHE_PREFIX = 'priceflex:api:';
+
+function readCachedPayload(url) {
+    if (apiPayloadCache.has(url)) return apiPayloadCache.get(url);
+    try {
+        const stored = sessionStorage.getItem(API_CACHE_PREFIX + url);
+        if (stored) {
+            const entry = JSON.parse(stored);
+            apiPayloadCache.set(url, entry);
+            return entry;
+        }
+    } catch (e) {
+        // Storage unavailable or corrupt; fall back to a full fetch
+    }
+    return null;
+}
+
+function storeCachedPayload(url, entry) {
+    apiPayloadCache.set(url, entry);
+    try {
+        sessionStorage.setItem(API_CACHE_PREFIX + url, JSON.stringify(entry));
+    } catch (e) {
+        // Quota exceeded; the in-memory copy is still used for this page
+    }
+}
+
+/**
+ * Fetch JSON from an API endpoint, revalidating any cached copy with
+ * If-None-Match / If-Modified-Since and reusing it on 304 Not Modified
+ * @param {string} url - API URL
+ * @returns {Promise<Object>} Parsed payload
+ */
+function fetchJSONCached(url) {
+    const cached = readCachedPayload(url);
+    const headers = {};
+    if (cached && cached.etag) headers['If-None-Match'] = cached.etag;
+    if (cached && cached.lastModified) headers['If-Modified-Since'] = cached.lastModified;
+
+    return fetch(url, { headers: headers, cache: 'no-store', credentials: 'same-origin' })
+        .then(response => {
+            if (response.status === 304 && cached) {
+                return cached.data;
+            }
+            if (!response.ok) {
+                throw new Error(`Request for ${url} failed with status ${response.status}`);
+            }
+            return response.json().then(data => {
+                const etag = response.headers.get('ETag');
+                const lastModified = response.headers.get('Last-Modified');
+                if (etag || lastModified) {
+                    storeCachedPayload(url, { etag: etag, lastModified: lastModified, data: data });
+                }
+                return data;
+            });
+        });
+}
@@ -28,11 +28,11 @@ function initDashboardCharts() {
     // Initialize sales chart
     const salesCtx = document.getElementById('salesChart');
     if (salesCtx) {
-        const salesData = JSON.parse(salesCtx.dataset.sales || '[]');
+        // Columnar daily series: parallel date (epoch day) and revenue arrays
+        const salesData = JSON.parse(salesCtx.dataset.sales || '{"date": [], "revenue": []}');
         
-        // Extract dates and revenues
-        const dates = salesData.map(item => item.date);
-        const revenues = salesData.map(item => item.revenue);
+        const dates = salesData.date.map(epochDayToISO);
+        const revenues = salesData.revenue;
         
         window.salesChart = new Chart(salesCtx, {
             type: 'line',
@@ -120,14 +120,13 @@ function initDashboardCharts() {
 }
 
 function updateDashboardData(days) {
-    // Fetch dashboard data for the selected date range
-    fetch(`/api/dashboard_data?days=${days}`)
-        .then(response => response.json())
+    // Fetch dashboard data for the selected date range, reusing the cached copy when it is still current
+    fetchJSONCached(`/api/dashboard_data?days=${days}&format=columnar`)
         .then(data => {
             // Update sales chart
             if (window.salesChart) {
-                window.salesChart.data.labels = data.daily_sales.map(item => item.date);
-                window.salesChart.data.datasets[0].data = data.daily_sales.map(item => item.revenue);
+                window.salesChart.data.labels = data.daily_sales.date.map(epochDayToISO);
+                window.salesChart.data.datasets[0].data = data.daily_sales.revenue;
                 window.salesChart.update();
             }
         })
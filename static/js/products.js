@@ -7,6 +7,9 @@ document.addEventListener('DOMContentLoaded', function() {
     
     // Set up form validation
     setupFormValidation();
+    
+    // Set up competitor price paging
+    setupCompetitorPricePaging();
 });
 
 function initProductCharts() {
@@ -15,12 +18,11 @@ function initProductCharts() {
     
     const productId = productChartContainer.dataset.productId;
     
-    // Fetch product data
-    fetch(`/api/product_data/${productId}`)
-        .then(response => response.json())
+    // Fetch product data, reusing the cached copy when it is still current
+    fetchJSONCached(`/api/product_data/${productId}?format=columnar`)
         .then(data => {
             // Create price history chart
-            createPriceHistoryChart(data.price_history, data.competitor_prices);
+            createPriceHistoryChart(data.price_history, data.competitor_prices, data.competitors);
             
             // Create sales chart
             createSalesChart(data.sales);
@@ -30,29 +32,23 @@ function initProductCharts() {
         });
 }
 
-function createPriceHistoryChart(priceHistory, competitorPrices) {
+function createPriceHistoryChart(priceHistory, competitorPrices, competitors) {
     const priceChartCtx = document.getElementById('priceHistoryChart');
     if (!priceChartCtx) return;
     
-    // Group competitor prices by competitor
-    const competitorGroups = {};
-    competitorPrices.forEach(cp => {
-        if (!competitorGroups[cp.competitor_name]) {
-            competitorGroups[cp.competitor_name] = [];
-        }
-        competitorGroups[cp.competitor_name].push({
-            date: cp.date,
-            price: cp.price
+    // Group competitor prices by competitor; each row references competitors.name by position
+    const competitorGroups = competitors.name.map(() => []);
+    competitorPrices.competitor.forEach((position, i) => {
+        competitorGroups[position].push({
+            x: epochDayToISO(competitorPrices.date[i]),
+            y: competitorPrices.price[i]
         });
     });
     
     // Prepare datasets
     const datasets = [{
         label: 'Your Price',
-        data: priceHistory.map(ph => ({
-            x: ph.date,
-            y: ph.price
-        })),
+        data: columnarPoints(priceHistory.date, priceHistory.price),
         borderColor: 'rgba(0, 123, 255, 1)',
         backgroundColor: 'rgba(0, 123, 255, 0.1)',
         fill: false,
@@ -69,23 +65,18 @@ function createPriceHistoryChart(priceHistory, competitorPrices) {
         'rgba(23, 162, 184, 1)',
     ];
     
-    let colorIndex = 0;
-    for (const [competitor, prices] of Object.entries(competitorGroups)) {
+    competitors.name.forEach((competitor, position) => {
         datasets.push({
             label: competitor,
-            data: prices.map(p => ({
-                x: p.date,
-                y: p.price
-            })),
-            borderColor: colors[colorIndex % colors.length],
+            data: competitorGroups[position],
+            borderColor: colors[position % colors.length],
             backgroundColor: 'transparent',
             borderWidth: 2,
             borderDash: [5, 5],
             tension: 0.4,
             pointRadius: 3
         });
-        colorIndex++;
-    }
+    });
     
     // Create chart
     new Chart(priceChartCtx, {
@@ -137,25 +128,27 @@ function createPriceHistoryChart(priceHistory, competitorPrices) {
 
 function createSalesChart(sales) {
     const salesChartCtx = document.getElementById('salesChart');
-    if (!salesChartCtx || !sales.length) return;
+    if (!salesChartCtx || !sales.date.length) return;
     
-    // Group sales by date
-    const salesByDate = {};
-    sales.forEach(sale => {
-        if (!salesByDate[sale.date]) {
-            salesByDate[sale.date] = {
+    // Group sales by epoch day; revenue is not sent in the columnar format
+    const salesByDay = new Map();
+    sales.date.forEach((day, i) => {
+        if (!salesByDay.has(day)) {
+            salesByDay.set(day, {
                 quantity: 0,
                 revenue: 0
-            };
+            });
         }
-        salesByDate[sale.date].quantity += sale.quantity;
-        salesByDate[sale.date].revenue += sale.revenue;
+        const totals = salesByDay.get(day);
+        totals.quantity += sales.quantity[i];
+        totals.revenue += sales.quantity[i] * sales.price[i];
     });
     
     // Convert to arrays
-    const dates = Object.keys(salesByDate).sort();
-    const quantities = dates.map(date => salesByDate[date].quantity);
-    const revenues = dates.map(date => salesByDate[date].revenue);
+    const days = Array.from(salesByDay.keys()).sort((a, b) => a - b);
+    const dates = days.map(epochDayToISO);
+    const quantities = days.map(day => salesByDay.get(day).quantity);
+    const revenues = days.map(day => salesByDay.get(day).revenue);
     
     // Create chart
     new Chart(salesChartCtx, {
@@ -302,3 +295,38 @@ function setupFormValidation() {
         });
     }
 }
+
+function setupCompetitorPricePaging() {
+    document.querySelectorAll('.load-more-prices').forEach(button => {
+        button.addEventListener('click', function() {
+            const tbody = document.getElementById(this.dataset.target);
+            const url = `${this.dataset.url}?cursor=${encodeURIComponent(this.dataset.cursor)}`;
+            
+            this.disabled = true;
+            fetch(url)
+                .then(response => response.json())
+                .then(data => {
+                    data.prices.forEach(price => {
+                        const row = document.createElement('tr');
+                        [price.product_name, '₹' + price.price, price.date_recorded].forEach(value => {
+                            const cell = document.createElement('td');
+                            cell.textContent = value;
+                            row.appendChild(cell);
+                        });
+                        tbody.appendChild(row);
+                    });
+                    
+                    if (data.next_cursor) {
+                        this.dataset.cursor = data.next_cursor;
+                        this.disabled = false;
+                    } else {
+                        this.remove();
+                    }
+                })
+                .catch(error => {
+                    console.error('Error fetching competitor prices:', error);
+                    this.disabled = false;
+                });
+        });
+    });
+}
@@ -0,0 +1,84 @@
+import threading
+
+from flask_login import UserMixin
+
+from app import db
+from models import User
+from cache import MemoryBackend, NullBackend, _MISSING
+from metrics import metrics
+
+
+class UserSnapshot(UserMixin):
+    """
+    Detached, read-only copy of the User columns read through current_user.
+    Carries no password hash and no session; views that modify the user
+    load the User row and call user_cache.invalidate after committing.
+    """
+
+    def __init__(self, user):
+        self.id = user.id
+        self.username = user.username
+        self.email = user.email
+        self.company_name = user.company_name
+        self.business_type = user.business_type
+
+    def __repr__(self):
+        return f'<UserSnapshot {self.id}>'
+
+
+class UserCache:
+    """
+    Per-worker TTL cache of UserSnapshots behind Flask-Login's user loader,
+    so authenticated requests skip the user lookup. Invalidations are only
+    seen by the worker that issued them; USER_CACHE_TTL bounds how long
+    other workers serve a stale snapshot.
+    """
+
+    def __init__(self, app=None):
+        self.backend = NullBackend()
+        self.ttl = None
+        self._counts = {'hits': 0, 'misses': 0}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('USER_CACHE_TTL', 60)
+        app.config.setdefault('USER_CACHE_MAXSIZE', 4096)
+        self.ttl = app.config['USER_CACHE_TTL']
+        self.backend = MemoryBackend(app.config['USER_CACHE_MAXSIZE']) if self.ttl > 0 else NullBackend()
+        app.extensions['user_cache'] = self
+
+    def load(self, user_id):
+        """The user's snapshot, read from the database on a miss; None for an unknown user."""
+        snapshot = self.backend.get(user_id)
+        if snapshot is not _MISSING:
+            self._count('hits')
+            return snapshot
+
+        self._count('misses')
+        user = db.session.get(User, user_id)
+        if user is None:
+            return None
+        snapshot = UserSnapshot(user)
+        self.backend.set(user_id, snapshot, self.ttl)
+        return snapshot
+
+    def invalidate(self, user_id):
+        """Drop this worker's snapshot of a user after the user row changed."""
+        self.backend.delete(user_id)
+
+    def _count(self, outcome):
+        with self._lock:
+            self._counts[outcome] += 1
+        metrics.inc('priceflex_cache_requests_total', cache='user', namespace='load_user',
+                    result='hit' if outcome == 'hits' else 'miss')
+
+    def stats(self):
+        """Hit/miss counters for this process, shaped like ResponseCache.stats() entries."""
+        with self._lock:
+            total = self._counts['hits'] + self._counts['misses']
+            return dict(self._counts, hit_rate=round(self._counts['hits'] / total, 4) if total else None)
+
+
+user_cache = UserCache()
@@ -1,5 +1,8 @@
+import json
 from datetime import datetime, timedelta
 
+import orjson
+
 def get_date_range_data(items, date_attribute, days=30):
     """
     Generate daily aggregated data for date range charts
@@ -40,3 +43,59 @@ def get_date_range_data(items, date_attribute, days=30):
     
     # Convert to list
     return [data for date, data in results.items()]
+
+def fill_daily_series(rows, days):
+    """
+    Expand pre-aggregated daily rows into a gap-free date range series
+    
+    Args:
+        rows: Iterable of (day, count, revenue) tuples, one per day with data
+        days: Number of days to include, ending today
+    
+    Returns:
+        List of date and count/value dictionaries, same shape as
+        get_date_range_data
+    """
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    start_date = today - timedelta(days=days-1)
+    
+    date_range = [(start_date + timedelta(days=i)).strftime('%Y-%m-%d') for i in range(days)]
+    results = {date: {'date': date, 'count': 0, 'revenue': 0} for date in date_range}
+    
+    for day, count, revenue in rows:
+        date_str = str(day)[:10]
+        if date_str in results:
+            results[date_str]['count'] += count or 0
+            results[date_str]['revenue'] += revenue or 0
+    
+    return list(results.values())
+
+def stream_json_object(sections, chunk_size=65536):
+    """
+    Incrementally encode a JSON object whose values are lists
+    
+    Args:
+        sections: List of (key, iterable of JSON-serialisable items) pairs
+        chunk_size: Approximate number of characters per yielded chunk
+    
+    Yields:
+        String chunks that together form one JSON object, so large lists
+        are never materialised in memory
+    """
+    buffer = ['{']
+    size = 1
+    for index, (key, items) in enumerate(sections):
+        buffer.append((',' if index else '') + json.dumps(key) + ':[')
+        separator = ''
+        for item in items:
+            encoded = separator + orjson.dumps(item).decode()
+            buffer.append(encoded)
+            size += len(encoded)
+            separator = ','
+            if size >= chunk_size:
+                yield ''.join(buffer)
+                buffer = []
+                size = 0
+        buffer.append(']')
+    buffer.append('}')
+    yield ''.join(buffer)
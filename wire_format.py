@@ -0,0 +1,106 @@
+from datetime import date
+
+import orjson
+from werkzeug.wrappers import Response
+
+# ?format= values accepted by the chart APIs
+FORMATS = ('rows', 'columnar')
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def requested_format(args):
+    """The response shape asked for by a request's `format` argument. Raises ValueError."""
+    shape = args.get('format', 'rows')
+    if shape not in FORMATS:
+        raise ValueError(f"'format' must be one of: {', '.join(FORMATS)}")
+    return shape
+
+
+def dumps(value):
+    """JSON-encode with orjson, as bytes."""
+    return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+
+
+def json_response(payload):
+    """A buffered application/json response encoded with orjson."""
+    return Response(dumps(payload), mimetype='application/json')
+
+
+def epoch_day(value):
+    """Days since 1970-01-01 of a date, datetime or 'YYYY-MM-DD...' string."""
+    if isinstance(value, str):
+        value = date.fromisoformat(value[:10])
+    return value.toordinal() - _EPOCH_ORDINAL
+
+
+def _columns(rows, width):
+    columns = list(zip(*rows))
+    return columns if columns else [()] * width
+
+
+def columnar_product_data(price_history, sales, competitor_prices):
+    """
+    The product data payload as parallel arrays.
+
+    Takes the same inputs as api_queries.product_data_sections. Dates are
+    epoch days; sales revenue is left to the client (quantity * price);
+    competitor names are sent once in `competitors` and referenced by
+    position from competitor_prices.competitor.
+    """
+    ph_dates, ph_prices = _columns(((row.date, row.price) for row in price_history), 2)
+    sale_dates, quantities, sale_prices = _columns(sales, 3)
+
+    positions, names = {}, []
+    cp_dates, cp_competitors, cp_prices = [], [], []
+    for row in competitor_prices:
+        position = positions.get(row.competitor_id)
+        if position is None:
+            position = positions[row.competitor_id] = len(names)
+            names.append(row.competitor_name)
+        cp_dates.append(epoch_day(row.date))
+        cp_competitors.append(position)
+        cp_prices.append(row.price)
+
+    return {
+        'format': 'columnar',
+        'price_history': {
+            'date': [epoch_day(value) for value in ph_dates],
+            'price': list(ph_prices)
+        },
+        'sales': {
+            'date': [epoch_day(value) for value in sale_dates],
+            'quantity': list(quantities),
+            'price': list(sale_prices)
+        },
+        'competitors': {
+            'id': list(positions),
+            'name': names
+        },
+        'competitor_prices': {
+            'date': cp_dates,
+            'competitor': cp_competitors,
+            'price': cp_prices
+        }
+    }
+
+
+def columnar_daily_sales(daily_sales):
+    """A fill_daily_series series as parallel date (epoch day), count and revenue arrays."""
+    return {
+        'date': [epoch_day(day['date']) for day in daily_sales],
+        'count': [day['count'] for day in daily_sales],
+        'revenue': [day['revenue'] for day in daily_sales]
+    }
+
+
+def columnar_dashboard(payload):
+    """An api_queries.dashboard_payload as parallel arrays."""
+    return {
+        'format': 'columnar',
+        'daily_sales': columnar_daily_sales(payload['daily_sales']),
+        'price_changes': {
+            'date': [epoch_day(change['date']) for change in payload['price_changes']],
+            'count': [change['count'] for change in payload['price_changes']]
+        }
+    }